@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class AuthenticationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'authentication'
+
+    def ready(self):
+        from expenseswebsite import refdata
+        from . import signals, taken_names
+        refdata.register('taken-names', taken_names.load, max_age=settings.TAKEN_NAMES_REBUILD_INTERVAL)
+        refdata.warm_on_first_request(['taken-names'])
+        if settings.SESSION_ENGINE == 'authentication.sessions':
+            from django.core.signals import request_finished
+            from .sessions import write_behind_after_request
+            request_finished.connect(write_behind_after_request, dispatch_uid='session-write-behind')
@@ -0,0 +1,48 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from expenseswebsite import metrics
+
+CACHE_TIMEOUT = 60 * 60
+
+
+def cache_key(user_id):
+    return f'auth-user:{user_id}'
+
+
+def remember(user):
+    cache.set(cache_key(user.pk), user, CACHE_TIMEOUT)
+
+
+def invalidate(user_id):
+    cache.delete(cache_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend whose ``get_user()``, run by AuthenticationMiddleware for
+    every request with a session, reads the cache before the database.
+
+    Entries are dropped whenever the user is saved, password changes
+    included, or deleted, and on logout; see signals.py.
+    """
+
+    def get_user(self, user_id):
+        user = cache.get(cache_key(user_id))
+        metrics.cache_lookup('auth-user', user is not None)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                remember(user)
+            return user
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        user = await cache.aget(cache_key(user_id))
+        metrics.cache_lookup('auth-user', user is not None)
+        if user is None:
+            user = await get_user_model()._default_manager.filter(pk=user_id).afirst()
+            if user is None or not self.user_can_authenticate(user):
+                return None
+            await cache.aset(cache_key(user_id), user, CACHE_TIMEOUT)
+            return user
+        return user if self.user_can_authenticate(user) else None
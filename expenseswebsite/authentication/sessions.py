@@ -0,0 +1,88 @@
+"""Sessions read from the cache, with updates written behind to the database.
+
+New sessions and key changes, as on login and logout, are written through
+at once. Later updates of an existing session only go to the cache and are
+queued; each process writes its queue out at the end of a request at most
+every SESSION_WRITE_BEHIND_SECONDS (see AuthenticationConfig.ready), so a session changed on every request
+costs one database write per interval. The cache copy is the current one
+meanwhile: a queue lost with its process leaves the database row behind
+until the session's next update, not the session itself.
+"""
+import threading
+import time
+from django.conf import settings
+from django.contrib.sessions.backends import cached_db
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+
+_pending = set()
+_lock = threading.Lock()
+_written = time.monotonic()
+
+
+class SessionStore(cached_db.SessionStore):
+    def save(self, must_create=False):
+        if must_create or self.session_key is None:
+            return super().save(must_create)
+        try:
+            self._cache.set(self.cache_key, self._session, self.get_expiry_age())
+        except Exception:
+            # Without the cache the database copy has to be current.
+            return super().save(must_create)
+        with _lock:
+            _pending.add(self.session_key)
+
+    async def asave(self, must_create=False):
+        if must_create or self.session_key is None:
+            return await super().asave(must_create)
+        try:
+            await self._cache.aset(await self.acache_key(), self._session, await self.aget_expiry_age())
+        except Exception:
+            return await super().asave(must_create)
+        with _lock:
+            _pending.add(self.session_key)
+
+    def delete(self, session_key=None):
+        super().delete(session_key)
+        with _lock:
+            _pending.discard(session_key or self.session_key)
+
+    async def adelete(self, session_key=None):
+        await super().adelete(session_key)
+        with _lock:
+            _pending.discard(session_key or self.session_key)
+
+
+def write_behind(force=False):
+    """Write the queued sessions of this process to the database."""
+    global _written
+    with _lock:
+        if not force and time.monotonic() - _written < settings.SESSION_WRITE_BEHIND_SECONDS:
+            return
+        keys = list(_pending)
+        _pending.clear()
+        _written = time.monotonic()
+    for key in keys:
+        store = SessionStore(key)
+        data = store._cache.get(store.cache_key)
+        if data is None:
+            # Expired or evicted; the database row is all there is.
+            continue
+        store._session_cache = data
+        try:
+            DBStore.save(store)
+        except UpdateError:
+            # Deleted meanwhile, e.g. by a logout in another process.
+            pass
+
+
+def write_behind_after_request(**kwargs):
+    write_behind()
+
+
+def reset():
+    """Forget the queued sessions, for tests."""
+    global _written
+    with _lock:
+        _pending.clear()
+        _written = time.monotonic()
@@ -0,0 +1,38 @@
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from . import taken_names
+from .backends import invalidate, remember
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user(sender, instance, **kwargs):
+    # Again on commit, in case a concurrent request re-cached the old row.
+    invalidate(instance.pk)
+    transaction.on_commit(lambda: invalidate(instance.pk))
+
+
+@receiver(post_save, sender=User)
+def add_taken_names(sender, instance, update_fields=None, **kwargs):
+    # Saves such as the last_login update on every login leave the names
+    # alone. Names freed by renames and deletions stay in the filters until
+    # their next rebuild and just cost a query.
+    if update_fields and not {'username', 'email'} & set(update_fields):
+        return
+    transaction.on_commit(lambda: taken_names.record(instance))
+
+
+@receiver(user_logged_in)
+def remember_user(sender, request, user, **kwargs):
+    # Runs after django.contrib.auth saved last_login, so the first request
+    # after a login finds the user cached.
+    remember(user)
+
+
+@receiver(user_logged_out)
+def forget_user(sender, request, user, **kwargs):
+    if user is not None:
+        invalidate(user.pk)
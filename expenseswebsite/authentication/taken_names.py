@@ -0,0 +1,65 @@
+"""Bloom filter of the taken usernames and emails, one per process.
+
+Each process builds its filter from auth_user and rebuilds it every
+TAKEN_NAMES_REBUILD_INTERVAL seconds (the refdata ``max_age``). Names saved
+in between are appended to a log in the shared cache, one key per entry,
+numbered by a counter; every check first applies the entries its process
+has not seen, so a new name reaches every filter without a rescan.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from expenseswebsite import refdata
+from expenseswebsite.bloom import BloomFilter
+
+COUNTER_KEY = 'taken-names-log'
+
+
+def entry_key(number):
+    return f'taken-names-log:{number}'
+
+
+def taken_key(field, value):
+    return f'{field}:{value}'
+
+
+def load():
+    # Entries recorded from here on are applied on top of the scan; the
+    # ones recorded during it are in both, which does no harm.
+    applied = cache.get(COUNTER_KEY, 0)
+    # Room for twice today's users before the false positive rate climbs.
+    taken = BloomFilter(2 * User.objects.count() + 1000)
+    for username, email in User.objects.values_list('username', 'email').iterator(chunk_size=5000):
+        taken.add(taken_key('username', username))
+        taken.add(taken_key('email', email))
+    taken.applied = applied
+    return taken
+
+
+def record(user):
+    cache.add(COUNTER_KEY, 0, None)
+    number = cache.incr(COUNTER_KEY)
+    # A filter is rebuilt within TAKEN_NAMES_REBUILD_INTERVAL of loading, so
+    # entries recorded after it loaded outlive it.
+    cache.set(entry_key(number), [taken_key('username', user.username), taken_key('email', user.email)],
+              settings.TAKEN_NAMES_REBUILD_INTERVAL)
+
+
+async def aget():
+    taken = await refdata.aget('taken-names')
+    applied = taken.applied
+    latest = await cache.aget(COUNTER_KEY, 0)
+    if latest <= applied:
+        return taken
+    numbers = range(applied + 1, latest + 1)
+    entries = await cache.aget_many([entry_key(number) for number in numbers])
+    if len(entries) < len(numbers):
+        # Evicted, or counted but not written yet: this process rescans.
+        refdata.discard('taken-names')
+        return await refdata.aget('taken-names')
+    for names in entries.values():
+        for name in names:
+            taken.add(name)
+    # Concurrent checks may both apply an entry; adding a name twice is harmless.
+    taken.applied = max(taken.applied, latest)
+    return taken
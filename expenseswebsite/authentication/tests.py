@@ -1,8 +1,17 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, AsyncClient, override_settings
+from django.conf import settings
 from django.contrib.auth import get_user_model, get_user
 import json
 from django.contrib.messages import get_messages
 from django.urls import reverse
+from expenseswebsite.querybudget import QueryBudgetMixin
+from authentication import urls as authentication_urls
+from authentication import sessions, taken_names
+from authentication.backends import CachedModelBackend, cache_key
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from expenseswebsite import refdata
+from expenseswebsite.bloom import BloomFilter
 
 
 # Create your tests here.
@@ -48,6 +57,24 @@ class UsernameValidationViewTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn('username_valid', response.json())
         
+class AsyncValidationTest(TestCase):
+    def setUp(self):
+        self.async_client = AsyncClient()
+        get_user_model().objects.create_user(username='existinguser', email='existing@example.com', password='password123')
+        
+    async def test_taken_username_and_email(self):
+        response = await self.async_client.post(reverse('validate-username'), json.dumps({'username': 'existinguser'}),
+                                                content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        response = await self.async_client.post(reverse('validate-email'), json.dumps({'email': 'existing@example.com'}),
+                                                content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        
+    async def test_free_username(self):
+        response = await self.async_client.post(reverse('validate-username'), json.dumps({'username': 'newuser'}),
+                                                content_type='application/json')
+        self.assertEqual(response.json(), {'username_valid': True})
+        
 class RegistrationViewTest(TestCase):
     def setUp(self):
         self.client = Client()
@@ -132,4 +159,148 @@ class LogoutViewTest(TestCase):
     def test_logout_message(self):
         response = self.client.post(self.url, follow=True)
         messages = [msg.message for msg in get_messages(response.wsgi_request)]
-        self.assertIn('You have been logged out', messages)
\ No newline at end of file
+        self.assertIn('You have been logged out', messages)        
+class AuthenticationQueryBudgetTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = get_user_model().objects.create_user(username='testuser', email='test@example.com', password='password123')
+        
+    def test_every_url_has_a_budget(self):
+        self.assertBudgetsDeclared(authentication_urls)
+        
+    def test_pages(self):
+        self.assertWithinBudget('register')
+        self.assertWithinBudget('login')
+        
+    def test_register_and_login(self):
+        self.assertWithinBudget('register', method='post', data={
+            'username': 'newuser', 'email': 'new@example.com', 'password': 'validpassword'})
+        self.assertWithinBudget('login', method='post', data={'username': 'testuser', 'password': 'password123'})
+        self.assertWithinBudget('logout', method='post')
+        
+    def test_validation_endpoints(self):
+        self.assertWithinBudget('validate-username', method='post', data=json.dumps({'username': 'someone'}),
+                                content_type='application/json')
+        self.assertWithinBudget('validate-email', method='post', data=json.dumps({'email': 'someone@example.com'}),
+                                content_type='application/json')
+        
+@override_settings(**settings.CACHED_AUTH)
+class CachedSessionTest(TestCase):
+    def setUp(self):
+        sessions.reset()
+        self.addCleanup(sessions.reset)
+        self.client = Client()
+        self.user = get_user_model().objects.create_user(username='testuser', email='test@example.com', password='password123')
+        self.client.login(username='testuser', password='password123')
+        self.session_key = self.client.session.session_key
+        
+    def stored(self):
+        return Session.objects.get(session_key=self.session_key).get_decoded()
+        
+    def test_pages_load_the_session_and_user_from_the_cache(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('stats'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.wsgi_request.user, self.user)
+        
+    def test_session_updates_are_written_behind(self):
+        session = sessions.SessionStore(self.session_key)
+        session['theme'] = 'dark'
+        with self.assertNumQueries(0):
+            session.save()
+        self.assertEqual(sessions.SessionStore(self.session_key)['theme'], 'dark')
+        self.assertNotIn('theme', self.stored())
+        sessions.write_behind(force=True)
+        self.assertEqual(self.stored()['theme'], 'dark')
+        
+    def test_logout_deletes_the_session_and_cached_user(self):
+        session = sessions.SessionStore(self.session_key)
+        session['theme'] = 'dark'
+        session.save()
+        self.client.post(reverse('logout'))
+        self.assertIsNone(cache.get(cache_key(self.user.pk)))
+        self.assertFalse(Session.objects.filter(session_key=self.session_key).exists())
+        sessions.write_behind(force=True)
+        self.assertFalse(Session.objects.filter(session_key=self.session_key).exists())
+        
+    def test_password_change_ends_other_sessions(self):
+        self.client.get(reverse('stats'))
+        self.user.set_password('new-password')
+        self.user.save()
+        response = self.client.get(reverse('stats'))
+        self.assertEqual(response.status_code, 302)
+        
+    def test_deleted_users_are_not_served_from_the_cache(self):
+        self.assertEqual(CachedModelBackend().get_user(self.user.pk), self.user)
+        user_id = self.user.pk
+        self.user.delete()
+        self.assertIsNone(CachedModelBackend().get_user(user_id))
+        
+    async def test_async_lookup_uses_the_cache(self):
+        backend = CachedModelBackend()
+        self.assertEqual(await backend.aget_user(self.user.pk), self.user)
+        await cache.adelete(cache_key(self.user.pk))
+        self.assertEqual(await backend.aget_user(self.user.pk), self.user)
+        self.assertIsNotNone(await cache.aget(cache_key(self.user.pk)))
+        
+class TakenNamesFilterTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        get_user_model().objects.create_user(username='existinguser', email='existing@example.com', password='password123')
+        # Rebuilt, without the names of users rolled back by earlier tests.
+        refdata.bump('taken-names')
+        refdata.get('taken-names')
+        
+    def validate(self, field, value):
+        return self.client.post(reverse('validate-' + field), json.dumps({field: value}), content_type='application/json')
+        
+    def test_free_names_are_answered_without_queries(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.validate('username', 'newuser').status_code, 200)
+            self.assertEqual(self.validate('email', 'new@example.com').status_code, 200)
+            
+    def test_taken_names_are_confirmed_by_the_database(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.validate('username', 'existinguser').status_code, 409)
+        self.assertEqual(self.validate('email', 'existing@example.com').status_code, 409)
+        
+    def test_registration_adds_to_the_filter(self):
+        taken = refdata.get('taken-names')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('register'), {'username': 'newuser', 'email': 'new@example.com', 'password': 'validpassword'})
+        self.assertEqual(self.validate('username', 'newuser').status_code, 409)
+        self.assertEqual(self.validate('email', 'new@example.com').status_code, 409)
+        self.assertIs(refdata.get('taken-names'), taken)
+        
+    def test_other_processes_apply_recorded_names(self):
+        taken = refdata.get('taken-names')
+        stamp = cache.get(refdata.stamp_key('taken-names'))
+        # As if registered through another process: recorded, not added here.
+        taken_names.record(get_user_model()(username='elsewhere', email='elsewhere@example.com'))
+        self.assertNotIn(taken_names.taken_key('username', 'elsewhere'), taken)
+        self.assertEqual(self.validate('username', 'elsewhere').status_code, 200)
+        self.assertIn(taken_names.taken_key('username', 'elsewhere'), taken)
+        self.assertIs(refdata.get('taken-names'), taken)
+        self.assertEqual(cache.get(refdata.stamp_key('taken-names')), stamp)
+        
+    def test_missing_log_entries_rebuild_this_filter(self):
+        taken = refdata.get('taken-names')
+        # Counted, but the entry itself evicted.
+        cache.add(taken_names.COUNTER_KEY, 0, None)
+        cache.incr(taken_names.COUNTER_KEY)
+        self.assertEqual(self.validate('username', 'existinguser').status_code, 409)
+        self.assertIsNot(refdata.get('taken-names'), taken)
+        
+    def test_logins_leave_the_filter_alone(self):
+        taken = refdata.get('taken-names')
+        self.client.post(reverse('login'), {'username': 'existinguser', 'password': 'password123'})
+        self.assertIs(refdata.get('taken-names'), taken)
+        
+    def test_filter_has_no_false_negatives(self):
+        taken = BloomFilter(1000)
+        for i in range(1000):
+            taken.add(f'user{i}')
+        self.assertTrue(all(f'user{i}' in taken for i in range(1000)))
+        false_positives = sum(f'other{i}' in taken for i in range(10000))
+        self.assertLess(false_positives, 300)
+
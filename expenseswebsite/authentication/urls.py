@@ -9,3 +9,12 @@ urlpatterns = [
     path('validate-username', csrf_exempt(UsernameValidationView.as_view()), name='validate-username'),
     path('validate-email', csrf_exempt(EmailValidationView.as_view()), name='validate-email'),
 ]
+
+# Most SQL queries one request to each view may issue; see expenseswebsite.querybudget.
+QUERY_BUDGETS = {
+    'register': 4,
+    'login': 9,
+    'logout': 4,
+    'validate-username': 1,
+    'validate-email': 1,
+}
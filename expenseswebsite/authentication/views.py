@@ -12,27 +12,33 @@ from django.utils.encoding import force_bytes, force_str
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.urls import reverse
 from django.contrib import auth
+from . import taken_names
 
 
 # Create your views here.
 
+async def may_be_taken(field, value):
+    # The filter has no false negatives, so only possible matches need the
+    # database; see taken_names.py.
+    return taken_names.taken_key(field, value) in await taken_names.aget()
+
 class EmailValidationView(View):
-    def post(self, request):
+    async def post(self, request):
         data=json.loads(request.body)
         email = data['email']
         if not validate_email(email):
             return JsonResponse({'email_error': 'email is invalid'}, status=400)
-        if User.objects.filter(email=email).exists():
+        if await may_be_taken('email', email) and await User.objects.filter(email=email).aexists():
             return JsonResponse({'email_error': 'sorry email in use, choose another one'}, status=409)
         return JsonResponse({'email_valid': True})
     
 class UsernameValidationView(View):
-    def post(self, request):
+    async def post(self, request):
         data=json.loads(request.body)
         username=data['username']
         if not str(username).isalnum():
             return JsonResponse({'username_error': 'username should only containt alphanumeric characters'}, status=400)
-        if User.objects.filter(username=username).exists():
+        if await may_be_taken('username', username) and await User.objects.filter(username=username).aexists():
             return JsonResponse({'username_error': 'sorry username in use, choose another one'}, status=409)
         return JsonResponse({'username_valid': True})
 
@@ -1,12 +1,14 @@
 from django.contrib import admin
-from .models import Expense, Category
+from .models import Expense, Category, CategoryBudget
 
 # Register your models here.
 
 class ExpenseAdmin(admin.ModelAdmin):
     list_display = ('amount', 'description', 'owner', 'category', 'date')
-    search_fields = ('description', 'category', 'date')
+    search_fields = ('description', 'category__name', 'date')
+    list_select_related = ('owner', 'category')
     list_per_page = 5
 
 admin.site.register(Expense, ExpenseAdmin)
-admin.site.register(Category)
\ No newline at end of file
+admin.site.register(Category)
+admin.site.register(CategoryBudget)
\ No newline at end of file
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ExpensesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'expenses'
+
+    def ready(self):
+        from expenseswebsite import refdata
+        from . import signals
+        refdata.register('categories', signals.load_categories)
+        refdata.warm_on_first_request(['categories'])
@@ -0,0 +1,82 @@
+"""Monthly category budgets.
+
+Spending is read from the category's ExpenseMonthlyTotal row, the running
+total Expense.save() keeps up to date with F() updates, so checking a
+budget reads one row instead of summing the month's expenses.
+"""
+import datetime
+from django.contrib import messages
+from django.core.exceptions import ValidationError
+from django.db.models import OuterRef, Subquery
+from expenseswebsite.rollups import month_start
+from userpreferences import rates
+from .models import Category, CategoryBudget, ExpenseMonthlyTotal
+
+
+def spent(owner, category, month):
+    return Subquery(ExpenseMonthlyTotal.objects
+                    .filter(owner=owner, category=category, month=month).values('total')[:1])
+
+
+def over_budget(owner_id, category_id, date):
+    """(budget, spent) when the category's spending in the month of ``date``
+    exceeds its budget, otherwise None."""
+    row = (CategoryBudget.objects.filter(owner_id=owner_id, category_id=category_id)
+           .annotate(spent=spent(OuterRef('owner'), OuterRef('category'), month_start(date)))
+           .values_list('amount', 'spent').first())
+    if row and row[1] is not None and row[1] > row[0]:
+        return row
+    return None
+
+
+def warn_if_over_budget(request, expense):
+    over = over_budget(expense.owner_id, expense.category_id, expense.date)
+    if over:
+        code, factor = rates.display_currency(request.user_preference or None)
+        budget, total = (rates.convert(amount, factor) for amount in over)
+        messages.warning(request, f'{expense.category.name} is over budget for {expense.date:%B %Y}: '
+                                  f'{total:.2f} of {budget:.2f} {code} spent')
+
+
+def status(owner, month):
+    """(category, budget, spent) for every category in ``month``, in one
+    query; budget and spent are None where there is none."""
+    return (Category.objects
+            .annotate(budget=Subquery(CategoryBudget.objects.filter(owner=owner, category=OuterRef('pk'))
+                                      .values('amount')[:1]),
+                      spent=spent(owner, OuterRef('pk'), month))
+            .order_by('name').values_list('name', 'budget', 'spent'))
+
+
+def status_rows(rows, factor):
+    result = []
+    for name, budget, total in rows:
+        total = total or 0
+        result.append({
+            'category': name,
+            'budget': None if budget is None else rates.convert(budget, factor),
+            'spent': rates.convert(total, factor),
+            'remaining': None if budget is None else rates.convert(budget - total, factor),
+            'over': budget is not None and total > budget,
+        })
+    return result
+
+
+def set_budget(owner, category, amount, currency, date=None):
+    """Set the monthly budget of ``category``, ``amount`` being in
+    ``currency``; an amount of zero removes it."""
+    try:
+        amount = CategoryBudget._meta.get_field('amount').to_python(amount)
+    except ValidationError as invalid:
+        if invalid.code == 'out_of_range':
+            raise ValueError('Budget is too large')
+        raise ValueError('Budget must be a decimal number')
+    if amount < 0:
+        raise ValueError('Budget must not be negative')
+    if not amount:
+        CategoryBudget.objects.filter(owner=owner, category=category).delete()
+        return
+    base = rates.to_base(amount, currency, date or datetime.date.today())
+    CategoryBudget.objects.bulk_create([CategoryBudget(owner=owner, category=category, amount=base)],
+                                       update_conflicts=True, unique_fields=['owner', 'category'],
+                                       update_fields=['amount'])
@@ -0,0 +1,249 @@
+import datetime
+import json
+import math
+import time
+import tracemalloc
+import django
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from expenses.models import Category, Expense
+from expenseswebsite.pagination import encode_cursor
+from userincome.models import Source, UserIncome
+from .seed_data import PASSWORD, seed
+
+STATEMENT = b'date,description,amount\n' + b''.join(
+    f'2024-02-{day:02d},Benchmark import {day},{day}.50\n'.encode() for day in range(1, 21))
+
+
+def expense_form(context):
+    return {'amount': '12.30', 'description': 'Benchmark', 'expense_date': datetime.date.today().isoformat(),
+            'category': context['category']}
+
+
+def income_form(context):
+    return {'amount': '120', 'description': 'Benchmark', 'income_date': datetime.date.today().isoformat(),
+            'source': context['source']}
+
+
+def new_expense(context):
+    return [Expense.objects.create(owner=context['owner'], amount=5, date=datetime.date.today(),
+                                   description='Benchmark', category_id=context['category']).pk]
+
+
+def new_income(context):
+    return [UserIncome.objects.create(owner=context['owner'], amount=5, date=datetime.date.today(),
+                                      description='Benchmark', source_id=context['source']).pk]
+
+
+def search(text):
+    return {'method': 'post', 'data': lambda context: json.dumps({'searchText': text}),
+            'extra': {'content_type': 'application/json'}}
+
+
+def validate(field, value):
+    return {'method': 'post', 'data': lambda context: json.dumps({field: value}),
+            'extra': {'content_type': 'application/json'}}
+
+
+def page_cursor(owner, page):
+    """The ``after`` cursor that opens page ``page`` of the owner's expense
+    list, or its last page when there are fewer."""
+    rows = Expense.objects.filter(owner=owner).order_by('-date', 'id').only('date')
+    offset = (page - 1) * settings.LIST_PAGE_SIZE - 1
+    return encode_cursor(next(iter(rows[offset:offset + 1]), None) or rows.last())
+
+
+def statement(context):
+    return {'statement': SimpleUploadedFile('statement.csv', STATEMENT)}
+
+
+# (label, URL name, request options). ``args`` and ``data`` may be callables
+# taking the context; ``args`` is called before the clock starts.
+SCENARIOS = [
+    ('expenses', 'expenses', {}),
+    ('expenses page 5', 'expenses', {'data': lambda context: {'after': context['page5']}}),
+    ('add-expense form', 'add-expense', {}),
+    ('add-expense', 'add-expense', {'method': 'post', 'data': expense_form}),
+    ('expense-edit form', 'expense-edit', {'args': lambda context: [context['expense']]}),
+    ('expense-edit', 'expense-edit', {'method': 'post', 'args': lambda context: [context['expense']],
+                                      'data': expense_form}),
+    ('expense-delete', 'expense-delete', {'args': new_expense}),
+    ('search-expenses', 'search-expenses', search('Groceries')),
+    ('expense_category_summary', 'expense_category_summary', {}),
+    ('expense_timeseries month', 'expense_timeseries', {'data': {'granularity': 'month'}}),
+    ('expense_timeseries week', 'expense_timeseries', {'data': {'granularity': 'week'}}),
+    ('category-budgets', 'category-budgets', {}),
+    ('category-budgets set', 'category-budgets', {'method': 'post', 'data': {'category': 'Food', 'amount': '300'}}),
+    ('import-expenses', 'import-expenses', {'method': 'post', 'data': statement}),
+    ('export-expenses', 'export-expenses', {}),
+    ('stats', 'stats', {}),
+    ('income', 'income', {}),
+    ('add-income', 'add-income', {'method': 'post', 'data': income_form}),
+    ('income-edit form', 'income-edit', {'args': lambda context: [context['income']]}),
+    ('income-delete', 'income-delete', {'args': new_income}),
+    ('search-income', 'search-income', search('Salary')),
+    ('income_category_summary', 'income_category_summary', {}),
+    ('income_timeseries month', 'income_timeseries', {'data': {'granularity': 'month'}}),
+    ('import-income', 'import-income', {'method': 'post', 'data': statement}),
+    ('export-income', 'export-income', {}),
+    ('stats_income', 'stats_income', {}),
+    ('dashboard', 'dashboard', {}),
+    ('preferences', 'preferences', {}),
+    ('validate-username', 'validate-username', validate('username', 'benchfree')),
+    ('validate-email', 'validate-email', validate('email', 'benchfree@example.com')),
+    ('login', 'login', {'method': 'post', 'data': lambda context: {'username': context['owner'].username,
+                                                                    'password': PASSWORD}}),
+]
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def request(client, url_name, options, context):
+    args = options.get('args')
+    args = args(context) if callable(args) else args
+    data = options.get('data')
+    data = data(context) if callable(data) else data
+    url = reverse(url_name, args=args)
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        response = getattr(client, options.get('method', 'get'))(url, data, **options.get('extra', {}))
+        if response.streaming:
+            b''.join(response.streaming_content)
+        elapsed = time.perf_counter() - started
+    return response.status_code, elapsed, len(queries)
+
+
+def measure(client, url_name, options, context, repeat):
+    request(client, url_name, options, context)
+    timings = []
+    queries = 0
+    for _ in range(repeat):
+        status, elapsed, count = request(client, url_name, options, context)
+        timings.append(elapsed * 1000)
+        queries = max(queries, count)
+    # Allocation tracing slows everything down, so memory gets its own run.
+    tracemalloc.start()
+    try:
+        request(client, url_name, options, context)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'url_name': url_name,
+        'method': options.get('method', 'get').upper(),
+        'status': status,
+        'p50_ms': round(percentile(timings, 0.5), 2),
+        'p95_ms': round(percentile(timings, 0.95), 2),
+        'mean_ms': round(sum(timings) / len(timings), 2),
+        'queries': queries,
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def run(sizes, repeat=20, seed_value=0, scenarios=SCENARIOS, log=None, keep=False):
+    """Benchmark every scenario against a freshly seeded user per data
+    size, where a size is the number of expense rows; the user also gets a
+    tenth as many income rows. Unless ``keep``, the user is deleted
+    afterwards, and with it everything the requests wrote."""
+    results = []
+    for size in sizes:
+        prefix = f'bench{size}-'
+        User.objects.filter(username__startswith=prefix).delete()
+        owner = seed(prefix, 1, size, max(size // 10, 1), seed_value)[0]
+        try:
+            context = {
+                'owner': owner,
+                'expense': Expense.objects.filter(owner=owner).values_list('pk', flat=True).first(),
+                'income': UserIncome.objects.filter(owner=owner).values_list('pk', flat=True).first(),
+                'category': Category.objects.get(name='Food').pk,
+                'source': Source.objects.get(name='Freelance').pk,
+                'page5': page_cursor(owner, 5),
+            }
+            client = Client()
+            client.force_login(owner)
+            endpoints = {}
+            for label, url_name, options in scenarios:
+                endpoints[label] = measure(client, url_name, options, context, repeat)
+                if log:
+                    log(size, label, endpoints[label])
+            results.append({'size': size, 'endpoints': endpoints})
+        finally:
+            if not keep:
+                owner.delete()
+    return results
+
+
+class Command(BaseCommand):
+    help = ('Seed data at several sizes, request every view through the test client and '
+            'write p50/p95 latency, query counts and peak memory to a JSON file.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000',
+                            help='Comma separated expense rows per benchmark user.')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed requests per endpoint.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Defaults to benchmark-<timestamp>.json.')
+        parser.add_argument('--compare', help='An earlier result file to print the differences against.')
+        parser.add_argument('--keep', action='store_true',
+                            help='Keep the seeded users and anything the requests wrote. By default '
+                                 'the users are deleted, and their rows with them.')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('--sizes must be comma separated integers')
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as baseline_file:
+                baseline = {result['size']: result['endpoints'] for result in json.load(baseline_file)['results']}
+
+        started = datetime.datetime.now()
+        # Requests commit as they would in production, so the cache
+        # invalidation their on_commit hooks do is part of what is timed;
+        # the seeded users are deleted afterwards rather than rolled back.
+        # One client repeating the same searches would be throttled.
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], SEARCH_RATE=0,
+                               SEARCH_COALESCE_SECONDS=0):
+            results = run(sizes, options['repeat'], options['seed'], log=self.log, keep=options['keep'])
+
+        output = options['output'] or f'benchmark-{started:%Y%m%d-%H%M%S}.json'
+        with open(output, 'w') as output_file:
+            json.dump({
+                'started': started.isoformat(timespec='seconds'),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'seed': options['seed'],
+                'repeat': options['repeat'],
+                'results': results,
+            }, output_file, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {output}'))
+
+        if baseline:
+            self.compare(baseline, results)
+
+    def log(self, size, label, result):
+        self.stdout.write(f"{size:>8} {label:<28} p50 {result['p50_ms']:>8.1f}ms  p95 {result['p95_ms']:>8.1f}ms  "
+                          f"{result['queries']:>3} queries  {result['peak_memory_kb']:>9.1f}KB")
+
+    def compare(self, baseline, results):
+        self.stdout.write('Change in p95 latency and queries against the baseline:')
+        for result in results:
+            for label, current in result['endpoints'].items():
+                previous = baseline.get(result['size'], {}).get(label)
+                if not previous:
+                    continue
+                change = (current['p95_ms'] - previous['p95_ms']) / previous['p95_ms'] * 100 if previous['p95_ms'] else 0
+                self.stdout.write(f"{result['size']:>8} {label:<28} p95 {change:>+7.1f}%  "
+                                  f"queries {current['queries'] - previous['queries']:>+3}")
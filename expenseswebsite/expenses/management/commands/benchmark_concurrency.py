@@ -0,0 +1,181 @@
+import asyncio
+import datetime
+import json
+import threading
+import time
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection, connections
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from .benchmark import percentile
+from .seed_data import seed
+
+PREFIX = 'concurrency-'
+# Every prefix of a word, as the search box sends them while it is typed.
+WORDS = ('Groceries', 'Coffee', 'Taxi')
+
+
+def workload():
+    """(method, URL, JSON body) of the requests the clients cycle through."""
+    requests = [('post', reverse('search-expenses'), {'searchText': word[:length]})
+                for word in WORDS for length in range(1, len(word) + 1)]
+    requests += [('get', reverse('expense_category_summary'), None),
+                 ('get', reverse('income_category_summary'), None),
+                 ('post', reverse('validate-username'), {'username': 'someone'}),
+                 ('post', reverse('validate-email'), {'email': 'someone@example.com'})]
+    return requests
+
+
+def call(client, method, url, body):
+    if body is None:
+        return getattr(client, method)(url)
+    return getattr(client, method)(url, json.dumps(body), content_type='application/json')
+
+
+def summarize(latencies, statuses, elapsed):
+    return {
+        'requests': len(latencies),
+        'errors': sum(1 for status in statuses if status >= 400),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.5), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'max_ms': round(max(latencies), 2),
+    }
+
+
+def run_wsgi(owner, requests, concurrency, threads):
+    """``concurrency`` clients sharing one WSGI worker with ``threads``
+    threads; latency includes the wait for a free thread."""
+    workers = threading.Semaphore(threads)
+    pending = iter(requests)
+    lock = threading.Lock()
+    latencies, statuses = [], []
+
+    def client_loop():
+        client = Client(raise_request_exception=False)
+        client.force_login(owner)
+        connection.close()
+        while True:
+            with lock:
+                request = next(pending, None)
+            if request is None:
+                break
+            started = time.perf_counter()
+            with workers:
+                response = call(client, *request)
+                # What the server does between requests of a thread.
+                close_old_connections()
+            with lock:
+                latencies.append((time.perf_counter() - started) * 1000)
+                statuses.append(response.status_code)
+        connection.close()
+
+    clients = [threading.Thread(target=client_loop) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    return summarize(latencies, statuses, time.perf_counter() - started)
+
+
+async def run_asgi(owner, requests, concurrency):
+    """``concurrency`` clients multiplexed by one ASGI worker, each request
+    in its own thread-sensitive context as under an ASGI server."""
+    pending = iter(requests)
+    latencies, statuses = [], []
+
+    async def client_loop():
+        client = AsyncClient(raise_request_exception=False)
+        async with ThreadSensitiveContext():
+            await client.aforce_login(owner)
+            await sync_to_async(connections.close_all)()
+        for request in pending:
+            started = time.perf_counter()
+            async with ThreadSensitiveContext():
+                response = await call(client, *request)
+                await sync_to_async(close_old_connections)()
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses.append(response.status_code)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return summarize(latencies, statuses, time.perf_counter() - started)
+
+
+def run(rows, levels, count, threads, seed_value=0, log=None):
+    User.objects.filter(username__startswith=PREFIX).delete()
+    owner = seed(PREFIX, 1, rows, max(rows // 10, 1), seed_value)[0]
+    requests = workload()
+    requests = [requests[i % len(requests)] for i in range(count)]
+    results = []
+    for concurrency in levels:
+        result = {
+            'concurrency': concurrency,
+            'wsgi': run_wsgi(owner, requests, concurrency, threads),
+            'asgi': asyncio.run(run_asgi(owner, requests, concurrency)),
+        }
+        if log:
+            log(result)
+        results.append(result)
+    return owner, results
+
+
+class Command(BaseCommand):
+    help = ('Fire concurrent search, summary and validation requests at the JSON endpoints, '
+            'once through a threaded WSGI worker and once through a single ASGI worker, and '
+            'write throughput and latency per concurrency level to a JSON file.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Expense rows of the benchmark user.')
+        parser.add_argument('--concurrency', default='1,10,50,100', help='Comma separated client counts.')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per concurrency level and path.')
+        parser.add_argument('--threads', type=int, default=4, help='Threads of the WSGI worker.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Defaults to benchmark-concurrency-<timestamp>.json.')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark user and its rows.')
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level) for level in options['concurrency'].split(',')]
+        except ValueError:
+            raise CommandError('--concurrency must be comma separated integers')
+        if options['requests'] < 1 or options['threads'] < 1:
+            raise CommandError('--requests and --threads must be at least 1')
+
+        started = datetime.datetime.now()
+        # Requests run on other threads and connections, so the seeded rows
+        # are committed and deleted afterwards rather than rolled back. The
+        # clients share one user, whose searches would be throttled and
+        # coalesced.
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], SEARCH_RATE=0,
+                               SEARCH_COALESCE_SECONDS=0):
+            owner, results = run(options['rows'], levels, options['requests'], options['threads'],
+                                 options['seed'], log=self.log)
+        if not options['keep']:
+            owner.delete()
+
+        output = options['output'] or f'benchmark-concurrency-{started:%Y%m%d-%H%M%S}.json'
+        with open(output, 'w') as output_file:
+            json.dump({
+                'started': started.isoformat(timespec='seconds'),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'rows': options['rows'],
+                'requests': options['requests'],
+                'threads': options['threads'],
+                'results': results,
+            }, output_file, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {output}'))
+
+    def log(self, result):
+        for path in ('wsgi', 'asgi'):
+            measured = result[path]
+            self.stdout.write(f"{result['concurrency']:>5} clients {path}  {measured['throughput_rps']:>8.1f} req/s  "
+                              f"p50 {measured['p50_ms']:>8.1f}ms  p95 {measured['p95_ms']:>8.1f}ms  "
+                              f"{measured['errors']} errors")
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from expenses.models import Expense, ExpenseMonthlyTotal
+from userincome.models import UserIncome, IncomeMonthlyTotal
+from expenseswebsite import statements
+
+TARGETS = {
+    'expenses': (Expense, ExpenseMonthlyTotal, 'debit'),
+    'income': (UserIncome, IncomeMonthlyTotal, 'credit'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Import a CSV or OFX bank statement as expenses or income for one user.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('path')
+        parser.add_argument('--kind', choices=sorted(TARGETS), default='expenses')
+        parser.add_argument('--format', choices=['csv', 'ofx'],
+                            help='Defaults to ofx for .ofx/.qfx files and csv otherwise.')
+        parser.add_argument('--default-key', default=statements.DEFAULT_KEY,
+                            help='Category or source for rows that do not name one.')
+        parser.add_argument('--currency', default=settings.BASE_CURRENCY,
+                            help='Currency of rows whose statement does not name one.')
+        parser.add_argument('--chunk-size', type=int, default=statements.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            owner = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']} does not exist")
+        model, rollup_model, direction = TARGETS[options['kind']]
+        key_model = model._meta.get_field(rollup_model.key_field).related_model
+        if not key_model.objects.filter(name=options['default_key']).exists():
+            raise CommandError(f"{key_model._meta.verbose_name.capitalize()} {options['default_key']} does not exist")
+        statement_format = options['format'] or statements.detect_format(options['path'])
+
+        with open(options['path'], 'rb') as binary_file:
+            result = statements.import_statement(model, rollup_model, owner, binary_file,
+                                                 statement_format, direction,
+                                                 options['default_key'], options['currency'].upper(),
+                                                 options['chunk_size'])
+
+        for error in result.errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result.created} rows, {result.duplicates} duplicates, {result.skipped} skipped'))
@@ -0,0 +1,73 @@
+import csv
+import datetime
+import math
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from expenses.models import Expense
+from userincome.models import UserIncome
+from userpreferences.models import ExchangeRate
+from userpreferences import rates
+
+BATCH_SIZE = 5000
+
+
+def read_rates(path):
+    with open(path, newline='', encoding='utf-8-sig') as rates_file:
+        reader = csv.DictReader(rates_file)
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+        for line, row in enumerate(reader, start=2):
+            try:
+                rate = ExchangeRate(currency=row['currency'].strip().upper(),
+                                    date=datetime.date.fromisoformat(row['date'].strip()),
+                                    rate=float(row['rate']))
+            except (KeyError, AttributeError, ValueError):
+                raise CommandError(f'{path}, line {line}: expected date, currency and rate columns')
+            # Amounts are divided by the rate.
+            if not math.isfinite(rate.rate) or rate.rate <= 0:
+                raise CommandError(f'{path}, line {line}: rate must be a positive number')
+            yield rate
+
+
+class Command(BaseCommand):
+    help = ('Load daily exchange rates from CSV files with date, currency and rate columns, '
+            'where rate is units of the currency per one BASE_CURRENCY, then reprice the '
+            'stored amounts in those currencies.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+')
+        parser.add_argument('--no-reprice', action='store_false', dest='reprice',
+                            help='Only load the rates; leave stored amounts alone.')
+
+    def handle(self, *args, **options):
+        currencies = set()
+        loaded = 0
+        for path in options['paths']:
+            try:
+                batch = []
+                for rate in read_rates(path):
+                    batch.append(rate)
+                    if len(batch) >= BATCH_SIZE:
+                        loaded += self.save(batch, currencies)
+                        batch = []
+                loaded += self.save(batch, currencies)
+            except OSError as error:
+                raise CommandError(str(error))
+        currencies.discard(settings.BASE_CURRENCY)
+        self.stdout.write(f'Loaded {loaded} rates for {len(currencies)} currencies')
+
+        if options['reprice'] and currencies:
+            owner_ids = set()
+            with transaction.atomic():
+                for model in (Expense, UserIncome):
+                    queryset = model.objects.filter(currency__in=currencies)
+                    owner_ids.update(queryset.order_by().values_list('owner_id', flat=True).distinct())
+                    # The update rebuilds the monthly totals of the owners it touches.
+                    rates.reprice(queryset)
+            self.stdout.write(self.style.SUCCESS(f'Repriced amounts for {len(owner_ids)} users'))
+
+    def save(self, batch, currencies):
+        ExchangeRate.objects.bulk_create(batch, update_conflicts=True, unique_fields=['currency', 'date'],
+                                         update_fields=['rate'])
+        currencies.update(rate.currency for rate in batch)
+        return len(batch)
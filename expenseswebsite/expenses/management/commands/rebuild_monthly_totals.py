@@ -0,0 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections
+from expenses.models import Expense, ExpenseMonthlyTotal
+from userincome.models import UserIncome, IncomeMonthlyTotal
+
+
+def rebuild_owner(owner_id):
+    ExpenseMonthlyTotal.objects.rebuild(owner_id, Expense.objects.all())
+    IncomeMonthlyTotal.objects.rebuild(owner_id, UserIncome.objects.all())
+    return owner_id
+
+
+def rebuild_owner_in_thread(owner_id):
+    try:
+        return rebuild_owner(owner_id)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-user monthly expense and income totals from the source rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='usernames', default=[],
+                            help='Only rebuild this user (may be repeated).')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Number of users rebuilt in parallel.')
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+        owner_ids = list(users.values_list('pk', flat=True))
+
+        if options['workers'] <= 1:
+            for owner_id in owner_ids:
+                rebuild_owner(owner_id)
+        else:
+            with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+                futures = [executor.submit(rebuild_owner_in_thread, owner_id) for owner_id in owner_ids]
+                for future in as_completed(futures):
+                    future.result()
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt monthly totals for {len(owner_ids)} users'))
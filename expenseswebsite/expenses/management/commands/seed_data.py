@@ -0,0 +1,137 @@
+import datetime
+import itertools
+import random
+from decimal import Decimal
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from expenses.models import Category, Expense
+from userincome.models import Source, UserIncome
+from .rebuild_monthly_totals import rebuild_owner
+
+BATCH_SIZE = 10000
+PASSWORD = 'benchmark'
+
+# (name, share of expenses, median amount, spread); amounts are log-normal.
+EXPENSE_CATEGORIES = [
+    ('Food', 0.38, 18, 0.7),
+    ('Transport', 0.20, 12, 0.8),
+    ('Shopping', 0.14, 45, 1.0),
+    ('Entertainment', 0.10, 30, 0.9),
+    ('Health', 0.06, 60, 1.1),
+    ('Utilities', 0.07, 80, 0.4),
+    ('Travel', 0.05, 350, 1.2),
+]
+INCOME_SOURCES = [
+    ('Freelance', 0.6, 400, 0.9),
+    ('Investments', 0.3, 120, 1.1),
+    ('Gifts', 0.1, 80, 0.8),
+]
+DESCRIPTIONS = {
+    'Food': ['Groceries', 'Lunch', 'Coffee', 'Dinner out', 'Bakery', 'Takeaway'],
+    'Transport': ['Bus ticket', 'Fuel', 'Taxi', 'Train', 'Parking'],
+    'Shopping': ['Clothes', 'Books', 'Electronics', 'Household items'],
+    'Entertainment': ['Cinema', 'Concert', 'Streaming subscription', 'Games'],
+    'Health': ['Pharmacy', 'Doctor visit', 'Gym membership'],
+    'Utilities': ['Electricity bill', 'Water bill', 'Internet', 'Phone plan'],
+    'Travel': ['Flight', 'Hotel', 'Car rental'],
+    'Freelance': ['Client invoice', 'Consulting', 'Design project'],
+    'Investments': ['Dividends', 'Interest'],
+    'Gifts': ['Birthday gift', 'Family transfer'],
+}
+
+
+def amount(rng, median, spread):
+    return Decimal(str(round(rng.lognormvariate(0, spread) * median, 2))) or Decimal('0.01')
+
+
+def expense_rows(rng, owner_id, count, start, days, keys):
+    names, weights = zip(*[(name, share) for name, share, _, _ in EXPENSE_CATEGORIES])
+    shapes = {name: (median, spread) for name, _, median, spread in EXPENSE_CATEGORIES}
+    for _ in range(count):
+        category = rng.choices(names, weights)[0]
+        yield {'owner_id': owner_id, 'category_id': keys[category], 'amount': amount(rng, *shapes[category]),
+               'date': start + datetime.timedelta(days=rng.randrange(days)),
+               'description': rng.choice(DESCRIPTIONS[category])}
+
+
+def income_rows(rng, owner_id, count, start, days, keys):
+    # A monthly salary plus irregular income from the other sources.
+    salary = Decimal(rng.randrange(1500, 6000))
+    month = start.replace(day=1)
+    months = 0
+    while month <= start + datetime.timedelta(days=days - 1) and months < count:
+        yield {'owner_id': owner_id, 'source_id': keys['Salary'], 'amount': salary, 'date': month,
+               'description': 'Monthly salary'}
+        month = (month + datetime.timedelta(days=32)).replace(day=1)
+        months += 1
+    names, weights = zip(*[(name, share) for name, share, _, _ in INCOME_SOURCES])
+    shapes = {name: (median, spread) for name, _, median, spread in INCOME_SOURCES}
+    for _ in range(count - months):
+        source = rng.choices(names, weights)[0]
+        yield {'owner_id': owner_id, 'source_id': keys[source], 'amount': amount(rng, *shapes[source]),
+               'date': start + datetime.timedelta(days=rng.randrange(days)),
+               'description': rng.choice(DESCRIPTIONS[source])}
+
+
+def insert(model, rows, batch_size):
+    rows = iter(rows)
+    while True:
+        batch = [model(base_amount=row['amount'], currency=settings.BASE_CURRENCY, **row)
+                 for row in itertools.islice(rows, batch_size)]
+        if not batch:
+            return
+        model.objects.bulk_create(batch)
+
+
+def named_keys(model, names):
+    return {name: model.objects.get_or_create(name=name)[0].pk for name in names}
+
+
+def seed(prefix, users, expenses, income, seed=0, days=730, batch_size=BATCH_SIZE):
+    """Create ``users`` users named ``<prefix>NNNN`` with the given number
+    of expense and income rows each, ending today. The same arguments
+    always produce the same rows."""
+    categories = named_keys(Category, [row[0] for row in EXPENSE_CATEGORIES])
+    sources = named_keys(Source, [row[0] for row in INCOME_SOURCES] + ['Salary'])
+
+    password = make_password(PASSWORD)
+    start = datetime.date.today() - datetime.timedelta(days=days - 1)
+    owners = []
+    for number in range(users):
+        rng = random.Random(f'{seed}:{number}')
+        with transaction.atomic():
+            owner = User.objects.create(username=f'{prefix}{number:04d}', password=password,
+                                        email=f'{prefix}{number:04d}@example.com')
+            insert(Expense, expense_rows(rng, owner.pk, expenses, start, days, categories), batch_size)
+            insert(UserIncome, income_rows(rng, owner.pk, income, start, days, sources), batch_size)
+            rebuild_owner(owner.pk)
+        owners.append(owner)
+    return owners
+
+
+class Command(BaseCommand):
+    help = ('Create users with realistic, reproducible expense and income histories '
+            f'for load testing. Their password is "{PASSWORD}".')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--expenses', type=int, default=1000, help='Expense rows per user.')
+        parser.add_argument('--income', type=int, default=100, help='Income rows per user.')
+        parser.add_argument('--days', type=int, default=730, help='Length of the history, ending today.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='seed', help='Usernames are <prefix>0000, <prefix>0001, ...')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--clear', action='store_true',
+                            help='Delete users created earlier with the same prefix first.')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            User.objects.filter(username__regex=rf"^{options['prefix']}[0-9]{{4}}$").delete()
+        owners = seed(options['prefix'], options['users'], options['expenses'], options['income'],
+                      options['seed'], options['days'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(owners)} users with {options['expenses']} expenses and "
+            f"{options['income']} income rows each"))
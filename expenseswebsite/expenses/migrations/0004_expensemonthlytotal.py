@@ -0,0 +1,43 @@
+# Generated by Django 5.1.3 on 2026-10-18 02:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def populate_monthly_totals(apps, schema_editor):
+    Expense = apps.get_model('expenses', 'Expense')
+    ExpenseMonthlyTotal = apps.get_model('expenses', 'ExpenseMonthlyTotal')
+    rows = (Expense.objects.annotate(month=TruncMonth('date'))
+            .values('owner_id', 'month', 'category')
+            .annotate(total=Sum('amount'), count=Count('id'))
+            .order_by())
+    ExpenseMonthlyTotal.objects.bulk_create((ExpenseMonthlyTotal(**row) for row in rows.iterator()), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0003_alter_expense_options'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpenseMonthlyTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('total', models.FloatField(default=0)),
+                ('count', models.IntegerField(default=0)),
+                ('category', models.CharField(max_length=266)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('owner', 'month', 'category'), name='unique_expense_monthly_total')],
+            },
+        ),
+        migrations.RunPython(populate_monthly_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.3 on 2026-10-18 02:44
+
+import django.contrib.postgres.search
+from django.db import migrations
+from expenseswebsite.operations import RunPostgresSQL
+
+SEARCH_VECTOR = """
+    setweight(to_tsvector('pg_catalog.english', coalesce(%(row)sdescription, '')), 'A') ||
+    setweight(to_tsvector('pg_catalog.english', coalesce(%(row)scategory, '')), 'B')
+"""
+
+CREATE_TRIGGER = [
+"""
+CREATE FUNCTION expenses_expense_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := %s;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+""" % (SEARCH_VECTOR % {'row': 'NEW.'}),
+"""
+CREATE TRIGGER expenses_expense_search_vector_trigger
+BEFORE INSERT OR UPDATE OF description, category ON expenses_expense
+FOR EACH ROW EXECUTE FUNCTION expenses_expense_search_vector_update()
+""",
+"""
+UPDATE expenses_expense SET search_vector = %s
+""" % (SEARCH_VECTOR % {'row': ''}),
+"""
+CREATE INDEX expenses_expense_search_vector_gin ON expenses_expense USING gin (search_vector)
+""",
+]
+
+DROP_TRIGGER = [
+"DROP INDEX IF EXISTS expenses_expense_search_vector_gin",
+"DROP TRIGGER IF EXISTS expenses_expense_search_vector_trigger ON expenses_expense",
+"DROP FUNCTION IF EXISTS expenses_expense_search_vector_update()",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0004_expensemonthlytotal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        RunPostgresSQL(CREATE_TRIGGER, DROP_TRIGGER),
+    ]
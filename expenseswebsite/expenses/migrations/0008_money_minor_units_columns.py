@@ -0,0 +1,28 @@
+# Generated by Django 5.1.3 on 2026-10-18 04:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0007_expense_base_amount_expense_currency'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='amount_cents',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='base_amount_cents',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='expensemonthlytotal',
+            name='total_cents',
+            field=models.BigIntegerField(null=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.3 on 2026-10-18 04:10
+
+from django.db import migrations
+from expenseswebsite.money import backfill_minor_units
+
+
+def backfill(apps, schema_editor):
+    backfill_minor_units(apps.get_model('expenses', 'Expense'),
+                         {'amount': 'amount_cents', 'base_amount': 'base_amount_cents'})
+    backfill_minor_units(apps.get_model('expenses', 'ExpenseMonthlyTotal'), {'total': 'total_cents'})
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own; running the migration again after an
+    # interruption carries on with the rows that are still NULL.
+    atomic = False
+
+    dependencies = [
+        ('expenses', '0008_money_minor_units_columns'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
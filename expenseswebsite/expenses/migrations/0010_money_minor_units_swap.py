@@ -0,0 +1,65 @@
+# Generated by Django 5.1.3 on 2026-10-18 04:10
+
+import expenseswebsite.money
+from django.db import migrations, models
+from expenseswebsite.money import backfill_minor_units
+
+
+def backfill_remaining(apps, schema_editor):
+    # Rows written since the batched backfill ran.
+    backfill_minor_units(apps.get_model('expenses', 'Expense'),
+                         {'amount': 'amount_cents', 'base_amount': 'base_amount_cents'})
+    backfill_minor_units(apps.get_model('expenses', 'ExpenseMonthlyTotal'), {'total': 'total_cents'})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0009_money_minor_units_backfill'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_remaining, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='expense',
+            name='amount',
+        ),
+        migrations.RemoveField(
+            model_name='expense',
+            name='base_amount',
+        ),
+        migrations.RemoveField(
+            model_name='expensemonthlytotal',
+            name='total',
+        ),
+        migrations.RenameField(
+            model_name='expense',
+            old_name='amount_cents',
+            new_name='amount',
+        ),
+        migrations.RenameField(
+            model_name='expense',
+            old_name='base_amount_cents',
+            new_name='base_amount',
+        ),
+        migrations.RenameField(
+            model_name='expensemonthlytotal',
+            old_name='total_cents',
+            new_name='total',
+        ),
+        migrations.AlterField(
+            model_name='expense',
+            name='amount',
+            field=expenseswebsite.money.MoneyField(),
+        ),
+        migrations.AlterField(
+            model_name='expense',
+            name='base_amount',
+            field=expenseswebsite.money.MoneyField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='expensemonthlytotal',
+            name='total',
+            field=expenseswebsite.money.MoneyField(default=0),
+        ),
+    ]
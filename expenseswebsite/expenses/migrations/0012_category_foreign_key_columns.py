@@ -0,0 +1,35 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+from expenseswebsite.operations import deduplicate_names
+
+
+def deduplicate_categories(apps, schema_editor):
+    deduplicate_names(apps.get_model('expenses', 'Category'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0011_expense_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate_categories, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='category',
+            name='name',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='category_key',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='expenses.category'),
+        ),
+        migrations.AddField(
+            model_name='expensemonthlytotal',
+            name='category_key',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='expenses.category'),
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:20
+
+import django.db.models.deletion
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+from expenseswebsite.operations import RunPostgresSQL, backfill_foreign_key
+
+
+def backfill_remaining(apps, schema_editor):
+    # Rows written since the batched backfill ran.
+    updates = {}
+    if schema_editor.connection.vendor == 'postgresql':
+        updates['search_vector'] = SearchVector('description', config='english', weight='A')
+    backfill_foreign_key(apps.get_model('expenses', 'Expense'), 'category', 'category_key', **updates)
+    backfill_foreign_key(apps.get_model('expenses', 'ExpenseMonthlyTotal'), 'category', 'category_key')
+
+
+SEARCH_VECTOR = """
+    setweight(to_tsvector('pg_catalog.english', coalesce(NEW.description, '')), 'A')
+"""
+
+OLD_SEARCH_VECTOR = """
+    setweight(to_tsvector('pg_catalog.english', coalesce(NEW.description, '')), 'A') ||
+    setweight(to_tsvector('pg_catalog.english', coalesce(NEW.category, '')), 'B')
+"""
+
+REPLACE_TRIGGER = """
+DROP TRIGGER IF EXISTS expenses_expense_search_vector_trigger ON expenses_expense;
+CREATE OR REPLACE FUNCTION expenses_expense_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := %s;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+CREATE TRIGGER expenses_expense_search_vector_trigger
+BEFORE INSERT OR UPDATE OF description%s ON expenses_expense
+FOR EACH ROW EXECUTE FUNCTION expenses_expense_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0013_category_foreign_key_backfill'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_remaining, migrations.RunPython.noop),
+        RunPostgresSQL(REPLACE_TRIGGER % (SEARCH_VECTOR, ''),
+                       REPLACE_TRIGGER % (OLD_SEARCH_VECTOR, ', category')),
+        migrations.RemoveIndex(
+            model_name='expense',
+            name='expense_owner_cat_date_idx',
+        ),
+        migrations.RemoveConstraint(
+            model_name='expensemonthlytotal',
+            name='unique_expense_monthly_total',
+        ),
+        migrations.RemoveField(
+            model_name='expense',
+            name='category',
+        ),
+        migrations.RemoveField(
+            model_name='expensemonthlytotal',
+            name='category',
+        ),
+        migrations.RenameField(
+            model_name='expense',
+            old_name='category_key',
+            new_name='category',
+        ),
+        migrations.RenameField(
+            model_name='expensemonthlytotal',
+            old_name='category_key',
+            new_name='category',
+        ),
+        migrations.AlterField(
+            model_name='expense',
+            name='category',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='expenses.category'),
+        ),
+        migrations.AlterField(
+            model_name='expensemonthlytotal',
+            name='category',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='expenses.category'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['owner', 'category', 'date'], name='expense_owner_cat_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='expensemonthlytotal',
+            constraint=models.UniqueConstraint(fields=('owner', 'month', 'category'), name='unique_expense_monthly_total'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.3 on 2026-10-18 04:15
+
+import django.db.models.deletion
+import expenseswebsite.money
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0014_category_foreign_key_swap'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryBudget',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', expenseswebsite.money.MoneyField()),
+                ('category', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='expenses.category')),
+                ('owner', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('owner', 'category'), name='unique_category_budget')],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.3 on 2026-10-18 04:35
+
+from django.db import migrations
+
+
+def create_uncategorized(apps, schema_editor):
+    # The category of imported rows that name none; imports no longer
+    # create categories.
+    apps.get_model('expenses', 'Category').objects.get_or_create(name='Uncategorized')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0015_categorybudget'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_uncategorized, migrations.RunPython.noop),
+    ]
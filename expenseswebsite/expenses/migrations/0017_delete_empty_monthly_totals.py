@@ -0,0 +1,19 @@
+# Generated by Django 5.1.3 on 2026-10-18 09:12
+
+from django.db import migrations
+
+
+def delete_empty_totals(apps, schema_editor):
+    # Removing the last expense of a month now deletes its rollup row.
+    apps.get_model('expenses', 'ExpenseMonthlyTotal').objects.filter(count__lte=0).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0016_uncategorized'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_empty_totals, migrations.RunPython.noop),
+    ]
@@ -1,26 +1,101 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils.timezone import now
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
+from expenseswebsite.rollups import MonthlyTotal, RollupSourceQuerySet
+from expenseswebsite.money import MoneyField
+from django.conf import settings
+from expenseswebsite import timeseries
+from userpreferences import rates
 
 # Create your models here.
 class Expense(models.Model):
-    amount = models.FloatField()
+    amount = MoneyField()
     date = models.DateField(default=now)
     description = models.TextField()
-    owner = models.ForeignKey(to=User, on_delete=models.CASCADE)
-    category = models.CharField(max_length=266)
+    # Indexed by the composite (owner, date, id) index below.
+    owner = models.ForeignKey(to=User, on_delete=models.CASCADE, db_index=False)
+    # Indexed by the composite (owner, category, date) index below; deleting a
+    # category, which is rare, has to scan for rows still using it.
+    category = models.ForeignKey(to='Category', on_delete=models.PROTECT, db_index=False)
+    currency = models.CharField(max_length=3, default=settings.BASE_CURRENCY)
+    # The amount in settings.BASE_CURRENCY at the rate of `date`; totals add this up.
+    base_amount = MoneyField(default=0, editable=False)
+    # Maintained by a database trigger on PostgreSQL, see migrations.
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Set by the statement importer so re-imported rows can be skipped.
+    import_hash = models.CharField(max_length=64, null=True, blank=True, editable=False)
+    
+    # Deletes, queryset deletes included, leave the rollup through the
+    # pre_delete receiver in signals.py.
+    objects = RollupSourceQuerySet.as_manager()
+    rollup_model = 'expenses.ExpenseMonthlyTotal'
     
     def __str__(self):
-        return self.category
+        return self.category.name
+    
+    def save(self, *args, **kwargs):
+        # Keep the monthly rollup in step with the row, in the same transaction.
+        self.amount = self._meta.get_field('amount').to_python(self.amount)
+        self.date = self._meta.get_field('date').to_python(self.date)
+        self.base_amount = rates.to_base(self.amount, self.currency, self.date)
+        with transaction.atomic():
+            previous = None
+            if self.pk is not None:
+                previous = (Expense.objects.select_for_update()
+                            .filter(pk=self.pk).values('owner_id', 'date', 'category_id', 'base_amount').first())
+            super().save(*args, **kwargs)
+            if previous:
+                ExpenseMonthlyTotal.objects.remove(previous['owner_id'], previous['date'],
+                                                   previous['category_id'], previous['base_amount'])
+            ExpenseMonthlyTotal.objects.add(self.owner_id, self.date, self.category_id, self.base_amount)
+            timeseries.invalidate(self.owner_id)
     
     class Meta:
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['owner', '-date', 'id'], name='expense_owner_date_id_idx'),
+            models.Index(fields=['owner', 'category', 'date'], name='expense_owner_cat_date_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'import_hash'], name='unique_expense_import_hash'),
+        ]
     
 class Category(models.Model):
-    name = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, unique=True)
     
     class Meta:
         verbose_name_plural = 'Categories'
     
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+class ExpenseMonthlyTotal(MonthlyTotal):
+    key_field = 'category'
+    
+    owner = models.ForeignKey(to=User, on_delete=models.CASCADE)
+    # Lookups go through the unique constraint below. Totals are derived
+    # from expenses, whose own key keeps a category in use from deletion.
+    category = models.ForeignKey(to=Category, on_delete=models.CASCADE, db_index=False)
+    
+    def __str__(self):
+        return f'{self.owner} {self.month:%Y-%m} {self.category.name}'
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'month', 'category'], name='unique_expense_monthly_total'),
+        ]
+
+class CategoryBudget(models.Model):
+    owner = models.ForeignKey(to=User, on_delete=models.CASCADE, db_index=False)
+    category = models.ForeignKey(to=Category, on_delete=models.CASCADE, db_index=False)
+    # Monthly limit in settings.BASE_CURRENCY, compared with ExpenseMonthlyTotal.total.
+    amount = MoneyField()
+    
+    def __str__(self):
+        return f'{self.owner} {self.category.name}'
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'category'], name='unique_category_budget'),
+        ]
@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from expenseswebsite import refdata, timeseries
+from expenseswebsite.rollups import deleting_owner
+from .models import Category, Expense, ExpenseMonthlyTotal
+
+
+def load_categories():
+    return tuple(Category.objects.order_by('name'))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_categories(sender, **kwargs):
+    refdata.bump('categories')
+    transaction.on_commit(lambda: refdata.bump('categories'))
+
+
+@receiver(pre_delete, sender=Expense)
+def remove_from_monthly_total(sender, instance, origin=None, **kwargs):
+    # Sent for queryset and admin deletes too, within their transaction.
+    if deleting_owner(origin):
+        return
+    ExpenseMonthlyTotal.objects.remove(instance.owner_id, instance.date, instance.category_id, instance.base_amount)
+    timeseries.invalidate(instance.owner_id)
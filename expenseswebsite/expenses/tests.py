@@ -1,17 +1,62 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, AsyncClient
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.paginator import Paginator
 from django.utils.timezone import now
 from django.urls import reverse
 import json
-from expenses.models import Expense, Category
-from userpreferences.models import UserPreference
+from expenses.models import Expense, Category, CategoryBudget, ExpenseMonthlyTotal
+from expenses import budgets
+from authentication import sessions
+from expenses.management.commands.benchmark import page_cursor
+from userincome.models import UserIncome, Source
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections, transaction
+from django.db.models import ProtectedError
+from django.test import override_settings, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+import unittest
+from userpreferences.models import UserPreference, ExchangeRate
+from userpreferences.cache import get_preference
 from datetime import timedelta
 from django.contrib.messages import get_messages
+import asyncio
 import datetime
+import os
+import tempfile
+import gzip
+import brotli
+from decimal import Decimal
+from django.core.files.uploadedfile import SimpleUploadedFile
+from expenseswebsite.pagination import encode_cursor, keyset_page
+from expenseswebsite.querybudget import QueryBudgetMixin, warm_caches
+from expenseswebsite.middleware import RepeatedQueryMiddleware, query_shape
+from django.core.exceptions import MiddlewareNotUsed, ValidationError
+from django.http import HttpResponse
+from django.test import RequestFactory
+from expenseswebsite import metrics, refdata, routers, throttle, timeseries
+import shutil
+import threading
+import time
+from django.core.cache import cache
+from expenses import urls as expenses_urls
+from expenseswebsite import urls as root_urls
+from django.core.handlers.asgi import ASGIHandler
+from django.templatetags.static import static
 
 # Create your tests here.
 
+def category_named(name):
+    return Category.objects.get_or_create(name=name)[0]
+
+def close_pools(aliases):
+    # The test runner only closes the pools of the databases it created,
+    # not of mirrors such as the replicas; only PostgreSQL has pools.
+    for alias in aliases:
+        if hasattr(connections[alias], 'close_pool'):
+            connections[alias].close_pool()
+
 class ExpenseModelTest(TestCase):
     def setUp(self):
         self.user = get_user_model().objects.create_user(username='testuser', email='test@example.com', password='password123')
@@ -21,14 +66,14 @@ class ExpenseModelTest(TestCase):
             date = now().date(),
             description = 'Dinner at a restaurant',
             owner = self.user,
-            category = self.category.name
+            category = self.category
         )
         
     def test_expense_creation(self):
         self.assertEqual(self.expense.amount, 50.75)
         self.assertEqual(self.expense.description, 'Dinner at a restaurant')
         self.assertEqual(self.expense.owner, self.user)
-        self.assertEqual(self.expense.category, 'Food')
+        self.assertEqual(self.expense.category.name, 'Food')
         
     def test_expense_str_respresentation(self):
         self.assertEqual(str(self.expense), 'Food')
@@ -39,7 +84,7 @@ class ExpenseModelTest(TestCase):
             date = now().date(),
             description = 'Groceries',
             owner = self.user,
-            category = 'Shopping'
+            category = category_named('Shopping')
         )
         expenses = Expense.objects.all()
         self.assertEqual(expenses.first(), self.expense)
@@ -66,7 +111,7 @@ class SearchExpenseTest(TestCase):
             date = now().date(),
             description = "Dinner at a restaurant",
             owner = self.user,
-            category = "Food"
+            category = category_named("Food")
         )
         
         self.expense2 = Expense.objects.create(
@@ -74,7 +119,7 @@ class SearchExpenseTest(TestCase):
             date = now().date(),
             description = "Lunch at work",
             owner = self.user,
-            category = "Work"
+            category = category_named("Work")
         )
                 
         self.expense3 = Expense.objects.create(
@@ -82,7 +127,7 @@ class SearchExpenseTest(TestCase):
             date = now().date(),
             description = "Taxi ride",
             owner = self.user,
-            category = "Transport"
+            category = category_named("Transport")
         )
         
         self.url = '/search-expenses'
@@ -115,6 +160,73 @@ class SearchExpenseTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.json()), 0)
         
+    def test_search_by_amount_prefix(self):
+        response = self.client.post(self.url, json.dumps({'searchText': '15.'}), content_type='application/json')
+        self.assertEqual([item['description'] for item in response.json()], ['Taxi ride'])
+        
+    def test_search_by_partial_word(self):
+        response = self.client.post(self.url, json.dumps({'searchText': 'restau'}), content_type='application/json')
+        self.assertEqual(len(response.json()), 1)
+        self.assertEqual(set(response.json()[0]), {'id', 'amount', 'date', 'description', 'owner_id', 'category'})
+        
+    @override_settings(SEARCH_RESULT_LIMIT=2)
+    def test_search_result_limit(self):
+        response = self.client.post(self.url, json.dumps({'searchText': str(now().date())}), content_type='application/json')
+        self.assertEqual(len(response.json()), 2)
+        
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'full-text search requires PostgreSQL')
+    def test_search_ranks_description_above_category(self):
+        Expense.objects.create(amount=5, date=now().date() + timedelta(days=1), description='Airport transfer',
+                               owner=self.user, category=category_named('Taxi'))
+        response = self.client.post(self.url, json.dumps({'searchText': 'taxi'}), content_type='application/json')
+        self.assertEqual([item['description'] for item in response.json()], ['Taxi ride', 'Airport transfer'])
+        
+class SearchThrottleTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = get_user_model().objects.create_user(username='testuser', email='test@example.com', password='password123')
+        self.client.login(username='testuser', password='password123')
+        cache.delete_many(list(throttle.keys('expenses', self.user.pk).values()))
+        for description in ('Lunch at work', 'Taxi ride'):
+            Expense.objects.create(amount=10, date=now().date(), description=description, owner=self.user,
+                                   category=category_named('Food'))
+            
+    def search(self, text):
+        return self.client.post(reverse('search-expenses'), json.dumps({'searchText': text}), content_type='application/json')
+        
+    @override_settings(SEARCH_RATE=0.1, SEARCH_BURST=2)
+    def test_throttled_searches_get_the_latest_results(self):
+        self.assertEqual(self.search('Lunch').status_code, 200)
+        self.assertEqual(self.search('Taxi').status_code, 200)
+        response = self.search('Dinner')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '10')
+        self.assertEqual([item['description'] for item in response.json()], ['Taxi ride'])
+        
+    async def test_newer_searches_supersede_waiting_ones(self):
+        started, release = asyncio.Event(), asyncio.Event()
+        ran = []
+        
+        def search(label, wait=False):
+            async def run():
+                ran.append(label)
+                if wait:
+                    started.set()
+                    await release.wait()
+                return [label]
+            return run
+            
+        first = asyncio.ensure_future(throttle.search_response('expenses', self.user, search('first', wait=True)))
+        await started.wait()
+        second = asyncio.ensure_future(throttle.search_response('expenses', self.user, search('second')))
+        await asyncio.sleep(0.1)
+        third = asyncio.ensure_future(throttle.search_response('expenses', self.user, search('third')))
+        await asyncio.sleep(0.1)
+        release.set()
+        responses = await asyncio.gather(first, second, third)
+        self.assertEqual(ran, ['first', 'third'])
+        self.assertEqual([json.loads(response.content) for response in responses], [['first'], [], ['third']])
+        
 class IndexViewTest(TestCase):
     def setUp(self):
         self.client = Client()
@@ -129,7 +241,7 @@ class IndexViewTest(TestCase):
             date = now().date(),
             description = "Dinner at a restaurant",
             owner = self.user,
-            category = "Food"
+            category = category_named("Food")
         )
         
         self.expense2 = Expense.objects.create(
@@ -137,7 +249,7 @@ class IndexViewTest(TestCase):
             date = now().date(),
             description = "Lunch at work",
             owner = self.user,
-            category = "Work"
+            category = category_named("Work")
         )
                 
         self.expense3 = Expense.objects.create(
@@ -145,7 +257,7 @@ class IndexViewTest(TestCase):
             date = now().date(),
             description = "Taxi ride",
             owner = self.user,
-            category = "Transport"
+            category = category_named("Transport")
         )
         
         self.url = '/'
@@ -178,6 +290,33 @@ class IndexViewTest(TestCase):
         response = self.client.get(self.url)
         self.assertContains(response, 'USD')
         
+    def test_cursor_pagination_walks_all_rows(self):
+        self.client.login(username='testuser', password='password123')
+        first = self.client.get(self.url).context['page_obj']
+        self.assertTrue(first.has_next)
+        self.assertFalse(first.has_previous)
+        second = self.client.get(self.url, {'after': first.next_cursor}).context['page_obj']
+        self.assertFalse(second.has_next)
+        self.assertTrue(second.has_previous)
+        ids = [expense.id for expense in first] + [expense.id for expense in second]
+        self.assertEqual(sorted(ids), sorted([self.expense1.id, self.expense2.id, self.expense3.id]))
+        back = self.client.get(self.url, {'before': second.previous_cursor}).context['page_obj']
+        self.assertEqual([expense.id for expense in back], [expense.id for expense in first])
+        self.assertFalse(back.has_previous)
+        
+    def test_page_size_and_total_count(self):
+        self.client.login(username='testuser', password='password123')
+        response = self.client.get(self.url, {'page_size': 10})
+        self.assertEqual(len(response.context['page_obj']), 3)
+        self.assertEqual(response.context['total_count'], 3)
+        self.assertContains(response, 'Showing 3 of 3')
+        
+    def test_invalid_cursor_returns_first_page(self):
+        self.client.login(username='testuser', password='password123')
+        response = self.client.get(self.url, {'after': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['page_obj'].has_previous)
+        
 class AddExpenseViewTest(TestCase):
     def setUp(self):
         self.client = Client()
@@ -201,7 +340,7 @@ class AddExpenseViewTest(TestCase):
             'amount': '100.50',
             'description': 'Groceries',
             'expense_date': now().date().isoformat(),
-            'category': self.category.name
+            'category': self.category.pk
         }
         response = self.client.post(self.url, data)
         self.assertEqual(response.status_code, 302)
@@ -213,7 +352,7 @@ class AddExpenseViewTest(TestCase):
             'amount': '',
             'description': 'Dinner',
             'expense_date': now().date().isoformat(),
-            'category': self.category.name
+            'category': self.category.pk
         }
         response = self.client.post(self.url, data)
         self.assertEqual(response.status_code, 200)
@@ -226,7 +365,7 @@ class AddExpenseViewTest(TestCase):
             'amount': '50',
             'description': '',
             'expense_date': now().date().isoformat(),
-            'category': self.category.name
+            'category': self.category.pk
         }
         response = self.client.post(self.url, data)
         self.assertEqual(response.status_code, 200)
@@ -238,9 +377,35 @@ class AddExpenseViewTest(TestCase):
             'amount': '50',
             'description': 'Bus tiquet',
             'expense_date': '',
-            'category': self.category.name
+            'category': self.category.pk
         }
 
+class CategoryReferenceDataTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = get_user_model().objects.create_user(username='testuser', email='test@example.com', password='password123')
+        self.client.login(username='testuser', password='password123')
+        Category.objects.create(name='Food')
+        self.url = reverse('add-expense')
+        
+    def category_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        return response, [q for q in queries if 'expenses_category' in q['sql']]
+        
+    def test_categories_are_served_from_memory(self):
+        self.category_queries()
+        response, queries = self.category_queries()
+        self.assertEqual(queries, [])
+        self.assertContains(response, 'Food')
+        
+    def test_new_category_invalidates_cache(self):
+        self.category_queries()
+        Category.objects.create(name='Transport')
+        response, queries = self.category_queries()
+        self.assertEqual(len(queries), 1)
+        self.assertContains(response, 'Transport')
+        
 class ExpenseEditViewTest(TestCase):
     def setUp(self):
         self.client = Client()
@@ -251,7 +416,7 @@ class ExpenseEditViewTest(TestCase):
             date = now().date(),
             description = 'Dinner at a restaurant',
             owner = self.user,
-            category = self.category.name
+            category = self.category
         )
         self.url = f'/edit-expense/{self.expense.id}'
         UserPreference.objects.create(user=self.user, currency='USD')
@@ -303,7 +468,7 @@ class DeleteExpenseViewTest(TestCase):
             date = "2024-03-01",
             description = 'Groceries',
             owner = self.user,
-            category = self.category.name
+            category = self.category
         )
         self.delete_url = reverse('expense-delete', args=[self.expense.id])
         
@@ -324,6 +489,51 @@ class DeleteExpenseViewTest(TestCase):
         expeted_url = reverse('login') + f'?next={self.delete_url}'
         self.assertRedirects(response, expeted_url)
         
+class CategoryKeyTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = get_user_model().objects.create_user(username='testuser', email='test@example.com', password='password123')
+        self.client.login(username='testuser', password='password123')
+        self.category = Category.objects.create(name='Food')
+        self.expense = Expense.objects.create(amount=20, date=now().date(), description='Lunch',
+                                              owner=self.user, category=self.category)
+        
+    def post(self, category):
+        return self.client.post(reverse('add-expense'), {
+            'amount': '5', 'description': 'Snack', 'expense_date': '2024-01-10', 'category': category})
+        
+    def test_form_posts_key_or_name(self):
+        self.post(self.category.pk)
+        self.post('Food')
+        self.assertEqual(Expense.objects.filter(description='Snack', category=self.category).count(), 2)
+        
+    def test_unknown_category_is_rejected(self):
+        response = self.post('Nope')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Choose a category from the list', [str(m) for m in get_messages(response.wsgi_request)])
+        self.assertFalse(Expense.objects.filter(description='Snack').exists())
+        
+    def test_rename_only_touches_the_category(self):
+        self.category.name = 'Groceries'
+        self.category.save()
+        summary = self.client.get(reverse('expense_category_summary')).json()['expense_category_data']
+        self.assertEqual(summary, {'Groceries': 20.0})
+        found = self.client.post(reverse('search-expenses'), json.dumps({'searchText': 'groceries'}),
+                                 content_type='application/json').json()
+        self.assertEqual([(row['id'], row['category']) for row in found], [(self.expense.id, 'Groceries')])
+        
+    def test_used_category_cannot_be_deleted(self):
+        with self.assertRaises(ProtectedError):
+            self.category.delete()
+
+    def test_emptied_category_can_be_deleted(self):
+        ExpenseMonthlyTotal.objects.create(owner=self.user, month=datetime.date(2024, 1, 1),
+                                           category=self.category, total=0, count=0)
+        self.expense.delete()
+        self.category.delete()
+        self.assertFalse(Category.objects.filter(pk=self.category.pk).exists())
+        self.assertFalse(ExpenseMonthlyTotal.objects.filter(category_id=self.category.pk).exists())
+        
 class ExpenseCategorySummaryViewTest(TestCase):
     def setUp(self):
         self.client = Client()
@@ -337,14 +547,14 @@ class ExpenseCategorySummaryViewTest(TestCase):
             owner = self.user,
             amount = 100.00,
             date = self.six_months_ago + datetime.timedelta(days=10),
-            category = self.category_food.name,
+            category = self.category_food,
             description = 'Groceries'
         )
         self.old_expense = Expense.objects.create(
             owner = self.user,
             amount = 200.00,
             date = self.six_months_ago - datetime.timedelta(days=1),
-            category = self.category_travel.name,
+            category = self.category_travel,
             description = 'Flight ticket'
         )
         
@@ -374,4 +584,986 @@ class StatsViewTest(TestCase):
     def test_stats_view_unauthenticated_user(self):
         response = self.client.get(self.url)
         self.assertNotEqual(response.status_code, 200)
-        self.assertRedirects(response, f'/authentication/login?next={self.url}')
\ No newline at end of file
+        self.assertRedirects(response, f'/authentication/login?next={self.url}')
+        
+@override_settings(**settings.CACHED_AUTH)
+class ExpenseMonthlyTotalTest(TestCase):
+    def setUp(self):
+        sessions.reset()
+        self.addCleanup(sessions.reset)
+        self.client = Client()
+        self.user = get_user_model().objects.create_user(username='testuser', email='test@example.com', password='password123')
+        self.client.login(username='testuser', password='password123')
+        self.category = Category.objects.create(name='Food')
+        self.expense = Expense.objects.create(
+            amount = 40.00,
+            date = datetime.date(2024, 3, 10),
+            description = 'Groceries',
+            owner = self.user,
+            category = category_named('Food')
+        )
+        
+    def get_total(self, month, category):
+        return ExpenseMonthlyTotal.objects.get(owner=self.user, month=month, category__name=category)
+        
+    def test_create_adds_to_monthly_total(self):
+        Expense.objects.create(amount=10.00, date='2024-03-20', description='Bread', owner=self.user, category=category_named('Food'))
+        total = self.get_total(datetime.date(2024, 3, 1), 'Food')
+        self.assertEqual(total.total, 50.00)
+        self.assertEqual(total.count, 2)
+        
+    def test_edit_moves_amount_between_months(self):
+        self.client.post(reverse('expense-edit', args=[self.expense.id]), {
+            'amount': '25',
+            'description': 'Groceries',
+            'expense_date': '2024-04-02',
+            'category': category_named('Travel').pk
+        })
+        self.assertFalse(ExpenseMonthlyTotal.objects.filter(month=datetime.date(2024, 3, 1)).exists())
+        self.assertEqual(self.get_total(datetime.date(2024, 4, 1), 'Travel').total, 25.00)
+        
+    def test_delete_removes_from_monthly_total(self):
+        self.client.post(reverse('expense-delete', args=[self.expense.id]))
+        self.assertFalse(ExpenseMonthlyTotal.objects.filter(owner=self.user).exists())
+        
+    def test_summary_uses_constant_number_of_queries(self):
+        for i in range(20):
+            Expense.objects.create(amount=1, date=now().date() - datetime.timedelta(days=i * 7),
+                                   description='Coffee', owner=self.user, category=category_named(f'Category {i % 4}'))
+        get_preference(self.user)
+        refdata.get('categories')
+        # The session and user come from the cache.
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('expense_category_summary'))
+        self.assertEqual(sum(response.json()['expense_category_data'].values()), 20)
+        
+    def test_rebuild_command_restores_totals(self):
+        ExpenseMonthlyTotal.objects.all().delete()
+        call_command('rebuild_monthly_totals', workers=1, stdout=open(os.devnull, 'w'))
+        self.assertEqual(self.get_total(datetime.date(2024, 3, 1), 'Food').total, 40.00)
+        
+    def test_queryset_delete_removes_from_monthly_total(self):
+        Expense.objects.create(amount=10.00, date='2024-03-20', description='Bread', owner=self.user, category=category_named('Food'))
+        Expense.objects.filter(owner=self.user, description='Groceries').delete()
+        total = self.get_total(datetime.date(2024, 3, 1), 'Food')
+        self.assertEqual((total.total, total.count), (10.00, 1))
+        
+    def test_admin_delete_action_removes_from_monthly_total(self):
+        admin_user = get_user_model().objects.create_superuser(username='admin', email='admin@example.com', password='password123')
+        self.client.force_login(admin_user)
+        self.client.post(reverse('admin:expenses_expense_changelist'),
+                         {'action': 'delete_selected', '_selected_action': [self.expense.id], 'post': 'yes'})
+        self.assertFalse(Expense.objects.filter(pk=self.expense.id).exists())
+        self.assertFalse(ExpenseMonthlyTotal.objects.filter(owner=self.user).exists())
+        
+    def test_queryset_update_rebuilds_monthly_totals(self):
+        Expense.objects.filter(pk=self.expense.pk).update(date=datetime.date(2024, 5, 1), category=category_named('Travel'))
+        self.assertEqual(self.get_total(datetime.date(2024, 5, 1), 'Travel').total, 40.00)
+        self.assertFalse(ExpenseMonthlyTotal.objects.filter(month=datetime.date(2024, 3, 1)).exists())
+        with self.assertNumQueries(1):
+            Expense.objects.filter(pk=self.expense.pk).update(description='Market')
+        
+    def test_deleting_the_owner_skips_the_rollup_updates(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.user.delete()
+        self.assertFalse(any(query['sql'].startswith('UPDATE "expenses_expensemonthlytotal"') for query in queries))
+        self.assertFalse(ExpenseMonthlyTotal.objects.exists())
+
+        
+class CategoryBudgetTest(TestCase):
+    def setUp(self):
+        # Preferences are cached per user id, which SQLite reuses across tests.
+        cache.clear()
+        self.client = Client()
+        self.user = get_user_model().objects.create_user(username='testuser', email='test@example.com', password='password123')
+        self.client.login(username='testuser', password='password123')
+        self.food, self.rent = category_named('Food'), category_named('Rent')
+        CategoryBudget.objects.create(owner=self.user, category=self.food, amount=50)
+        self.today = now().date()
+        Expense.objects.create(amount=40, date=self.today, description='Groceries', owner=self.user, category=self.food)
+        
+    def add(self, amount, category):
+        return self.client.post(reverse('add-expense'), {'amount': amount, 'description': 'Lunch',
+                                                         'expense_date': self.today.isoformat(), 'category': category.pk},
+                                follow=True)
+        
+    def test_warns_when_write_goes_over_budget(self):
+        warnings = [str(message) for message in get_messages(self.add(5, self.food).wsgi_request) if message.level_tag == 'warning']
+        self.assertEqual(warnings, [])
+        warnings = [str(message) for message in get_messages(self.add(10, self.food).wsgi_request) if message.level_tag == 'warning']
+        self.assertEqual(warnings, [f'Food is over budget for {self.today:%B %Y}: 55.00 of 50.00 USD spent'])
+        
+    def test_warns_on_edit(self):
+        expense = Expense.objects.get(owner=self.user)
+        response = self.client.post(reverse('expense-edit', args=[expense.id]), {
+            'amount': '60', 'description': 'Groceries', 'expense_date': self.today.isoformat(), 'category': self.food.pk}, follow=True)
+        self.assertIn('warning', [message.level_tag for message in get_messages(response.wsgi_request)])
+        
+    def test_check_reads_the_running_total(self):
+        Expense.objects.create(amount=20, date=self.today, description='Dinner', owner=self.user, category=self.food)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(budgets.over_budget(self.user.pk, self.food.pk, self.today), (50, 60))
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"expenses_expense"', queries[0]['sql'])
+        self.assertIsNone(budgets.over_budget(self.user.pk, self.rent.pk, self.today))
+        
+    def test_status_reports_every_category_in_one_query(self):
+        with self.assertNumQueries(1):
+            rows = list(budgets.status(self.user, self.today.replace(day=1)))
+        self.assertEqual(rows, [('Food', 50, 40), ('Rent', None, None), ('Uncategorized', None, None)])
+        data = self.client.get(reverse('category-budgets')).json()
+        self.assertEqual(data['categories'], [
+            {'category': 'Food', 'budget': 50, 'spent': 40, 'remaining': 10, 'over': False},
+            {'category': 'Rent', 'budget': None, 'spent': 0, 'remaining': None, 'over': False},
+            {'category': 'Uncategorized', 'budget': None, 'spent': 0, 'remaining': None, 'over': False},
+        ])
+        
+    def test_set_and_remove_budget(self):
+        response = self.client.post(reverse('category-budgets'), {'category': 'Rent', 'amount': '900.50'})
+        self.assertEqual(response.json()['categories'][1]['budget'], 900.5)
+        self.client.post(reverse('category-budgets'), {'category': 'Rent', 'amount': '0'})
+        self.assertFalse(CategoryBudget.objects.filter(category=self.rent).exists())
+        self.assertEqual(self.client.post(reverse('category-budgets'), {'category': 'Rent', 'amount': 'lots'}).status_code, 400)
+        self.assertEqual(self.client.post(reverse('category-budgets'), {'category': 'Rent', 'amount': '-1'}).status_code, 400)
+        self.assertEqual(self.client.post(reverse('category-budgets'), {'category': 'Nope', 'amount': '1'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('category-budgets'), {'month': 'May'}).status_code, 400)
+        
+@override_settings(**settings.CACHED_AUTH)
+class ExpenseTimeseriesViewTest(TestCase):
+    def setUp(self):
+        sessions.reset()
+        self.addCleanup(sessions.reset)
+        self.client = Client()
+        self.user = get_user_model().objects.create_user(username='testuser', email='test@example.com', password='password123')
+        self.client.login(username='testuser', password='password123')
+        for day, amount, category in [('2022-01-15', 10, 'Food'), ('2022-01-20', 5, 'Food'),
+                                      ('2023-06-01', 30, 'Travel'), ('2024-02-29', 20, 'Food')]:
+            Expense.objects.create(amount=amount, date=day, description='Item', owner=self.user, category=category_named(category))
+        self.url = reverse('expense_timeseries')
+        
+    def test_yearly_totals_per_category(self):
+        response = self.client.get(self.url, {'start': '2022-01-01', 'end': '2024-12-31', 'granularity': 'year'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['periods'], ['2022-01-01', '2023-01-01', '2024-01-01'])
+        self.assertEqual(data['series']['Food'], [15, 0, 20])
+        self.assertEqual(data['series']['Travel'], [0, 30, 0])
+        
+    def test_weekly_periods_start_on_monday(self):
+        response = self.client.get(self.url, {'start': '2022-01-12', 'end': '2022-01-23', 'granularity': 'week'})
+        data = response.json()
+        self.assertEqual(data['periods'], ['2022-01-10', '2022-01-17'])
+        self.assertEqual(data['series']['Food'], [10, 5])
+        
+    def test_results_are_cached_until_next_write(self):
+        params = {'start': '2022-01-01', 'end': '2022-12-31', 'granularity': 'month'}
+        self.client.get(self.url, params)
+        with self.assertNumQueries(0):
+            self.client.get(self.url, params)
+        with self.captureOnCommitCallbacks(execute=True):
+            Expense.objects.create(amount=1, date='2022-03-01', description='Item', owner=self.user, category=category_named('Food'))
+        data = self.client.get(self.url, params).json()
+        self.assertEqual(data['series']['Food'][2], 1)
+        
+    def test_invalid_granularity(self):
+        response = self.client.get(self.url, {'granularity': 'hour'})
+        self.assertEqual(response.status_code, 400)
+        
+    def test_huge_ranges_are_rejected_before_enumerating(self):
+        response = self.client.get(self.url, {'start': '0001-01-01', 'end': '9999-12-31', 'granularity': 'day'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(timeseries.period_count(datetime.date.min, datetime.date.max, 'day'), 3652059)
+        for start, end, granularity in [('2024-01-10', '2024-03-05', 'week'), ('2023-11-30', '2024-02-01', 'month'),
+                                        ('2022-06-01', '2024-01-01', 'year'), ('2024-02-27', '2024-03-02', 'day')]:
+            start, end = datetime.date.fromisoformat(start), datetime.date.fromisoformat(end)
+            self.assertEqual(timeseries.period_count(start, end, granularity),
+                             len(timeseries.periods(start, end, granularity)))
+        
+    def test_ranges_at_the_ends_of_the_calendar(self):
+        self.assertEqual(self.client.get(self.url, {'end': '0001-01-05'}).status_code, 400)
+        response = self.client.get(self.url, {'start': '9999-01-01', 'end': '9999-12-31', 'granularity': 'month'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['periods']), 12)
+        response = self.client.get(self.url, {'start': '9990-01-01', 'end': '9999-12-31', 'granularity': 'year'})
+        self.assertEqual(len(response.json()['periods']), 10)
+
+        
+@override_settings(**settings.CACHED_AUTH)
+class DashboardViewTest(TestCase):
+    def setUp(self):
+        sessions.reset()
+        self.addCleanup(sessions.reset)
+        # Figures are cached per owner id, which SQLite reuses across tests.
+        cache.clear()
+        self.client = Client()
+        self.user = get_user_model().objects.create_user(username='testuser', email='test@example.com', password='password123')
+        self.client.login(username='testuser', password='password123')
+        self.this_month = now().date().replace(day=1)
+        self.last_month = (self.this_month - timedelta(days=1)).replace(day=1)
+        for day, amount, category in [(self.this_month, 30, 'Rent'), (self.this_month, 10, 'Food'),
+                                      (self.last_month, 5, 'Food'), (self.last_month - timedelta(days=400), 99, 'Food')]:
+            Expense.objects.create(amount=amount, date=day, description='Item', owner=self.user, category=category_named(category))
+        for day, amount, source in [(self.this_month, 100, 'Salary'), (self.last_month, 20, 'Gifts')]:
+            UserIncome.objects.create(amount=amount, date=day, description='Item', owner=self.user,
+                                      source=Source.objects.get_or_create(name=source)[0])
+        self.url = reverse('dashboard')
+        
+    def test_figures_in_columns(self):
+        data = self.client.get(self.url).json()
+        self.assertEqual(len(data['months']), 6)
+        self.assertEqual(data['months'][-2:], [self.last_month.isoformat(), self.this_month.isoformat()])
+        self.assertEqual(data['expenses'], [0, 0, 0, 0, 5, 40])
+        self.assertEqual(data['income'], [0, 0, 0, 0, 20, 100])
+        self.assertEqual(data['net'], [0, 0, 0, 0, 15, 60])
+        self.assertEqual(data['categories'], {'labels': ['Rent', 'Food'], 'totals': [30, 15]})
+        self.assertEqual(data['sources'], {'labels': ['Salary', 'Gifts'], 'totals': [100, 20]})
+        self.assertEqual(data['kpis'], {'income': 120, 'expenses': 45, 'net': 75, 'savings_rate': 0.625,
+                                        'average_monthly_expenses': 7.5, 'top_category': 'Rent'})
+        
+    def test_months_parameter(self):
+        data = self.client.get(self.url, {'months': 1}).json()
+        self.assertEqual(data['months'], [self.this_month.isoformat()])
+        self.assertEqual(data['categories'], {'labels': ['Rent', 'Food'], 'totals': [30, 10]})
+        self.assertEqual(self.client.get(self.url, {'months': 0}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'months': 'all'}).status_code, 400)
+        
+    def test_results_are_cached_until_next_write(self):
+        warm_caches(self.user)
+        with self.assertNumQueries(2):
+            self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            UserIncome.objects.create(amount=5, date=self.this_month, description='Item', owner=self.user,
+                                      source=Source.objects.get(name='Gifts'))
+        data = self.client.get(self.url).json()
+        self.assertEqual(data['income'][-1], 105)
+        
+    def test_redirect_if_not_logged_in(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+        
+class ImportExpensesViewTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = get_user_model().objects.create_user(username='testuser', email='test@example.com', password='password123')
+        self.client.login(username='testuser', password='password123')
+        self.url = reverse('import-expenses')
+        for name in ('Food', 'Travel'):
+            category_named(name)
+        self.csv = (b'Date,Description,Amount,Category\n'
+                    b'2024-03-01,Coffee,3.50,Food\n'
+                    b'2024-03-01,Coffee,3.50,Food\n'
+                    b'2024-03-02,Train,-12.00,\n'
+                    b'2024-03-03,,5,Food\n'
+                    b'not-a-date,Lunch,8,Food\n')
+        
+    def upload(self, content, name='statement.csv', **extra):
+        return self.client.post(self.url, {'statement': SimpleUploadedFile(name, content), **extra})
+        
+    def test_import_csv(self):
+        response = self.upload(self.csv, category='Travel')
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual(result['created'], 3)
+        self.assertEqual(result['skipped'], 2)
+        self.assertIn('line 5: Description is required', result['errors'])
+        self.assertEqual(Expense.objects.filter(owner=self.user, description='Coffee').count(), 2)
+        self.assertEqual(Expense.objects.get(description='Train').category.name, 'Travel')
+        self.assertEqual(Expense.objects.get(description='Train').amount, 12.00)
+        total = ExpenseMonthlyTotal.objects.get(owner=self.user, month=datetime.date(2024, 3, 1), category__name='Food')
+        self.assertEqual((total.total, total.count), (7.00, 2))
+        
+    def test_unknown_categories_are_row_errors(self):
+        result = self.upload(b'Date,Description,Amount,Category\n2024-03-01,Coffee,3.50,Fod\n2024-03-01,Tea,2,Food\n').json()
+        self.assertEqual((result['created'], result['skipped']), (1, 1))
+        self.assertEqual(result['errors'], ['line 2: Unknown category "Fod"'])
+        self.assertFalse(Category.objects.filter(name='Fod').exists())
+        response = self.upload(self.csv, category='Nope')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Category.objects.filter(name='Nope').exists())
+        
+    def test_reimport_skips_duplicates(self):
+        self.upload(self.csv)
+        result = self.upload(self.csv).json()
+        self.assertEqual(result['created'], 0)
+        self.assertEqual(result['duplicates'], 3)
+        self.assertEqual(Expense.objects.filter(owner=self.user).count(), 3)
+        
+    def test_identical_rows_out_of_date_order(self):
+        unsorted = (b'Date,Description,Amount,Category\n'
+                    b'2024-03-01,Coffee,3.50,Food\n'
+                    b'2024-03-02,Train,12.00,Food\n'
+                    b'2024-03-01,Coffee,3.50,Food\n')
+        self.assertEqual(self.upload(unsorted).json()['created'], 3)
+        result = self.upload(unsorted).json()
+        self.assertEqual((result['created'], result['duplicates']), (0, 3))
+        
+    def test_reimport_matches_amounts_by_value(self):
+        self.upload(b'Date,Description,Amount\n2024-03-01,Coffee,3.5\n')
+        result = self.upload(b'Date,Description,Amount\n2024-03-01,Coffee,3.50\n').json()
+        self.assertEqual((result['created'], result['duplicates']), (0, 1))
+        
+    def test_import_ofx_keeps_debits(self):
+        ofx = (b'OFXHEADER:100\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>\n'
+               b'<STMTTRN>\n<TRNTYPE>DEBIT\n<DTPOSTED>20240105120000\n<TRNAMT>-42.10\n<FITID>1\n<NAME>Supermarket\n</STMTTRN>\n'
+               b'<STMTTRN>\n<TRNTYPE>CREDIT\n<DTPOSTED>20240106\n<TRNAMT>1000.00\n<FITID>2\n<NAME>Salary\n</STMTTRN>\n'
+               b'</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n')
+        result = self.upload(ofx, name='statement.ofx').json()
+        self.assertEqual(result['created'], 1)
+        expense = Expense.objects.get(owner=self.user)
+        self.assertEqual((expense.description, expense.amount, expense.date), ('Supermarket', Decimal('42.10'), datetime.date(2024, 1, 5)))
+        
+    def test_import_requires_file(self):
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 400)
+        
+    def test_import_command_in_chunks(self):
+        with tempfile.NamedTemporaryFile(suffix='.csv') as statement:
+            statement.write(b'date,description,amount\n' + b''.join(
+                f'2024-01-{day:02d},Item {day},{day}\n'.encode() for day in range(1, 29)))
+            statement.flush()
+            call_command('import_statement', 'testuser', statement.name, chunk_size=5, stdout=open(os.devnull, 'w'))
+        self.assertEqual(Expense.objects.filter(owner=self.user).count(), 28)
+        self.assertEqual(ExpenseMonthlyTotal.objects.count_for(self.user), 28)
+
+        
+class ExportExpensesViewTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = get_user_model().objects.create_user(username='testuser', email='test@example.com', password='password123')
+        self.client.login(username='testuser', password='password123')
+        for day, category in [('2024-01-10', 'Food'), ('2024-02-10', 'Travel'), ('2024-03-10', 'Food')]:
+            Expense.objects.create(amount=10, date=day, description=f'Item {day}', owner=self.user, category=category_named(category))
+        self.url = reverse('export-expenses')
+        
+    def test_export_csv_with_filters(self):
+        response = self.client.get(self.url, {'start': '2024-01-01', 'end': '2024-02-28', 'category': 'Food'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines, ['date,description,category,amount,currency', '2024-01-10,Item 2024-01-10,Food,10.00,USD'])
+        
+    def test_export_jsonl_gzip(self):
+        response = self.client.get(self.url, {'format': 'jsonl', 'compress': 'gzip'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('expenses.jsonl.gz', response['Content-Disposition'])
+        rows = [json.loads(line) for line in gzip.decompress(b''.join(response.streaming_content)).splitlines()]
+        self.assertEqual([row['date'] for row in rows], ['2024-01-10', '2024-02-10', '2024-03-10'])
+        
+    def test_export_invalid_format(self):
+        response = self.client.get(self.url, {'format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+        
+class ExchangeRateTest(TestCase):
+    def setUp(self):
+        # Totals are cached per owner id, which SQLite reuses across tests.
+        cache.clear()
+        self.client = Client()
+        self.user = get_user_model().objects.create_user(username='testuser', email='test@example.com', password='password123')
+        self.client.login(username='testuser', password='password123')
+        ExchangeRate.objects.create(currency='EUR', date=datetime.date(2024, 1, 1), rate=0.9)
+        ExchangeRate.objects.create(currency='EUR', date=datetime.date(2024, 2, 1), rate=0.8)
+        
+    def test_save_converts_at_rate_of_row_date(self):
+        january = Expense.objects.create(amount=90, currency='EUR', date='2024-01-31', description='Hotel', owner=self.user, category=category_named('Travel'))
+        february = Expense.objects.create(amount=80, currency='EUR', date='2024-02-10', description='Hotel', owner=self.user, category=category_named('Travel'))
+        earlier = Expense.objects.create(amount=9, currency='EUR', date='2023-12-10', description='Taxi', owner=self.user, category=category_named('Travel'))
+        self.assertAlmostEqual(january.base_amount, 100)
+        self.assertAlmostEqual(february.base_amount, 100)
+        self.assertAlmostEqual(earlier.base_amount, 10)
+        total = ExpenseMonthlyTotal.objects.get(owner=self.user, month=datetime.date(2024, 1, 1), category__name='Travel')
+        self.assertAlmostEqual(total.total, 100)
+        
+    def test_summary_in_preferred_currency(self):
+        UserPreference.objects.create(user=self.user, currency='EUR - Euro')
+        Expense.objects.create(amount=10, date=now().date(), description='Lunch', owner=self.user, category=category_named('Food'))
+        Expense.objects.create(amount=8, currency='EUR', date=now().date(), description='Dinner', owner=self.user, category=category_named('Food'))
+        data = self.client.get(reverse('expense_category_summary')).json()
+        self.assertEqual(data['currency'], 'EUR')
+        self.assertAlmostEqual(data['expense_category_data']['Food'], 16)
+        
+    def test_timeseries_in_preferred_currency(self):
+        UserPreference.objects.create(user=self.user, currency='EUR')
+        Expense.objects.create(amount=10, date='2024-01-15', description='Lunch', owner=self.user, category=category_named('Food'))
+        data = self.client.get(reverse('expense_timeseries'), {'start': '2024-01-01', 'end': '2024-01-31'}).json()
+        self.assertEqual(data['currency'], 'EUR')
+        self.assertAlmostEqual(data['series']['Food'][0], 8)
+        
+    def test_dashboard_in_preferred_currency(self):
+        UserPreference.objects.create(user=self.user, currency='EUR')
+        Expense.objects.create(amount=10, date=now().date(), description='Lunch', owner=self.user, category=category_named('Food'))
+        data = self.client.get(reverse('dashboard')).json()
+        self.assertEqual(data['currency'], 'EUR')
+        self.assertAlmostEqual(data['categories']['totals'][0], 8)
+        self.assertAlmostEqual(data['kpis']['expenses'], 8)
+        
+    def test_add_expense_with_currency(self):
+        self.client.post(reverse('add-expense'), {'amount': '45', 'currency': 'EUR', 'description': 'Museum',
+                                                  'expense_date': '2024-01-20', 'category': category_named('Travel').pk})
+        expense = Expense.objects.get(owner=self.user)
+        self.assertEqual(expense.currency, 'EUR')
+        self.assertAlmostEqual(expense.base_amount, 50)
+        
+    def test_add_expense_rejects_invalid_currency(self):
+        response = self.client.post(reverse('add-expense'), {'amount': '45', 'currency': 'euro', 'description': 'Museum',
+                                                             'expense_date': '2024-01-20', 'category': category_named('Travel').pk})
+        self.assertFalse(Expense.objects.exists())
+        self.assertIn('Currency must be a three letter code', [str(m) for m in get_messages(response.wsgi_request)])
+        
+    def test_import_uses_currency_column(self):
+        csv = b'date,description,amount,currency\n2024-01-10,Hotel,-90,EUR\n2024-02-10,Taxi,-8,\n'
+        self.client.post(reverse('import-expenses'), {'statement': SimpleUploadedFile('statement.csv', csv),
+                                                      'currency': 'EUR'})
+        self.assertEqual(sorted(Expense.objects.values_list('currency', 'base_amount')), [('EUR', 10.0), ('EUR', 100.0)])
+        
+    def test_load_rates_command_reprices_amounts(self):
+        expense = Expense.objects.create(amount=50, currency='GBP', date='2024-03-05', description='Train', owner=self.user, category=category_named('Travel'))
+        self.assertEqual(expense.base_amount, 50)
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as rates_file:
+            rates_file.write('date,currency,rate\n2024-03-01,GBP,0.5\n2024-03-01,USD,1\n')
+            rates_file.flush()
+            call_command('load_exchange_rates', rates_file.name, stdout=open(os.devnull, 'w'))
+        expense.refresh_from_db()
+        self.assertEqual(expense.base_amount, 100)
+        total = ExpenseMonthlyTotal.objects.get(owner=self.user, month=datetime.date(2024, 3, 1), category__name='Travel')
+        self.assertEqual(total.total, 100)
+
+    def test_load_rates_command_rejects_unusable_rates(self):
+        for rate in ('0', '-1.2', 'nan', 'inf'):
+            with tempfile.NamedTemporaryFile('w', suffix='.csv') as rates_file:
+                rates_file.write(f'date,currency,rate\n2024-03-01,EUR,0.9\n2024-03-01,GBP,{rate}\n')
+                rates_file.flush()
+                with self.assertRaisesMessage(CommandError, f'{rates_file.name}, line 3: rate must be a positive number'):
+                    call_command('load_exchange_rates', rates_file.name, stdout=open(os.devnull, 'w'))
+        self.assertFalse(ExchangeRate.objects.filter(currency='GBP').exists())
+        
+class MoneyTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = get_user_model().objects.create_user(username='testuser', email='test@example.com', password='password123')
+        self.client.login(username='testuser', password='password123')
+        
+    def test_amount_is_stored_in_cents(self):
+        expense = Expense.objects.create(amount='19.99', description='Book', owner=self.user, category=category_named('Leisure'))
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT amount FROM expenses_expense WHERE id = %s', [expense.id])
+            self.assertEqual(cursor.fetchone()[0], 1999)
+        expense.refresh_from_db()
+        self.assertEqual(expense.amount, Decimal('19.99'))
+        
+    def test_sums_are_exact(self):
+        for _ in range(10):
+            Expense.objects.create(amount='0.10', date=now().date(), description='Sweet', owner=self.user, category=category_named('Food'))
+        Expense.objects.create(amount='0.20', date=now().date(), description='Sweet', owner=self.user, category=category_named('Food'))
+        data = self.client.get(reverse('expense_category_summary')).json()
+        self.assertEqual(data['expense_category_data']['Food'], 1.2)
+        total = ExpenseMonthlyTotal.objects.get(owner=self.user, category__name='Food')
+        self.assertEqual(total.total, Decimal('1.20'))
+        
+    def test_form_accepts_decimal_strings(self):
+        self.client.post(reverse('add-expense'), {'amount': '12.345', 'description': 'Fuel',
+                                                  'expense_date': '2024-05-01', 'category': category_named('Travel').pk})
+        self.assertEqual(Expense.objects.get(owner=self.user).amount, Decimal('12.35'))
+
+    def test_form_rejects_amounts_that_do_not_fit(self):
+        for amount, error in (('1e20', 'value is too large'), ('nan', 'must be a decimal number'),
+                              ('abc', 'must be a decimal number')):
+            response = self.client.post(reverse('add-expense'), {'amount': amount, 'description': 'Fuel',
+                                                                 'expense_date': '2024-05-01',
+                                                                 'category': category_named('Travel').pk})
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, error)
+        self.assertFalse(Expense.objects.filter(owner=self.user).exists())
+        response = self.client.post(reverse('category-budgets'), {'category': 'Travel', 'amount': '1e20'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Budget is too large'})
+
+    def test_field_range_is_the_bigint_column(self):
+        field = Expense._meta.get_field('amount')
+        self.assertEqual(field.to_python('92233720368547758.07'), Decimal('92233720368547758.07'))
+        with self.assertRaises(ValidationError):
+            field.to_python('92233720368547758.08')
+
+
+    def test_search_returns_decimal_strings(self):
+        Expense.objects.create(amount='7.50', date='2024-05-01', description='Parking', owner=self.user, category=category_named('Travel'))
+        response = self.client.post(reverse('search-expenses'), json.dumps({'searchText': 'Parking'}),
+                                    content_type='application/json')
+        self.assertEqual(response.json()[0]['amount'], '7.50')
+        
+@unittest.skipUnless(connection.vendor == 'postgresql', 'query plans are PostgreSQL specific')
+class ExpenseQueryPlanTest(TestCase):
+    """EXPLAIN the queries behind the hot views against a seeded table and
+    fail if any of them reads expenses_expense with a sequential scan."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_user(username='testuser', email='test@example.com', password='password123')
+        owners = [cls.user] + User.objects.bulk_create([User(username=f'user{i}') for i in range(49)])
+        start = now().date() - timedelta(days=600)
+        categories = [category_named(f'Category {i}') for i in range(6)]
+        Expense.objects.bulk_create([
+            Expense(owner=owner, amount=day % 50 + 1, base_amount=day % 50 + 1, date=start + timedelta(days=day * 2),
+                    description=f'Item {day}', category=categories[day % 6])
+            for day in range(300) for owner in owners
+        ], batch_size=2000)
+        ExpenseMonthlyTotal.objects.rebuild(cls.user.pk, Expense.objects.all())
+        
+    def setUp(self):
+        self.client = Client()
+        self.client.login(username='testuser', password='password123')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE expenses_expense')
+            
+    def plans(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params or {})
+            if response.streaming:
+                b''.join(response.streaming_content)
+        plans = []
+        for query in queries:
+            if '"expenses_expense"' not in query['sql']:
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN ' + query['sql'])
+                plans.append((query['sql'], '\n'.join(row[0] for row in cursor.fetchall())))
+        self.assertTrue(plans)
+        return plans
+        
+    def assertNoSeqScan(self, url, params=None):
+        plans = self.plans(url, params)
+        for sql, plan in plans:
+            self.assertNotRegex(plan, r'Seq Scan on expenses_expense\b', f'{sql}\n{plan}')
+        return plans
+        
+    def test_list_pages_use_owner_date_index(self):
+        for sql, plan in self.assertNoSeqScan(reverse('expenses')):
+            self.assertIn('expense_owner_date_id_idx', plan)
+        first = Expense.objects.filter(owner=self.user).order_by('-date', 'id')[100]
+        self.assertNoSeqScan(reverse('expenses'), {'after': encode_cursor(first)})
+        
+    def test_summary(self):
+        self.assertNoSeqScan(reverse('expense_category_summary'))
+        
+    def test_timeseries(self):
+        self.assertNoSeqScan(reverse('expense_timeseries'), {'granularity': 'week'})
+        
+    def test_export(self):
+        self.assertNoSeqScan(reverse('export-expenses'), {'category': 'Category 1'})
+        
+class ExpenseQueryBudgetTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = get_user_model().objects.create_user(username='testuser', email='test@example.com', password='password123')
+        self.client.login(username='testuser', password='password123')
+        for i in range(12):
+            Expense.objects.create(amount=i + 1, date=now().date() - timedelta(days=i * 20), description=f'Item {i}',
+                                   owner=self.user, category=category_named(f'Category {i % 3}'))
+        for name in ('Food', 'Travel', 'Rent'):
+            Category.objects.create(name=name)
+        self.expense = Expense.objects.filter(owner=self.user).first()
+        
+    def test_every_url_has_a_budget(self):
+        self.assertBudgetsDeclared(expenses_urls)
+        self.assertBudgetsDeclared(root_urls)
+        
+    def test_pages(self):
+        self.assertWithinBudget('expenses', data={'page_size': 10})
+        self.assertWithinBudget('add-expense')
+        self.assertWithinBudget('expense-edit', args=[self.expense.id])
+        self.assertWithinBudget('stats')
+        self.assertWithinBudget('category-budgets')
+        
+    def test_writes(self):
+        self.assertWithinBudget('add-expense', method='post', data={
+            'amount': '10', 'description': 'Lunch', 'expense_date': '2024-01-10', 'category': 'Food'})
+        self.assertWithinBudget('expense-edit', args=[self.expense.id], method='post', data={
+            'amount': '12', 'description': 'Lunch', 'expense_date': '2024-01-11', 'category': 'Food'})
+        self.assertWithinBudget('expense-delete', args=[self.expense.id])
+        self.assertWithinBudget('category-budgets', method='post', data={'category': 'Food', 'amount': '100'})
+        
+    def test_json_endpoints(self):
+        self.assertWithinBudget('search-expenses', method='post', data=json.dumps({'searchText': 'Item'}),
+                                content_type='application/json')
+        self.assertWithinBudget('expense_category_summary')
+        self.assertWithinBudget('expense_timeseries', data={'granularity': 'week'})
+        self.assertWithinBudget('dashboard')
+        
+    def test_import_and_export(self):
+        csv = b'date,description,amount\n' + b''.join(f'2024-02-{day:02d},Item,{day}\n'.encode() for day in range(1, 21))
+        self.assertWithinBudget('import-expenses', method='post',
+                                data={'statement': SimpleUploadedFile('statement.csv', csv)})
+        self.assertWithinBudget('export-expenses')
+        
+class RepeatedQueryMiddlewareTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser', email='test@example.com', password='password123')
+        
+    def n_plus_one_view(self, request):
+        for pk in range(3):
+            list(Expense.objects.filter(owner=self.user, pk=pk))
+        return HttpResponse()
+        
+    @override_settings(DEBUG=True)
+    def test_logs_repeated_query_with_stack(self):
+        middleware = RepeatedQueryMiddleware(self.n_plus_one_view)
+        with self.assertLogs('expenseswebsite.queries', 'WARNING') as logs:
+            middleware(RequestFactory().get('/some/page'))
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('ran 3 times in GET /some/page', logs.output[0])
+        self.assertIn('n_plus_one_view', logs.output[0])
+        
+    def test_disabled_without_debug(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            RepeatedQueryMiddleware(self.n_plus_one_view)
+            
+    def test_in_lists_of_any_length_share_a_shape(self):
+        self.assertEqual(query_shape('SELECT 1 WHERE id IN (%s, %s)'), query_shape('SELECT 1 WHERE id IN (%s, %s, %s)'))
+        
+class ServerTimingMiddlewareTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = get_user_model().objects.create_user(username='testuser', email='test@example.com', password='password123')
+        self.client.login(username='testuser', password='password123')
+        Expense.objects.create(amount=10, description='Lunch', owner=self.user, category=category_named('Food'))
+        
+    def test_header_reports_sql_template_and_view_time(self):
+        with self.assertLogs('expenseswebsite.timing', 'INFO') as logs:
+            response = self.client.get(reverse('expenses'))
+        header = response['Server-Timing']
+        for metric in ('db;dur=', 'tpl;dur=', 'app;dur=', 'total;dur='):
+            self.assertIn(metric, header)
+        self.assertRegex(header, r'desc="[1-9]\d* queries"')
+        self.assertRegex(logs.output[0], r'method=GET path=/ status=200 total_ms=[\d.]+ db_ms=[\d.]+ db_queries=\d+')
+        self.assertEqual(logs.records[0].status, 200)
+        
+    def test_template_time_only_for_rendered_pages(self):
+        response = self.client.get(reverse('expense_timeseries'))
+        self.assertIn('tpl;dur=0.0', response['Server-Timing'])
+        
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0.0)
+    def test_sampled_out_requests_are_untouched(self):
+        response = Client().get(reverse('login'))
+        self.assertFalse(response.has_header('Server-Timing'))
+        
+class MetricsEndpointTest(TestCase):
+    def setUp(self):
+        self.metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.metrics_dir)
+        settings_override = override_settings(METRICS_DIR=self.metrics_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        metrics.reset()
+        cache.clear()
+        self.client = Client()
+        self.user = get_user_model().objects.create_user(username='testuser', email='test@example.com', password='password123')
+        self.client.login(username='testuser', password='password123')
+        
+    def scrape(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        return response.content.decode()
+        
+    def test_reports_requests_latency_queries_and_cache(self):
+        self.client.get(reverse('expense_category_summary'))
+        self.client.get(reverse('expense_category_summary'))
+        self.client.post(reverse('search-expenses'), json.dumps({'searchText': 'x'}), content_type='application/json')
+        text = self.scrape()
+        self.assertIn('http_requests_total{method="GET",status="200",view="expense_category_summary"} 2', text)
+        self.assertIn('http_requests_total{method="POST",status="200",view="search-expenses"} 1', text)
+        self.assertIn('http_request_duration_seconds_count{view="expense_category_summary"} 2', text)
+        self.assertIn('http_request_duration_seconds_bucket{view="expense_category_summary",le="+Inf"} 2', text)
+        self.assertRegex(text, r'db_queries_total\{view="expense_category_summary"\} [1-9]')
+        self.assertRegex(text, r'cache_hit_ratio\{cache="user-preference"\} 0\.5')
+        
+    def test_adds_up_other_workers(self):
+        with open(os.path.join(self.metrics_dir, 'metrics-1.json'), 'w') as other:
+            json.dump({'counters': [['http_requests_total', {'method': 'GET', 'status': '200', 'view': 'login'}, 5]],
+                       'histograms': []}, other)
+        self.client.get(reverse('login'))
+        self.assertIn('http_requests_total{method="GET",status="200",view="login"} 6', self.scrape())
+
+    def test_drops_gauges_of_dead_workers(self):
+        # Far above any pid_max, so never a running process.
+        with open(os.path.join(self.metrics_dir, 'metrics-99999999.json'), 'w') as other:
+            json.dump({'counters': [['db_pool_connections', {'alias': 'other'}, 4],
+                                    ['db_pool_checkouts_total', {'alias': 'other'}, 7]],
+                       'histograms': []}, other)
+        text = self.scrape()
+        self.assertNotIn('db_pool_connections{alias="other"}', text)
+        self.assertIn('db_pool_checkouts_total{alias="other"} 7', text)
+
+    def test_removes_own_file_on_exit(self):
+        self.scrape()
+        self.assertTrue(os.path.exists(metrics.process_file()))
+        metrics.remove_process_file()
+        self.assertFalse(os.path.exists(metrics.process_file()))
+
+    def test_only_local_scrapers(self):
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.1.2.3')
+        self.assertEqual(response.status_code, 403)
+        
+class AsyncEndpointTest(TestCase):
+    def setUp(self):
+        self.async_client = AsyncClient()
+        self.user = get_user_model().objects.create_user(username='testuser', email='test@example.com', password='password123')
+        ExchangeRate.objects.create(currency='EUR', date=datetime.date(2024, 1, 1), rate=0.8)
+        Expense.objects.create(amount=10, date=now().date(), description='Groceries', owner=self.user, category=category_named('Food'))
+        Expense.objects.create(amount=8, currency='EUR', date=now().date(), description='Dinner', owner=self.user, category=category_named('Food'))
+        cache.clear()
+        
+    def test_middleware_chain_stays_async(self):
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler().load_middleware(is_async=True)
+            
+    async def test_search(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post(reverse('search-expenses'), json.dumps({'searchText': 'Groceries'}),
+                                                content_type='application/json')
+        self.assertEqual([row['description'] for row in response.json()], ['Groceries'])
+        self.assertEqual(response.json()[0]['category'], 'Food')
+        
+    async def test_summary_in_preferred_currency(self):
+        await UserPreference.objects.acreate(user=self.user, currency='EUR - Euro')
+        await self.async_client.aforce_login(self.user)
+        data = (await self.async_client.get(reverse('expense_category_summary'))).json()
+        self.assertEqual(data['currency'], 'EUR')
+        self.assertAlmostEqual(data['expense_category_data']['Food'], 16)
+        
+    async def test_queries_reach_metrics(self):
+        # The async ORM runs them in a worker thread, outside the middleware's own.
+        metrics.reset()
+        await self.async_client.aforce_login(self.user)
+        await self.async_client.get(reverse('expense_category_summary'))
+        counters = {(name, labels.get('view')): value for name, labels, value in metrics.snapshot()['counters']}
+        self.assertGreater(counters[('db_queries_total', 'expense_category_summary')], 0)
+        
+class StaticFilesTest(TestCase):
+    def test_collectstatic_hashes_and_precompresses(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        with override_settings(STATIC_ROOT=root):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            url = static('css/dashboard.css')
+        self.assertRegex(url, r'/css/dashboard\.[0-9a-f]{12}\.css$')
+        path = os.path.join(root, url.split('/static/', 1)[1])
+        with open(path, 'rb') as original:
+            content = original.read()
+        with open(path + '.gz', 'rb') as gzipped:
+            self.assertEqual(gzip.decompress(gzipped.read()), content)
+        with open(path + '.br', 'rb') as compressed:
+            self.assertEqual(brotli.decompress(compressed.read()), content)
+        self.assertFalse([name for name in os.listdir(os.path.join(root, 'img')) if name.endswith(('.gz', '.br'))])
+        
+    def test_plain_names_without_manifest(self):
+        self.assertEqual(static('css/dashboard.css'), '/static/css/dashboard.css')
+
+    @override_settings(STATIC_MANIFEST_OPTIONAL=False)
+    def test_missing_manifest_fails_outside_development(self):
+        with self.assertRaisesMessage(ValueError, 'Missing staticfiles manifest entry'):
+            static('css/dashboard.css')
+        
+@unittest.skipUnless(connection.vendor == 'postgresql', 'connection pooling is PostgreSQL specific')
+class ConnectionPoolTest(TestCase):
+    def in_thread(self, sql):
+        # Connections of other threads come from the same pool and go back
+        # to it when closed, as at the end of a request.
+        rows = []
+        def run():
+            with connections['default'].cursor() as cursor:
+                cursor.execute(sql)
+                rows.extend(cursor.fetchall())
+            connections['default'].close()
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        return rows
+        
+    def test_threads_check_out_and_return_connections(self):
+        pool = connection.pool
+        before = pool.get_stats().get('requests_num', 0)
+        for _ in range(3):
+            self.assertEqual(self.in_thread('SELECT 1'), [(1,)])
+        stats = pool.get_stats()
+        self.assertEqual(stats['requests_num'], before + 3)
+        self.assertLessEqual(stats['pool_size'], stats['pool_max'])
+        
+    def test_broken_idle_connections_are_replaced_on_checkout(self):
+        self.in_thread('SELECT 1')
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pid FROM pg_stat_activity WHERE datname = current_database() "
+                           "AND pid <> pg_backend_pid() AND state = 'idle'")
+            idle = [row[0] for row in cursor.fetchall()]
+            cursor.execute('SELECT pg_terminate_backend(pid) FROM unnest(%s) pid', [idle])
+            for _ in range(50):
+                # Activity is otherwise read once per transaction.
+                cursor.execute('SELECT pg_stat_clear_snapshot()')
+                cursor.execute('SELECT count(*) FROM pg_stat_activity WHERE pid = ANY(%s)', [idle])
+                if not cursor.fetchone()[0]:
+                    break
+                time.sleep(0.1)
+        lost = connection.pool.get_stats().get('connections_lost', 0)
+        self.assertEqual(self.in_thread('SELECT 1'), [(1,)])
+        self.assertGreater(connection.pool.get_stats().get('connections_lost', 0), lost)
+        
+    def test_metrics_report_pool_use(self):
+        metrics.reset()
+        self.in_thread('SELECT 1')
+        metrics.record_pool_stats()
+        counters = {name: value for name, labels, value in metrics.snapshot()['counters'] if labels == {'alias': 'default'}}
+        self.assertEqual(counters['db_pool_max_connections'], connection.pool.max_size)
+        self.assertGreater(counters['db_pool_checkouts_total'], 0)
+        self.assertRegex(metrics.render(), r'db_pool_saturation\{alias="default"\} 0\.[0-9]+')
+        
+class SeedDataTest(TestCase):
+    def test_deterministic_by_seed(self):
+        call_command('seed_data', users=2, expenses=50, income=20, seed=7, prefix='a', batch_size=16, stdout=open(os.devnull, 'w'))
+        call_command('seed_data', users=2, expenses=50, income=20, seed=7, prefix='b', batch_size=16, stdout=open(os.devnull, 'w'))
+        rows = lambda prefix: list(Expense.objects.filter(owner__username__startswith=prefix)
+                                   .order_by('owner__username', 'id').values_list('amount', 'date', 'category'))
+        self.assertEqual(len(rows('a')), 100)
+        self.assertEqual(rows('a'), rows('b'))
+        self.assertEqual(UserIncome.objects.filter(owner__username='a0001').count(), 20)
+        
+    def test_rollups_match_rows(self):
+        call_command('seed_data', users=1, expenses=200, income=10, prefix='r', stdout=open(os.devnull, 'w'))
+        owner = get_user_model().objects.get(username='r0000')
+        total = sum(Expense.objects.filter(owner=owner).values_list('base_amount', flat=True))
+        rollup = sum(ExpenseMonthlyTotal.objects.filter(owner=owner).values_list('total', flat=True))
+        self.assertEqual(total, rollup)
+        
+    def test_clear(self):
+        call_command('seed_data', users=1, expenses=5, income=1, prefix='c', stdout=open(os.devnull, 'w'))
+        call_command('seed_data', users=1, expenses=5, income=1, prefix='c', clear=True, stdout=open(os.devnull, 'w'))
+        self.assertEqual(Expense.objects.filter(owner__username__startswith='c').count(), 5)
+        
+class BenchmarkTest(TestCase):
+    def test_writes_results(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        output = os.path.join(directory, 'run.json')
+        call_command('benchmark', sizes='20,40', repeat=2, output=output, stdout=open(os.devnull, 'w'))
+        with open(output) as result_file:
+            results = json.load(result_file)['results']
+        self.assertEqual([result['size'] for result in results], [20, 40])
+        self.assertIn('dashboard', results[0]['endpoints'])
+        for result in results:
+            for label, endpoint in result['endpoints'].items():
+                self.assertLess(endpoint['status'], 400, label)
+                self.assertLessEqual(endpoint['p50_ms'], endpoint['p95_ms'])
+                # Pages with everything cached, such as forms, run none.
+                self.assertGreaterEqual(endpoint['queries'], 0, label)
+                self.assertGreater(endpoint['peak_memory_kb'], 0, label)
+        self.assertFalse(get_user_model().objects.filter(username__startswith='bench').exists())
+        self.assertFalse(Expense.objects.filter(owner__username__startswith='bench').exists())
+
+    def test_page_cursor_opens_the_page(self):
+        owner = get_user_model().objects.create_user(username='cursor', password='password123')
+        for day in range(1, 13):
+            Expense.objects.create(amount=1, date=datetime.date(2024, 1, day), description='Row', owner=owner,
+                                   category=category_named('Food'))
+        with override_settings(LIST_PAGE_SIZE=2):
+            cursor = page_cursor(owner, 5)
+            self.assertEqual(keyset_page(Expense.objects.filter(owner=owner), {'after': cursor})[0].date,
+                             datetime.date(2024, 1, 4))
+            self.assertEqual(page_cursor(owner, 50), encode_cursor(Expense.objects.get(owner=owner, date__day=1)))
+        
+class ConcurrencyBenchmarkTest(TransactionTestCase):
+    # Requests run on other threads, which only see committed rows.
+    databases = {'default', *settings.DATABASE_REPLICAS}
+    
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.addClassCleanup(close_pools, settings.DATABASE_REPLICAS)
+    
+    def test_writes_results_for_both_paths(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        output = os.path.join(directory, 'run.json')
+        call_command('benchmark_concurrency', rows=20, concurrency='1,3', requests=12, threads=2,
+                     output=output, stdout=open(os.devnull, 'w'))
+        with open(output) as result_file:
+            results = json.load(result_file)['results']
+        self.assertEqual([result['concurrency'] for result in results], [1, 3])
+        for result in results:
+            for path in ('wsgi', 'asgi'):
+                self.assertEqual(result[path]['requests'], 12)
+                self.assertEqual(result[path]['errors'], 0, path)
+        self.assertFalse(Expense.objects.exists())
+        
+        
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRoutingTest(TransactionTestCase):
+    # The replica alias mirrors the test database on its own connection,
+    # which only sees committed rows.
+    databases = {'default', 'replica1'}
+    
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.addClassCleanup(close_pools, ['replica1'])
+        
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser', email='test@example.com', password='password123')
+        self.client = Client()
+        self.client.login(username='testuser', password='password123')
+        self.client.cookies.pop(routers.PIN_COOKIE, None)
+        self.category = category_named('Food')
+        Expense.objects.create(amount=10, date=now().date(), description='Lunch', owner=self.user, category=self.category)
+        
+    def get(self, url_name):
+        with CaptureQueriesContext(connections['replica1']) as replica, CaptureQueriesContext(connection) as primary:
+            response = self.client.get(reverse(url_name))
+            body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body, len(replica), len(primary)
+        
+    def test_reporting_reads_go_to_the_replica(self):
+        response, body, replica, primary = self.get('expense_category_summary')
+        self.assertEqual(json.loads(body)['expense_category_data'], {'Food': 10.0})
+        self.assertGreater(replica, 0)
+        self.assertEqual(primary, 0)
+        
+    def test_streamed_exports_read_from_the_replica(self):
+        response, body, replica, primary = self.get('export-expenses')
+        self.assertIn(b'Lunch', body)
+        self.assertGreater(replica, 0)
+        
+    def test_other_views_read_from_the_primary(self):
+        response, body, replica, primary = self.get('expenses')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(replica, 0)
+        self.assertGreater(primary, 0)
+        
+    def test_budget_reads_use_the_replica_and_writes_the_primary(self):
+        response, body, replica, primary = self.get('category-budgets')
+        self.assertEqual(json.loads(body)['categories'][0]['budget'], None)
+        self.assertGreater(replica, 0)
+        with CaptureQueriesContext(connections['replica1']) as replica:
+            response = self.client.post(reverse('category-budgets'), {'category': 'Food', 'amount': '30'})
+        self.assertEqual(response.json()['categories'][0]['budget'], 30)
+        self.assertEqual(len(replica), 0)
+        self.assertEqual(response.cookies[routers.PIN_COOKIE]['max-age'], 10)
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        response = self.client.post(reverse('add-expense'), {'amount': '5', 'description': 'Coffee', 'category': self.category.pk,
+                                                             'expense_date': now().date().isoformat()})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.cookies[routers.PIN_COOKIE]['max-age'], 10)
+        response, body, replica, primary = self.get('expense_category_summary')
+        self.assertEqual(json.loads(body)['expense_category_data'], {'Food': 15.0})
+        self.assertEqual(replica, 0)
+        
+    def test_reads_after_a_write_or_in_a_transaction_stay_on_the_primary(self):
+        router = routers.ReplicaRouter()
+        token = routers.routing.set(routers.Routing())
+        self.addCleanup(routers.routing.reset, token)
+        self.assertEqual(router.db_for_read(Expense), 'default')
+        routers.use_replica()
+        self.assertEqual(router.db_for_read(Expense), 'replica1')
+        with transaction.atomic():
+            self.assertEqual(router.db_for_read(Expense), 'default')
+        self.assertEqual(router.db_for_write(Expense), 'default')
+        self.assertEqual(router.db_for_read(Expense), 'default')
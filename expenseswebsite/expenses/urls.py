@@ -9,5 +9,25 @@ urlpatterns = [
     path('expense-delete/<int:id>', views.delete_expense, name="expense-delete"),
     path('search-expenses',csrf_exempt(views.search_expense), name="search-expenses"),
     path('expense_category_summary', views.expense_category_summary, name="expense_category_summary"),
+    path('expense_timeseries', views.expense_timeseries, name="expense_timeseries"),
+    path('import-expenses', views.import_expenses, name="import-expenses"),
+    path('export-expenses', views.export_expenses, name="export-expenses"),
     path('stats', views.stats_view, name="stats"),
+    path('category-budgets', views.category_budgets, name="category-budgets"),
 ]
+
+# Most SQL queries one request to each view may issue; see expenseswebsite.querybudget.
+QUERY_BUDGETS = {
+    'expenses': 3,
+    'add-expense': 10,
+    'expense-edit': 9,
+    'expense-delete': 5,
+    'search-expenses': 2,
+    'expense_category_summary': 4,
+    'expense_timeseries': 2,
+    'import-expenses': 15,
+    'export-expenses': 1,
+    'stats': 0,
+    # An upsert when setting a budget, then every category's budget and total in one query.
+    'category-budgets': 2,
+}
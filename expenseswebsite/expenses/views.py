@@ -1,49 +1,48 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
-from .models import Category, Expense
+from .models import Expense, ExpenseMonthlyTotal
 from django.contrib import messages
-from django.core.paginator import Paginator
 from django.http import JsonResponse
 import json, datetime
-from userpreferences.models import UserPreference
+from expenseswebsite.rollups import atotals_by_key
+from expenseswebsite import timeseries
+from expenseswebsite.search import asearch
+from expenseswebsite.pagination import keyset_page
+from expenseswebsite.validation import validate_choice, validate_currency, validate_entry
+from expenseswebsite import statements, exports, refdata, throttle
+from expenseswebsite.routers import replica_reads
+from userpreferences import rates
+from . import budgets
 
 # Create your views here.
 
-def search_expense(request):
+@login_required(login_url='/authentication/login')
+@replica_reads
+async def search_expense(request):
     if request.method == 'POST':
         search_str = json.loads(request.body).get('searchText')
-        expenses = Expense.objects.filter(
-            amount__istartswith = search_str, owner = request.user
-        ) | Expense.objects.filter(
-            date__istartswith = search_str, owner = request.user
-        ) | Expense.objects.filter(
-            description__icontains = search_str, owner = request.user
-        ) | Expense.objects.filter(
-            category__icontains = search_str, owner = request.user
-        )
-        data = expenses.values()
-        return JsonResponse(list(data), safe=False)
+        user = await request.auser()
+        return await throttle.search_response('expenses', user, lambda: asearch(
+            Expense.objects.filter(owner=user), 'category', search_str,
+            ('id', 'amount', 'date', 'description', 'owner_id', 'category')))
 
 @login_required(login_url='/authentication/login')
 def index(request):
-    categories = Category.objects.all()
-    expenses = Expense.objects.filter(owner=request.user)
-    paginator = Paginator(expenses, 2)
-    page_number = request.GET.get('page')
-    page_obj = Paginator.get_page(paginator, page_number)
-    currency = UserPreference.objects.get(user=request.user).currency
+    page_obj = keyset_page(Expense.objects.filter(owner=request.user).select_related('category'), request.GET)
     context = {
-        'expenses': expenses,
+        'expenses': page_obj,
         'page_obj': page_obj,
-        'currency': currency
+        'total_count': ExpenseMonthlyTotal.objects.count_for(request.user)
     }
     return render(request, 'expenses/index.html', context)
 
 @login_required(login_url='/authentication/login')
 def add_expense(request):
-    categories = Category.objects.all()
+    categories = refdata.get('categories')
     context = {
         'categories': categories,
+        'currencies': refdata.get('currencies'),
+        'selected_currency': request.POST.get('currency') or rates.preferred_currency(request.user_preference or None),
         'values': request.POST
     }
     
@@ -54,33 +53,32 @@ def add_expense(request):
         amount = request.POST['amount']
         description = request.POST['description']
         date = request.POST['expense_date']
-        category = request.POST['category']
-        
-        if not amount:
-            messages.error(request, 'Amount is required')
-            return render(request, 'expenses/add_expense.html', context)
+        category = refdata.find('categories', request.POST['category'])
         
-        if not description:
-            messages.error(request, 'Description is required')
-            return render(request, 'expenses/add_expense.html', context)
+        currency = context['selected_currency']
         
-        if not date:
-            messages.error(request, 'Date is required')
+        error = (validate_entry(amount, description, date) or validate_currency(currency)
+                 or validate_choice(category, 'category'))
+        if error:
+            messages.error(request, error)
             return render(request, 'expenses/add_expense.html', context)
         
-        Expense.objects.create(owner=request.user, amount=amount, date=date, category=category, description=description)
+        expense = Expense.objects.create(owner=request.user, amount=amount, currency=currency, date=date, category=category, description=description)
         messages.success(request, 'Expense saved successfully')
+        budgets.warn_if_over_budget(request, expense)
         
         return redirect('expenses')
     
 @login_required(login_url='/authentication/login')
 def expense_edit(request, id):
-    expense = Expense.objects.get(pk=id)
-    categories = Category.objects.all()
+    expense = Expense.objects.select_related('category').get(pk=id)
+    categories = refdata.get('categories')
     context = {
         'expense': expense,
         'values': expense,
-        'categories': categories
+        'categories': categories,
+        'currencies': refdata.get('currencies'),
+        'selected_currency': request.POST.get('currency') or expense.currency
     }
     if request.method == 'GET':
         return render(request, 'expenses/edit-expense.html', context)
@@ -88,28 +86,26 @@ def expense_edit(request, id):
         amount = request.POST['amount']
         description = request.POST['description']
         date = request.POST['expense_date']
-        category = request.POST['category']
+        category = refdata.find('categories', request.POST['category'])
 
-        if not amount:
-            messages.error(request, 'Amount is required')
-            return render(request, 'expenses/edit-expense.html', context)
-        
-        if not description:
-            messages.error(request, 'Description is required')
-            return render(request, 'expenses/edit-expense.html', context)
-        
-        if not date:
-            messages.error(request, 'Date is required')
+        currency = context['selected_currency']
+
+        error = (validate_entry(amount, description, date) or validate_currency(currency)
+                 or validate_choice(category, 'category'))
+        if error:
+            messages.error(request, error)
             return render(request, 'expenses/edit-expense.html', context)
         
         expense.owner = request.user
         expense.amount = amount
+        expense.currency = currency
         expense.date = date
         expense.category = category
         expense.description = description
         
         expense.save()
         messages.success(request, 'Expense Updated successfully ')
+        budgets.warn_if_over_budget(request, expense)
         return redirect('expenses')
     
 @login_required(login_url='/authentication/login')
@@ -119,30 +115,80 @@ def delete_expense(request, id):
     messages.success(request, 'Expense removed')
     return redirect('expenses')
 
-def expense_category_summary(request):
+@replica_reads
+async def expense_category_summary(request):
     todays_date = datetime.date.today()
     six_months_ago = todays_date-datetime.timedelta(days=30*6)
-    expenses = Expense.objects.filter(owner=request.user,
-                                      date__gte=six_months_ago, date__lte=todays_date)
-    finalrep = {}
+    finalrep = await atotals_by_key(Expense.objects.all(), ExpenseMonthlyTotal, await request.auser(),
+                                    six_months_ago, todays_date)
+    code, factor = await rates.adisplay_currency(await request.auser_preference())
+    return JsonResponse({'expense_category_data': rates.convert_totals(await refdata.alabel('categories', finalrep), factor), 'currency': code}, safe=False)
 
-    def get_category(expense):
-        return expense.category
-    category_list = list(set(map(get_category, expenses)))
+@login_required(login_url='/authentication/login')
+@replica_reads
+def expense_timeseries(request):
+    try:
+        start, end, granularity = timeseries.parse_range(request.GET)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    data = timeseries.cached_timeseries('expenses', Expense.objects.all(), 'category', request.user,
+                                        start, end, granularity)
+    data = {**data, 'series': refdata.label('categories', data['series'])}
+    code, factor = rates.display_currency(request.user_preference or None)
+    return JsonResponse({**rates.convert_series(data, factor), 'currency': code})
 
-    def get_expense_category_amount(category):
-        amount = 0
-        filtered_by_category = expenses.filter(category=category)
+@login_required(login_url='/authentication/login')
+def category_budgets(request):
+    # POST category and amount, in the preferred currency, to set a budget.
+    if request.method == 'POST':
+        category = refdata.find('categories', request.POST.get('category', ''))
+        error = validate_choice(category, 'category')
+        if not error:
+            try:
+                budgets.set_budget(request.user, category, request.POST.get('amount') or 0,
+                                   rates.preferred_currency(request.user_preference or None))
+            except ValueError as invalid:
+                error = str(invalid)
+        if error:
+            return JsonResponse({'error': error}, status=400)
+    return category_budget_status(request)
 
-        for item in filtered_by_category:
-            amount += item.amount
-        return amount
+@replica_reads
+def category_budget_status(request):
+    # After a write the request reads from the primary all the same.
+    try:
+        month = datetime.date.fromisoformat(request.GET['month'] + '-01') if 'month' in request.GET else datetime.date.today()
+    except ValueError:
+        return JsonResponse({'error': 'month must look like YYYY-MM'}, status=400)
+    month = month.replace(day=1)
+    code, factor = rates.display_currency(request.user_preference or None)
+    return JsonResponse({'month': month.isoformat(), 'currency': code,
+                         'categories': budgets.status_rows(budgets.status(request.user, month), factor)})
 
-    for x in expenses:
-        for y in category_list:
-            finalrep[y] = get_expense_category_amount(y)
+@login_required(login_url='/authentication/login')
+def import_expenses(request):
+    if request.method != 'POST' or 'statement' not in request.FILES:
+        return JsonResponse({'error': 'POST a CSV or OFX file as "statement"'}, status=400)
+    upload = request.FILES['statement']
+    statement_format = request.POST.get('format') or statements.detect_format(upload.name)
+    default_key = refdata.find('categories', request.POST.get('category') or statements.DEFAULT_KEY)
+    error = validate_choice(default_key, 'category')
+    if error:
+        return JsonResponse({'error': error}, status=400)
+    result = statements.import_statement(Expense, ExpenseMonthlyTotal, request.user, upload.file,
+                                         statement_format, 'debit',
+                                         default_key.name,
+                                         request.POST.get('currency') or rates.preferred_currency(request.user_preference or None))
+    return JsonResponse(result.as_dict())
 
-    return JsonResponse({'expense_category_data': finalrep}, safe=False)
+@login_required(login_url='/authentication/login')
+@replica_reads
+def export_expenses(request):
+    try:
+        return exports.export_response(Expense.objects.filter(owner=request.user), 'category',
+                                       request.GET, 'expenses')
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
 
 @login_required(login_url='/authentication/login')
 def stats_view(request):
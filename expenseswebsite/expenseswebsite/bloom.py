@@ -0,0 +1,30 @@
+"""Bloom filter: a compact set that answers "definitely not present" or
+"possibly present", with a false positive rate chosen at construction."""
+import hashlib
+import math
+import threading
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self._lock = threading.Lock()
+
+    def positions(self, value):
+        # Double hashing: k positions from the two halves of one digest.
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        # Setting a bit reads and writes its byte, so concurrent adds could
+        # lose one and turn a present value into a false negative.
+        with self._lock:
+            for position in self.positions(value):
+                self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(value))
@@ -0,0 +1,115 @@
+"""Combined expense and income figures for the stats pages.
+
+One request returns the expense totals per category and income totals per
+source over the last few calendar months, the monthly expense, income and
+net cashflow series, and headline figures, as parallel arrays ready for
+Chart.js. Everything comes from the two monthly rollup tables, one query
+each, and is cached until the owner's next write.
+"""
+import datetime
+from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.http import JsonResponse
+from expenses.models import ExpenseMonthlyTotal
+from expenseswebsite import metrics, refdata, timeseries
+from expenseswebsite.rollups import month_start, next_month
+from expenseswebsite.routers import replica_reads
+from userincome.models import IncomeMonthlyTotal
+from userpreferences import rates
+
+DEFAULT_MONTHS = 6
+MAX_MONTHS = 24
+CACHE_TIMEOUT = 60 * 60
+ROLLUPS = (('expenses', ExpenseMonthlyTotal, 'categories'), ('income', IncomeMonthlyTotal, 'sources'))
+
+
+def parse_months(params):
+    try:
+        months = int(params.get('months', DEFAULT_MONTHS))
+    except ValueError:
+        months = 0
+    if not 1 <= months <= MAX_MONTHS:
+        raise ValueError(f'months must be a whole number from 1 to {MAX_MONTHS}')
+    return months
+
+
+def month_range(today, months):
+    """The first days of the ``months`` calendar months ending with today's."""
+    first = month_start(today)
+    for _ in range(months - 1):
+        first = month_start(first - datetime.timedelta(days=1))
+    labels = [first]
+    while len(labels) < months:
+        labels.append(next_month(labels[-1]))
+    return labels
+
+
+async def figures(owner, labels):
+    """Base-currency totals per month and per category/source primary key."""
+    index = {month: i for i, month in enumerate(labels)}
+    data = {'months': [month.isoformat() for month in labels]}
+    for name, rollup_model, _ in ROLLUPS:
+        monthly, by_key = [0] * len(labels), {}
+        rows = (rollup_model.objects
+                .filter(owner=owner, month__gte=labels[0], month__lt=next_month(labels[-1]))
+                .values_list('month', rollup_model.key_field, 'total'))
+        async for month, key, total in rows:
+            monthly[index[month]] += total
+            by_key[key] = by_key.get(key, 0) + total
+        data[name] = monthly
+        data[name + '_by_key'] = by_key
+    return data
+
+
+async def cached_figures(owner, months):
+    labels = month_range(datetime.date.today(), months)
+    version = await cache.aget_or_set(timeseries.version_key(owner.pk), 1, None)
+    cache_key = f'dashboard:{owner.pk}:{version}:{labels[0]}:{months}'
+    data = await cache.aget(cache_key)
+    metrics.cache_lookup('dashboard', data is not None)
+    if data is None:
+        data = await figures(owner, labels)
+        await cache.aset(cache_key, data, CACHE_TIMEOUT)
+    return data
+
+
+def columns(totals, factor):
+    ordered = sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+    return {'labels': [label for label, _ in ordered],
+            'totals': [rates.convert(total, factor) for _, total in ordered]}
+
+
+def kpis(data, factor):
+    income, expenses = sum(data['income']), sum(data['expenses'])
+    by_category = data['expenses_by_key']
+    return {
+        'income': rates.convert(income, factor),
+        'expenses': rates.convert(expenses, factor),
+        'net': rates.convert(income - expenses, factor),
+        'savings_rate': round(float((income - expenses) / income), 4) if income else None,
+        'average_monthly_expenses': rates.convert(expenses / len(data['months']), factor),
+        'top_category': max(by_category, key=by_category.get) if by_category else None,
+    }
+
+
+@login_required(login_url='/authentication/login')
+@replica_reads
+async def dashboard_view(request):
+    try:
+        months = parse_months(request.GET)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    user = await request.auser()
+    data = await cached_figures(user, months)
+    code, factor = await rates.adisplay_currency(await request.auser_preference())
+    labelled = {name: await refdata.alabel(dataset, data[name + '_by_key']) for name, _, dataset in ROLLUPS}
+    return JsonResponse({
+        'currency': code,
+        'months': data['months'],
+        'expenses': [rates.convert(total, factor) for total in data['expenses']],
+        'income': [rates.convert(total, factor) for total in data['income']],
+        'net': [rates.convert(income - expense, factor) for income, expense in zip(data['income'], data['expenses'])],
+        'categories': columns(labelled['expenses'], factor),
+        'sources': columns(labelled['income'], factor),
+        'kpis': kpis({**data, 'expenses_by_key': labelled['expenses']}, factor),
+    })
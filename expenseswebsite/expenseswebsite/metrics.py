@@ -0,0 +1,244 @@
+"""Request, database and cache metrics in the Prometheus text format.
+
+Each worker process counts in memory and every METRICS_FLUSH_INTERVAL
+seconds writes its totals to its own file in METRICS_DIR. The /metrics view
+adds up the files of all workers, so whichever process answers the scrape
+reports the whole deployment. Files are only ever written by their own
+process and replaced atomically, so no locking between workers is needed.
+
+A worker removes its file when it exits. The file of one that died without
+exiting cleanly still counts towards the counters, but not the gauges,
+which describe live processes only. Clear METRICS_DIR whenever the
+deployment starts, so that a new worker reusing a dead one's PID does not
+replace larger totals and make the counters go backwards.
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+FAMILIES = {
+    'http_requests_total': ('counter', 'Requests by URL name, method and status.'),
+    'http_request_duration_seconds': ('histogram', 'Request latency by URL name.'),
+    'db_queries_total': ('counter', 'SQL queries by URL name.'),
+    'cache_requests_total': ('counter', 'Application cache lookups by cache and result.'),
+    'search_requests_total': ('counter', 'Keystroke searches run, superseded by a newer one or throttled.'),
+    'db_pool_max_connections': ('gauge', 'Connection pool size limit by database alias.'),
+    'db_pool_connections': ('gauge', 'Open pooled connections, idle or in use.'),
+    'db_pool_idle_connections': ('gauge', 'Pooled connections ready to be checked out.'),
+    'db_pool_waiting_requests': ('gauge', 'Checkouts currently waiting for a connection.'),
+    'db_pool_checkouts_total': ('counter', 'Connections checked out of the pool.'),
+    'db_pool_queued_checkouts_total': ('counter', 'Checkouts that had to wait for a connection.'),
+    'db_pool_wait_seconds_total': ('counter', 'Time spent waiting for a pooled connection.'),
+    'db_pool_checkout_errors_total': ('counter', 'Checkouts that timed out or failed.'),
+    'db_pool_failed_health_checks_total': ('counter', 'Connections found broken when checked out.'),
+}
+# psycopg_pool statistics, as (family, scale). The pool keeps its own
+# running totals, which are copied in whenever this process flushes.
+POOL_STATS = {
+    'pool_max': ('db_pool_max_connections', 1),
+    'pool_size': ('db_pool_connections', 1),
+    'pool_available': ('db_pool_idle_connections', 1),
+    'requests_waiting': ('db_pool_waiting_requests', 1),
+    'requests_num': ('db_pool_checkouts_total', 1),
+    'requests_queued': ('db_pool_queued_checkouts_total', 1),
+    'requests_wait_ms': ('db_pool_wait_seconds_total', 0.001),
+    'requests_errors': ('db_pool_checkout_errors_total', 1),
+    'connections_lost': ('db_pool_failed_health_checks_total', 1),
+}
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_last_flush = 0.0
+_exit_hook_pid = None
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, labels, amount=1):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, labels, value):
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * len(BUCKETS), 0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                histogram[0][i] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+
+def cache_lookup(cache, hit):
+    inc('cache_requests_total', {'cache': cache, 'result': 'hit' if hit else 'miss'})
+
+
+def record_pool_stats():
+    for alias in connections:
+        # Only the PostgreSQL backend has pools, and only with OPTIONS['pool'].
+        pool = getattr(connections[alias], 'pool', None)
+        if pool is None:
+            continue
+        stats = pool.get_stats()
+        with _lock:
+            for stat, (family, scale) in POOL_STATS.items():
+                _counters[_key(family, {'alias': alias})] = stats.get(stat, 0) * scale
+
+
+def snapshot():
+    with _lock:
+        return {
+            'counters': [[name, dict(labels), value] for (name, labels), value in _counters.items()],
+            'histograms': [[name, dict(labels), [list(buckets), total, count]]
+                           for (name, labels), (buckets, total, count) in _histograms.items()],
+        }
+
+
+def process_file(pid=None):
+    return os.path.join(settings.METRICS_DIR, f'metrics-{pid or os.getpid()}.json')
+
+
+def remove_process_file(pid=None):
+    try:
+        os.remove(process_file(pid))
+    except FileNotFoundError:
+        pass
+
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def flush(force=False):
+    global _last_flush
+    now = time.monotonic()
+    if not force and now - _last_flush < settings.METRICS_FLUSH_INTERVAL:
+        return
+    _last_flush = now
+    record_pool_stats()
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=settings.METRICS_DIR, prefix='.metrics-')
+    with os.fdopen(fd, 'w') as temp_file:
+        json.dump(snapshot(), temp_file)
+    os.replace(temp_path, process_file())
+    global _exit_hook_pid
+    if _exit_hook_pid != os.getpid():
+        # Once per process, forked workers included.
+        _exit_hook_pid = os.getpid()
+        atexit.register(remove_process_file, _exit_hook_pid)
+
+
+def collect():
+    """Add up the flushed totals of every worker, this one included."""
+    flush(force=True)
+    gauges = {family for family, (kind, _) in FAMILIES.items() if kind == 'gauge'}
+    counters = {}
+    histograms = {}
+    for filename in sorted(os.listdir(settings.METRICS_DIR)):
+        if not filename.startswith('metrics-'):
+            continue
+        try:
+            with open(os.path.join(settings.METRICS_DIR, filename)) as metrics_file:
+                data = json.load(metrics_file)
+            pid = int(filename[len('metrics-'):-len('.json')])
+        except (OSError, ValueError):
+            continue
+        live = pid == os.getpid() or alive(pid)
+        for name, labels, value in data['counters']:
+            if name in gauges and not live:
+                continue
+            key = _key(name, labels)
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, (buckets, total, count) in data['histograms']:
+            key = _key(name, labels)
+            merged = histograms.setdefault(key, [[0] * len(BUCKETS), 0.0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+            merged[1] += total
+            merged[2] += count
+    return counters, histograms
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+               for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def render():
+    counters, histograms = collect()
+    lines = []
+    for family, (kind, help_text) in FAMILIES.items():
+        lines.append(f'# HELP {family} {help_text}')
+        lines.append(f'# TYPE {family} {kind}')
+        for (name, labels), value in sorted(counters.items()):
+            if name == family:
+                lines.append(f'{name}{_labels(labels)} {value}')
+        for (name, labels), (buckets, total, count) in sorted(histograms.items()):
+            if name != family:
+                continue
+            for bound, bucket_count in zip(BUCKETS, buckets):
+                lines.append(f'{name}_bucket{_labels(labels, le=bound)} {bucket_count}')
+            lines.append(f'{name}_bucket{_labels(labels, le="+Inf")} {count}')
+            lines.append(f'{name}_sum{_labels(labels)} {total}')
+            lines.append(f'{name}_count{_labels(labels)} {count}')
+
+    lines.append('# HELP cache_hit_ratio Share of application cache lookups that were hits.')
+    lines.append('# TYPE cache_hit_ratio gauge')
+    lookups = {}
+    for (name, labels), value in counters.items():
+        if name == 'cache_requests_total':
+            labels = dict(labels)
+            hits, total = lookups.get(labels['cache'], (0, 0))
+            lookups[labels['cache']] = (hits + (value if labels['result'] == 'hit' else 0), total + value)
+    for cache, (hits, total) in sorted(lookups.items()):
+        lines.append(f'cache_hit_ratio{_labels([("cache", cache)])} {hits / total if total else 0}')
+
+    lines.append('# HELP db_pool_saturation Share of the connection pool size limit in use.')
+    lines.append('# TYPE db_pool_saturation gauge')
+    pools = {}
+    for (name, labels), value in counters.items():
+        if name in ('db_pool_connections', 'db_pool_idle_connections', 'db_pool_max_connections'):
+            pools.setdefault(dict(labels)['alias'], {})[name] = value
+    for alias, pool in sorted(pools.items()):
+        in_use = pool.get('db_pool_connections', 0) - pool.get('db_pool_idle_connections', 0)
+        limit = pool.get('db_pool_max_connections', 0)
+        lines.append(f'db_pool_saturation{_labels([("alias", alias)])} {in_use / limit if limit else 0}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    global _last_flush
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+    _last_flush = 0.0
+
+
+def metrics_view(request):
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
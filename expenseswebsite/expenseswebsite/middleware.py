@@ -0,0 +1,227 @@
+import logging
+import random
+import re
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from expenseswebsite import metrics, routers, timing
+
+logger = logging.getLogger('expenseswebsite.queries')
+timing_logger = logging.getLogger('expenseswebsite.timing')
+
+IN_LIST_RE = re.compile(r'\(\s*%s(?:\s*,\s*%s)+\s*\)')
+
+# Execute wrappers watching the current request. A context variable rather
+# than connection.execute_wrapper(), because under ASGI the async ORM runs
+# queries on connections of worker threads, which inherit the context.
+query_observers = ContextVar('query_observers', default=())
+
+
+def observe_queries(execute, sql, params, many, context):
+    for observer in reversed(query_observers.get()):
+        execute = partial(observer, execute)
+    return execute(sql, params, many, context)
+
+
+def install_observers(connection, **kwargs):
+    # Put first, so an execute_wrapper() block that was open when the
+    # connection was made still pops its own wrapper.
+    if observe_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, observe_queries)
+
+
+connection_created.connect(install_observers)
+for open_connection in connections.all(initialized_only=True):
+    install_observers(open_connection)
+
+
+@contextmanager
+def observing(observer):
+    token = query_observers.set((*query_observers.get(), observer))
+    try:
+        yield
+    finally:
+        query_observers.reset(token)
+
+
+def query_shape(sql):
+    # Parameters arrive separately, so only IN lists of different lengths
+    # need folding for two queries of the same shape to compare equal.
+    return IN_LIST_RE.sub('(%s, ...)', sql)
+
+
+def project_stack():
+    frames = traceback.extract_stack()[:-3]
+    return [frame for frame in frames
+            if frame.filename.startswith(str(settings.BASE_DIR)) and 'site-packages' not in frame.filename]
+
+
+class ObservingMiddleware:
+    """Base for middleware that watch the rest of the chain, natively under
+    both WSGI and ASGI. Subclasses implement ``watch(request)``, a context
+    manager around the response yielding some state, and
+    ``finish(request, response, state)``.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with self.watch(request) as state:
+            response = self.get_response(request)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        with self.watch(request) as state:
+            response = await self.get_response(request)
+        return self.finish(request, response, state)
+
+
+class RepeatedQueryMiddleware(ObservingMiddleware):
+    """Development aid: log query shapes that one request runs
+    N_PLUS_ONE_THRESHOLD or more times, with the stack that issued the first.
+
+    Only active with DEBUG on. Queries issued while a streaming response is
+    consumed happen after the middleware returns and are not seen. For
+    async views the stack ends where the query crossed into a worker thread.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DEBUG:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    @contextmanager
+    def watch(self, request):
+        counts = Counter()
+        stacks = {}
+
+        def record(execute, sql, params, many, context):
+            shape = query_shape(sql)
+            counts[shape] += 1
+            if shape not in stacks:
+                stacks[shape] = project_stack()
+            return execute(sql, params, many, context)
+
+        with observing(record):
+            yield counts, stacks
+
+    def finish(self, request, response, state):
+        counts, stacks = state
+        for shape, count in counts.items():
+            if count >= settings.N_PLUS_ONE_THRESHOLD:
+                logger.warning('%s ran %d times in %s %s, first from:\n%s', shape, count, request.method,
+                               request.path, ''.join(traceback.format_list(stacks[shape])),
+                               extra={'query_shape': shape, 'query_count': count, 'path': request.path})
+        return response
+
+
+class ServerTimingMiddleware(ObservingMiddleware):
+    """Time SQL, template rendering and the rest of each sampled request.
+
+    Results go out as a Server-Timing header and one logfmt line on
+    expenseswebsite.timing. SERVER_TIMING_SAMPLE_RATE sets the share of
+    requests instrumented; the others only pay for one random() call.
+    """
+
+    def __init__(self, get_response):
+        if settings.SERVER_TIMING_SAMPLE_RATE <= 0:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    @contextmanager
+    def watch(self, request):
+        if random.random() >= settings.SERVER_TIMING_SAMPLE_RATE:
+            yield None
+            return
+        request_timing = timing.Timing()
+        token = timing.current.set(request_timing)
+        try:
+            with observing(request_timing.execute):
+                yield request_timing
+        finally:
+            timing.current.reset(token)
+
+    def finish(self, request, response, request_timing):
+        if request_timing is None:
+            return response
+        metrics = request_timing.metrics()
+        header = timing.server_timing_header(metrics)
+        if response.has_header('Server-Timing'):
+            header = response['Server-Timing'] + ', ' + header
+        response['Server-Timing'] = header
+        timing_logger.info(
+            'method=%s path=%s status=%s total_ms=%.1f db_ms=%.1f db_queries=%d tpl_ms=%.1f app_ms=%.1f',
+            request.method, request.path, response.status_code, metrics['total'], metrics['db'],
+            metrics['queries'], metrics['tpl'], metrics['app'],
+            extra={'path': request.path, 'status': response.status_code, **metrics})
+        return response
+
+
+class MetricsMiddleware(ObservingMiddleware):
+    """Count requests, latency and queries per URL name for /metrics."""
+
+    @contextmanager
+    def watch(self, request):
+        state = {'queries': 0, 'started': time.perf_counter()}
+
+        def count(execute, sql, params, many, context):
+            state['queries'] += 1
+            return execute(sql, params, many, context)
+
+        with observing(count):
+            yield state
+
+    def finish(self, request, response, state):
+        elapsed = time.perf_counter() - state['started']
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        metrics.inc('http_requests_total', {'view': view, 'method': request.method,
+                                            'status': str(response.status_code)})
+        metrics.observe('http_request_duration_seconds', {'view': view}, elapsed)
+        metrics.inc('db_queries_total', {'view': view}, state['queries'])
+        metrics.flush()
+        return response
+
+
+class ReplicaPinMiddleware(ObservingMiddleware):
+    """Track the database routing of each request, see routers.py, and pin
+    clients that wrote to the primary with a cookie for REPLICA_PIN_SECONDS.
+
+    Not used without DATABASE_REPLICAS, when every read goes to the primary.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    @contextmanager
+    def watch(self, request):
+        state = routers.Routing(pinned=routers.PIN_COOKIE in request.COOKIES)
+        token = routers.routing.set(state)
+        try:
+            yield state
+        finally:
+            routers.routing.reset(token)
+
+    def finish(self, request, response, state):
+        if state.wrote:
+            response.set_cookie(routers.PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                                secure=request.is_secure(), httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,92 @@
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from django import forms
+from django.core import exceptions
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Round
+
+DECIMAL_PLACES = 2
+CENT = Decimal(1).scaleb(-DECIMAL_PLACES)
+BACKFILL_BATCH_SIZE = 5000
+# The column is a BIGINT of minor units.
+MAX_MINOR_UNITS = 2 ** 63 - 1
+
+
+def quantize(value):
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def to_minor_units(value):
+    return int(quantize(value).scaleb(DECIMAL_PLACES))
+
+
+def as_number(value):
+    # JSON for the charts: Decimals turn into strings otherwise.
+    return float(value)
+
+
+class MoneyField(models.BigIntegerField):
+    """An amount of money stored as a whole number of minor units (cents),
+    so that database SUMs are exact. Python code sees a Decimal."""
+
+    description = 'Amount of money stored in minor units'
+    default_error_messages = {
+        'invalid': '“%(value)s” value must be a decimal number.',
+        'out_of_range': '“%(value)s” value is too large.',
+    }
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return Decimal(value).scaleb(-DECIMAL_PLACES)
+
+    def to_python(self, value):
+        if value is None:
+            return value
+        try:
+            amount = quantize(str(value).strip())
+        except (InvalidOperation, ValueError):
+            raise exceptions.ValidationError(
+                self.error_messages['invalid'], code='invalid', params={'value': value})
+        if amount.is_nan():
+            raise exceptions.ValidationError(
+                self.error_messages['invalid'], code='invalid', params={'value': value})
+        if abs(amount.scaleb(DECIMAL_PLACES)) > MAX_MINOR_UNITS:
+            raise exceptions.ValidationError(
+                self.error_messages['out_of_range'], code='out_of_range', params={'value': value})
+        return amount
+
+    def get_prep_value(self, value):
+        if value is None or hasattr(value, 'resolve_expression'):
+            return value
+        return to_minor_units(self.to_python(value))
+
+    def formfield(self, **kwargs):
+        return super(models.IntegerField, self).formfield(**{
+            'form_class': forms.DecimalField,
+            'decimal_places': DECIMAL_PLACES,
+            **kwargs,
+        })
+
+
+def backfill_minor_units(model, columns, batch_size=BACKFILL_BATCH_SIZE):
+    """Copy float ``columns`` ({source: target}) of ``model`` into integer
+    minor-unit columns, ``batch_size`` rows per transaction.
+
+    Only rows whose target is still NULL are touched, so an interrupted run
+    picks up where it stopped, and the table is never locked for long.
+    """
+    pending = model.objects.filter(**{f'{target}__isnull': True for target in columns.values()})
+    updates = {
+        target: Round(F(source) * 10 ** DECIMAL_PLACES)
+        for source, target in columns.items()
+    }
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            pks = list(pending.filter(pk__gt=last_pk).order_by('pk')
+                       .values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return
+            model.objects.filter(pk__in=pks).update(**updates)
+        last_pk = pks[-1]
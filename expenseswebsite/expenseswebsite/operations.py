@@ -0,0 +1,57 @@
+from django.db import migrations, transaction
+from django.db.models import OuterRef, Subquery
+from expenseswebsite.money import BACKFILL_BATCH_SIZE
+
+
+class RunPostgresSQL(migrations.RunSQL):
+    """RunSQL that is skipped on databases other than PostgreSQL.
+
+    Used for indexes, triggers and functions that only exist on PostgreSQL
+    so the test suite can still migrate an SQLite database.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+def backfill_foreign_key(model, source, target, batch_size=BACKFILL_BATCH_SIZE, **updates):
+    """Point the foreign key ``target`` of ``model`` at the related row whose
+    ``name`` equals the text column ``source``, ``batch_size`` rows per
+    transaction. ``updates`` are set on the same rows in the same statement.
+
+    Names without a related row get one first. Only rows whose target is
+    still NULL are touched, so an interrupted run picks up where it stopped.
+    """
+    related = model._meta.get_field(target).related_model
+    pending = model.objects.filter(**{f'{target}__isnull': True})
+    names = set(pending.values_list(source, flat=True).distinct())
+    known = set(related.objects.filter(name__in=names).values_list('name', flat=True))
+    related.objects.bulk_create([related(name=name) for name in sorted(names - known)])
+
+    key = Subquery(related.objects.filter(name=OuterRef(source)).values('pk')[:1])
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            pks = list(pending.filter(pk__gt=last_pk).order_by('pk')
+                       .values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                return
+            model.objects.filter(pk__in=pks).update(**{target: key}, **updates)
+        last_pk = pks[-1]
+
+
+def deduplicate_names(model):
+    """Keep only the first row of each ``name`` of ``model``. Only safe while
+    nothing references the rows by key yet."""
+    seen = set()
+    duplicates = []
+    for pk, name in model.objects.order_by('pk').values_list('pk', 'name'):
+        if name in seen:
+            duplicates.append(pk)
+        seen.add(name)
+    model.objects.filter(pk__in=duplicates).delete()
@@ -0,0 +1,76 @@
+import base64
+import binascii
+import datetime
+from django.conf import settings
+from django.db.models import Q
+
+
+def encode_cursor(obj):
+    raw = f'{obj.date.isoformat()}:{obj.pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        date, pk = raw.split(':')
+        return datetime.date.fromisoformat(date), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def page_size_from(params):
+    try:
+        size = int(params.get('page_size', settings.LIST_PAGE_SIZE))
+    except ValueError:
+        size = settings.LIST_PAGE_SIZE
+    return max(1, min(size, settings.LIST_MAX_PAGE_SIZE))
+
+
+class KeysetPage:
+    """One page of a queryset ordered by date descending, then id ascending.
+
+    Pages are addressed by the (date, id) of a boundary row instead of an
+    OFFSET, so every page costs one index range scan regardless of depth.
+    """
+
+    def __init__(self, object_list, has_next, has_previous, page_size):
+        self.object_list = object_list
+        self.page_size = page_size
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = encode_cursor(object_list[-1]) if has_next and object_list else None
+        self.previous_cursor = encode_cursor(object_list[0]) if has_previous and object_list else None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+
+def keyset_page(queryset, params):
+    page_size = page_size_from(params)
+    after = decode_cursor(params.get('after'))
+    before = None if after else decode_cursor(params.get('before'))
+
+    if before:
+        date, pk = before
+        rows = list(queryset.filter(Q(date__gt=date) | Q(date=date, id__lt=pk))
+                    .order_by('date', '-id')[:page_size + 1])
+        has_previous = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        return KeysetPage(rows, has_next=True, has_previous=has_previous, page_size=page_size)
+
+    if after:
+        date, pk = after
+        queryset = queryset.filter(Q(date__lt=date) | Q(date=date, id__gt=pk))
+    rows = list(queryset.order_by('-date', 'id')[:page_size + 1])
+    has_next = len(rows) > page_size
+    return KeysetPage(rows[:page_size], has_next=has_next, has_previous=after is not None,
+                      page_size=page_size)
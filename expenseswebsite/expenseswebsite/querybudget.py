@@ -0,0 +1,68 @@
+"""Per-view SQL query budgets.
+
+Each urls.py declares ``QUERY_BUDGETS``, mapping its URL names to the
+largest number of queries one request may issue. Tests mix in
+QueryBudgetMixin and call assertWithinBudget for every URL name.
+
+Budgets cover a warm process: reference data, the user's preference and
+their reports version are loaded before counting, so the work a worker
+does once, on its first request, never lands on the endpoint measured.
+They are for production, where a shared cache holds sessions and users
+(settings.CACHED_AUTH), and the mixin turns that on for its tests.
+"""
+from authentication import sessions
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver, reverse
+from expenseswebsite import metrics, refdata, timeseries
+from userpreferences.cache import get_preference
+
+
+def declared_budgets(resolver=None):
+    resolver = resolver or get_resolver()
+    budgets = dict(getattr(resolver.urlconf_module, 'QUERY_BUDGETS', {}))
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            budgets.update(declared_budgets(pattern))
+    return budgets
+
+
+def warm_caches(user=None):
+    refdata.warm()
+    if user is not None:
+        get_preference(user)
+        cache.get_or_set(timeseries.version_key(user.pk), 1, None)
+    metrics.reset()
+
+
+class QueryBudgetMixin:
+    @classmethod
+    def setUpClass(cls):
+        cached_auth = override_settings(**settings.CACHED_AUTH)
+        cached_auth.enable()
+        cls.addClassCleanup(cached_auth.disable)
+        sessions.reset()
+        cls.addClassCleanup(sessions.reset)
+        super().setUpClass()
+
+    def assertBudgetsDeclared(self, urls_module):
+        names = {pattern.name for pattern in urls_module.urlpatterns if getattr(pattern, 'name', None)}
+        missing = sorted(names - set(getattr(urls_module, 'QUERY_BUDGETS', {})))
+        self.assertEqual(missing, [], f'{urls_module.__name__} has no query budget for {missing}')
+
+    def assertWithinBudget(self, url_name, args=None, method='get', data=None, **extra):
+        budgets = declared_budgets()
+        self.assertIn(url_name, budgets, f'No query budget declared for {url_name}')
+        warm_caches(getattr(self, 'user', None))
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(reverse(url_name, args=args), data, **extra)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        issued = '\n'.join(query['sql'] for query in queries)
+        self.assertLessEqual(len(queries), budgets[url_name],
+                             f'{url_name} issued {len(queries)} queries, budget is '
+                             f'{budgets[url_name]}:\n{issued}')
+        return response
@@ -0,0 +1,155 @@
+"""Process-wide cache of small, rarely changing reference data.
+
+Each dataset is loaded once per process and kept in memory. Freshness is
+checked against a version: either a stamp in the shared Django cache,
+bumped by model signals and polled at most every REFDATA_CHECK_INTERVAL
+seconds, or a cheap local function such as a file's modification time.
+"""
+import time
+import uuid
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import request_started
+from expenseswebsite import metrics
+
+_datasets = {}
+_entries = {}
+
+
+class Dataset:
+    def __init__(self, name, loader, version, max_age):
+        self.name = name
+        self.loader = loader
+        self.version = version
+        self.max_age = max_age
+
+
+class Entry:
+    def __init__(self, version, value, checked):
+        self.version = version
+        self.value = value
+        self.checked = checked
+        self.loaded = checked
+
+
+def register(name, loader, version=None, max_age=None):
+    """Register ``loader`` under ``name``.
+
+    ``version`` is an optional callable returning a value that changes when
+    the data does; without it the shared cache stamp is used. With
+    ``max_age`` the data is also reloaded that many seconds after loading.
+    """
+    _datasets[name] = Dataset(name, loader, version, max_age)
+
+
+def stamp_key(name):
+    return f'refdata-version:{name}'
+
+
+def shared_version(name):
+    key = stamp_key(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 'initial', None)
+        version = cache.get(key)
+    return version
+
+
+def current_version(dataset):
+    if dataset.version is not None:
+        return dataset.version()
+    return shared_version(dataset.name)
+
+
+def recently_checked(dataset, entry, now):
+    return entry is not None and dataset.version is None and now - entry.checked < settings.REFDATA_CHECK_INTERVAL
+
+
+def expired(dataset, entry, now):
+    return dataset.max_age is not None and now - entry.loaded >= dataset.max_age
+
+
+def get(name):
+    dataset = _datasets[name]
+    entry = _entries.get(name)
+    now = time.monotonic()
+    if recently_checked(dataset, entry, now):
+        metrics.cache_lookup('refdata', True)
+        return entry.value
+    version = current_version(dataset)
+    if entry is None or entry.version != version or expired(dataset, entry, now):
+        metrics.cache_lookup('refdata', False)
+        entry = Entry(version, dataset.loader(), now)
+        _entries[name] = entry
+    else:
+        metrics.cache_lookup('refdata', True)
+        entry.checked = now
+    return entry.value
+
+
+async def aget(name):
+    # Only checking the version or loading needs a worker thread.
+    entry = _entries.get(name)
+    if recently_checked(_datasets[name], entry, time.monotonic()):
+        metrics.cache_lookup('refdata', True)
+        return entry.value
+    return await sync_to_async(get)(name)
+
+
+def find(name, value):
+    """The item of dataset ``name`` whose primary key, or else name, is ``value``."""
+    items = get(name)
+    value = str(value)
+    for item in items:
+        if str(item.pk) == value:
+            return item
+    for item in items:
+        if item.name == value:
+            return item
+    return None
+
+
+def label(name, keyed):
+    """Copy of ``keyed`` with its primary keys replaced by the names of the
+    items of dataset ``name``."""
+    names = {item.pk: item.name for item in get(name)}
+    if not keyed.keys() <= names.keys():
+        # Created elsewhere since this process last checked the stamp.
+        discard(name)
+        names = {item.pk: item.name for item in get(name)}
+    return {names.get(key, str(key)): value for key, value in keyed.items()}
+
+
+async def alabel(name, keyed):
+    names = {item.pk: item.name for item in await aget(name)}
+    if not keyed.keys() <= names.keys():
+        discard(name)
+        names = {item.pk: item.name for item in await aget(name)}
+    return {names.get(key, str(key)): value for key, value in keyed.items()}
+
+
+def bump(name):
+    # Every process notices the new stamp at its next check.
+    cache.set(stamp_key(name), uuid.uuid4().hex, None)
+    discard(name)
+
+
+def discard(name):
+    """Drop this process's copy of dataset ``name``, leaving the others'."""
+    _entries.pop(name, None)
+
+
+def warm(names=None):
+    for name in names or list(_datasets):
+        get(name)
+
+
+def warm_on_first_request(names):
+    # Database-backed datasets are warmed when the first request starts,
+    # as Django advises against queries while apps are still loading.
+    def receiver(**kwargs):
+        request_started.disconnect(dispatch_uid=uid)
+        warm(names)
+    uid = 'refdata-warm:' + ','.join(names)
+    request_started.connect(receiver, weak=False, dispatch_uid=uid)
@@ -0,0 +1,154 @@
+import datetime
+from django.apps import apps
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Q, Sum, Count
+from django.db.models.functions import TruncMonth
+from expenseswebsite import timeseries
+from expenseswebsite.money import MoneyField, to_minor_units
+
+
+def month_start(date):
+    return date.replace(day=1)
+
+
+def next_month(date):
+    if date.month == 12:
+        return datetime.date(date.year + 1, 1, 1)
+    return datetime.date(date.year, date.month + 1, 1)
+
+
+class MonthlyTotalManager(models.Manager):
+    # Subclasses of MonthlyTotal set `key_field` to the name of the grouping
+    # foreign key (category for expenses, source for income). Keys are
+    # passed around as primary keys.
+
+    def key_field(self):
+        return self.model.key_field
+
+    def key_column(self):
+        return self.model._meta.get_field(self.key_field()).attname
+
+    def add(self, owner_id, date, key, amount, count=1):
+        lookup = {'owner_id': owner_id, 'month': month_start(date), self.key_column(): key}
+        # F() arithmetic happens in the column's own unit, minor units.
+        cents = to_minor_units(amount)
+        updated = self.filter(**lookup).update(total=F('total') + cents, count=F('count') + count)
+        if updated:
+            return
+        try:
+            with transaction.atomic():
+                self.create(total=amount, count=count, **lookup)
+        except IntegrityError:
+            # Another transaction created the row between our UPDATE and INSERT.
+            self.filter(**lookup).update(total=F('total') + cents, count=F('count') + count)
+
+    def remove(self, owner_id, date, key, amount, count=1):
+        # A month left without rows loses its row, so none is ever empty.
+        lookup = {'owner_id': owner_id, 'month': month_start(date), self.key_column(): key}
+        with transaction.atomic(savepoint=False):
+            self.add(owner_id, date, key, -amount, -count)
+            self.filter(count__lte=0, **lookup).delete()
+
+    def count_for(self, owner):
+        return self.filter(owner=owner).aggregate(count=Sum('count'))['count'] or 0
+
+    def rebuild(self, owner_id, source_queryset):
+        key = self.key_field()
+        rows = (source_queryset.filter(owner_id=owner_id)
+                .annotate(month=TruncMonth('date'))
+                .values('month', key)
+                .annotate(total=Sum('base_amount'), count=Count('id'))
+                .order_by())
+        with transaction.atomic():
+            self.filter(owner_id=owner_id).delete()
+            self.bulk_create([
+                self.model(owner_id=owner_id, month=row['month'], total=row['total'],
+                           count=row['count'], **{self.key_column(): row[key]})
+                for row in rows
+            ])
+
+
+class RollupSourceQuerySet(models.QuerySet):
+    """QuerySet of rows a MonthlyTotal adds up; the model names its rollup
+    in ``rollup_model``. Model.save() keeps the rollup in step row by row
+    and a pre_delete receiver covers deletes; update() bypasses both, so
+    it rebuilds the rollups of the owners it touches."""
+
+    def rollup_fields(self):
+        rollup_model = apps.get_model(self.model.rollup_model)
+        return {'owner', 'date', 'base_amount', rollup_model.key_field}
+
+    def update(self, **kwargs):
+        fields = {self.model._meta.get_field(name).name for name in kwargs}
+        if not fields & self.rollup_fields():
+            return super().update(**kwargs)
+        rollup_model = apps.get_model(self.model.rollup_model)
+        with transaction.atomic():
+            owner_ids = set(self.order_by().values_list('owner_id', flat=True).distinct())
+            updated = super().update(**kwargs)
+            new_owner = kwargs.get('owner', kwargs.get('owner_id'))
+            if new_owner is not None:
+                owner_ids.add(getattr(new_owner, 'pk', new_owner))
+            for owner_id in owner_ids:
+                rollup_model.objects.rebuild(owner_id, self.model.objects.all())
+                timeseries.invalidate(owner_id)
+        return updated
+
+
+def deleting_owner(origin):
+    """Whether a delete started from a user, whose rollup rows go with them."""
+    model = origin.model if isinstance(origin, models.QuerySet) else type(origin)
+    return model._meta.label == settings.AUTH_USER_MODEL
+
+
+class MonthlyTotal(models.Model):
+    month = models.DateField()
+    total = MoneyField(default=0)
+    count = models.IntegerField(default=0)
+
+    objects = MonthlyTotalManager()
+
+    class Meta:
+        abstract = True
+
+
+def totals_queries(source_queryset, rollup_model, owner, start, end):
+    # Querysets of (key, amount) rows that add up to the totals below.
+    key = rollup_model.key_field
+    first_full = next_month(start) if start.day != 1 else start
+    last_full = month_start(end) if end != next_month(end) - datetime.timedelta(days=1) else next_month(end)
+
+    queries = []
+    if first_full < last_full:
+        queries.append(rollup_model.objects
+                       .filter(owner=owner, month__gte=first_full, month__lt=last_full)
+                       .values_list(key).annotate(amount=Sum('total')).order_by())
+        edges = Q(date__gte=start, date__lt=first_full) | Q(date__gte=last_full, date__lte=end)
+    else:
+        edges = Q(date__gte=start, date__lte=end)
+    queries.append(source_queryset.filter(edges, owner=owner)
+                   .values_list(key).annotate(amount=Sum('base_amount')).order_by())
+    return queries
+
+
+def totals_by_key(source_queryset, rollup_model, owner, start, end):
+    """Sum ``base_amount`` per key (primary key of the category or source)
+    between ``start`` and ``end`` (inclusive).
+
+    Whole months inside the range come from the rollup table; the partial
+    months at either edge are aggregated from the source rows.
+    """
+    totals = {}
+    for rows in totals_queries(source_queryset, rollup_model, owner, start, end):
+        for key, amount in rows:
+            totals[key] = totals.get(key, 0) + amount
+    return totals
+
+
+async def atotals_by_key(source_queryset, rollup_model, owner, start, end):
+    totals = {}
+    for rows in totals_queries(source_queryset, rollup_model, owner, start, end):
+        async for key, amount in rows:
+            totals[key] = totals.get(key, 0) + amount
+    return totals
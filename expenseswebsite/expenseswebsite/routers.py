@@ -0,0 +1,91 @@
+"""Send reporting and search reads to read replicas.
+
+Views decorated with ``replica_reads`` read from a replica picked once per
+request from DATABASE_REPLICAS; everything else, and every write, uses the
+primary. Replicas lag a little behind, so a request stays on the primary
+once it has written or while it is inside a transaction, and
+ReplicaPinMiddleware keeps a client on it for REPLICA_PIN_SECONDS after its
+last write, so users always see their own changes.
+"""
+import random
+from contextvars import ContextVar
+from functools import wraps
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'primary_pin'
+
+
+class Routing:
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.replica = None
+        self.wrote = False
+
+
+# Set by ReplicaPinMiddleware for each request. The state object is shared,
+# so writes made by async views in worker threads are seen by the request.
+routing = ContextVar('routing', default=None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = routing.get()
+        if state is None or state.replica is None or state.pinned or state.wrote:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = routing.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def use_replica():
+    state = routing.get()
+    if state is not None and state.replica is None and settings.DATABASE_REPLICAS:
+        state.replica = random.choice(settings.DATABASE_REPLICAS)
+    return state
+
+
+def routed(state, content):
+    # Streaming content is consumed after the middleware has returned.
+    iterator = iter(content)
+    while True:
+        token = routing.set(state)
+        try:
+            chunk = next(iterator, None)
+        finally:
+            routing.reset(token)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def replica_reads(view):
+    """Let ``view`` read from a replica, for reads that can be a moment old."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            use_replica()
+            return await view(request, *args, **kwargs)
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            state = use_replica()
+            response = view(request, *args, **kwargs)
+            if state is not None and response.streaming:
+                response.streaming_content = routed(state, response.streaming_content)
+            return response
+    return wrapper
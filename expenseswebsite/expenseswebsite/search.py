@@ -0,0 +1,123 @@
+import datetime
+import re
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
+
+AMOUNT_RE = re.compile(r'^\d+(\.\d*)?$')
+DATE_RE = re.compile(r'^(\d{4})(?:-(\d{1,2})(?:-(\d{1,2}))?)?$')
+WORD_RE = re.compile(r'\w+')
+
+
+def amount_filter(search_str):
+    # Amounts that round down to the text at its own precision: '12' matches
+    # [12, 13), '12.5' matches [12.5, 12.6). A range the index can use, unlike
+    # a text prefix, so 120 and 1234 no longer match '12'.
+    if not AMOUNT_RE.match(search_str):
+        return None
+    try:
+        low = Decimal(search_str.rstrip('.'))
+    except InvalidOperation:
+        return None
+    decimals = len(search_str.partition('.')[2])
+    return Q(amount__gte=low, amount__lt=low + Decimal(1).scaleb(-decimals))
+
+
+def date_filter(search_str):
+    match = DATE_RE.match(search_str)
+    if not match:
+        return None
+    year, month, day = (int(part) if part else None for part in match.groups())
+    try:
+        if day:
+            start = datetime.date(year, month, day)
+            end = start + datetime.timedelta(days=1)
+        elif month:
+            start = datetime.date(year, month, 1)
+            end = datetime.date(year + month // 12, month % 12 + 1, 1)
+        else:
+            start = datetime.date(year, 1, 1)
+            end = datetime.date(year + 1, 1, 1)
+    except ValueError:
+        return None
+    return Q(date__gte=start, date__lt=end)
+
+
+def prefix_query(search_str):
+    words = WORD_RE.findall(search_str)
+    if not words:
+        return None
+    return SearchQuery(' & '.join(word + ':*' for word in words), search_type='raw', config='english')
+
+
+def key_matches(queryset, key, query):
+    # Queryset of the primary keys of categories/sources whose names match.
+    related = queryset.model._meta.get_field(key).related_model
+    return (related.objects.annotate(document=SearchVector('name', config='english'))
+            .filter(document=query).values_list('pk', flat=True))
+
+
+def text_query(search_str):
+    """The full-text query for ``search_str`` on PostgreSQL, else None."""
+    if connection.vendor == 'postgresql':
+        return prefix_query(search_str)
+    return None
+
+
+def results(queryset, key, search_str, query, keys, fields):
+    if connection.vendor == 'postgresql':
+        if query:
+            # Matching keys are looked up first. Usually there are none, and
+            # the plan stays a GIN index scan; a subquery in the OR would
+            # force a scan of all the owner's rows every time.
+            conditions = Q(search_vector=query)
+            if keys:
+                conditions |= Q(**{key + '__in': keys})
+        else:
+            conditions = Q(pk__in=[])
+    else:
+        conditions = Q(description__icontains=search_str) | Q(**{key + '__name__icontains': search_str})
+    for extra in (amount_filter(search_str), date_filter(search_str)):
+        if extra is not None:
+            conditions |= extra
+
+    matches = queryset.filter(conditions)
+    if query is not None:
+        matches = matches.annotate(
+            rank=Coalesce(SearchRank(F('search_vector'), query), Value(0.0))
+        ).order_by('-rank', '-date', '-id')
+    else:
+        matches = matches.order_by('-date', '-id')
+    columns = [key + '__name' if field == key else field for field in fields]
+    return matches.values_list(*columns)[:settings.SEARCH_RESULT_LIMIT]
+
+
+def search(queryset, key, search_str, fields):
+    """Search ``queryset`` by text in description/``key``, amount or date.
+
+    ``key`` is the category/source foreign key; it is matched, and returned
+    in ``fields``, by name. On PostgreSQL text matching uses the
+    ``search_vector`` GIN index on descriptions plus the keys whose names
+    match, and results are ranked; elsewhere it falls back to ``icontains``.
+    """
+    search_str = (search_str or '').strip()
+    if not search_str:
+        return []
+    query = text_query(search_str)
+    keys = list(key_matches(queryset, key, query)) if query else []
+    rows = results(queryset, key, search_str, query, keys, fields)
+    return [dict(zip(fields, row)) for row in rows]
+
+
+async def asearch(queryset, key, search_str, fields):
+    """search() for async views, through the async ORM."""
+    search_str = (search_str or '').strip()
+    if not search_str:
+        return []
+    query = text_query(search_str)
+    keys = [pk async for pk in key_matches(queryset, key, query)] if query else []
+    rows = results(queryset, key, search_str, query, keys, fields)
+    return [dict(zip(fields, row)) async for row in rows]
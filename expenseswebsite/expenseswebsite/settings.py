@@ -11,7 +11,9 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 from pathlib import Path
+import copy
 import os
+import tempfile
 from django.contrib import messages
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -39,26 +41,32 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'authentication',
     'expenses',
     'userpreferences',
     'userincome'
 ]
 
 MIDDLEWARE = [
+    'expenseswebsite.middleware.ServerTimingMiddleware',
+    'expenseswebsite.middleware.MetricsMiddleware',
+    'expenseswebsite.middleware.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'userpreferences.middleware.UserPreferenceMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'expenseswebsite.middleware.RepeatedQueryMiddleware',
 ]
 
 ROOT_URLCONF = 'expenseswebsite.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'expenseswebsite.timing.TimedDjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR,'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -67,6 +75,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'userpreferences.context_processors.currency',
             ],
         },
     },
@@ -86,12 +95,82 @@ DATABASES = {
         'PASSWORD': os.environ.get('DB_PASSWORD', '44495131'),
         'HOST': os.environ.get('DB_HOST', 'db'),
         'PORT': os.environ.get('DB_PORT', '5432'),
+        # One pool per process, shared by its threads: WSGI worker threads
+        # and, under ASGI, the per-request threads running async ORM calls.
+        # Connections go back to the pool when Django closes them at the
+        # end of a request. DB_POOL_MAX_SIZE should cover the threads or
+        # concurrent requests of a worker; beyond it requests wait up to
+        # DB_POOL_TIMEOUT seconds. With CONN_HEALTH_CHECKS every checkout is
+        # tested first and broken connections are replaced.
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'pool': {
+                'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+                'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+                'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            },
+        },
         'TEST': {
             'NAME': 'test_db',  
         }
     }
 }
 
+# Read replicas of the primary, for the summary, time series, search and
+# export reads (see expenseswebsite/routers.py). DB_REPLICA_HOSTS is a comma
+# separated list of hosts sharing the primary's name and credentials.
+# Without it a replica1 alias still points at the primary, unused, so the
+# routing can be tested against two aliases; setting DB_REPLICA_HOSTS to the
+# primary's host turns it on locally.
+REPLICA_HOSTS = [host for host in os.environ.get('DB_REPLICA_HOSTS', '').split(',') if host]
+for number, host in enumerate(REPLICA_HOSTS or [DATABASES['default']['HOST']], 1):
+    DATABASES[f'replica{number}'] = {**copy.deepcopy(DATABASES['default']), 'HOST': host,
+                                     'TEST': {'MIRROR': 'default'}}
+DATABASE_REPLICAS = [f'replica{number}' for number in range(1, len(REPLICA_HOSTS) + 1)]
+DATABASE_ROUTERS = ['expenseswebsite.routers.ReplicaRouter']
+
+# Seconds a client keeps reading from the primary after writing; longer
+# than the replication lag
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 10))
+
+
+# Cache
+# Set REDIS_URL in production so cache invalidations reach every worker process.
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
+# With a shared cache, sessions and the user of each request come from it;
+# session updates reach the database at most every
+# SESSION_WRITE_BEHIND_SECONDS. See authentication/sessions.py and
+# authentication/backends.py. A per-process cache would keep a user logged
+# in on the other workers after a logout or password change, so without
+# REDIS_URL both stay in the database.
+CACHED_AUTH = {
+    'SESSION_ENGINE': 'authentication.sessions',
+    'AUTHENTICATION_BACKENDS': ['authentication.backends.CachedModelBackend'],
+}
+if os.environ.get('REDIS_URL'):
+    SESSION_ENGINE = CACHED_AUTH['SESSION_ENGINE']
+    AUTHENTICATION_BACKENDS = CACHED_AUTH['AUTHENTICATION_BACKENDS']
+SESSION_WRITE_BEHIND_SECONDS = float(os.environ.get('SESSION_WRITE_BEHIND_SECONDS', 30))
+
+# Seconds between rebuilds of each process's filter of taken usernames and
+# emails, which answers most registration form checks without a query
+TAKEN_NAMES_REBUILD_INTERVAL = float(os.environ.get('TAKEN_NAMES_REBUILD_INTERVAL', 60 * 60))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -130,6 +209,15 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'expenseswebsite/static')]
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
+# collectstatic writes hashed, precompressed copies for the web server to
+# serve; see expenseswebsite/storage.py and nginx/nginx.conf.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'expenseswebsite.storage.CompressedManifestStaticFilesStorage'},
+}
+# Link static files under their plain names when collectstatic has not
+# written a manifest, instead of failing; for development and tests only.
+STATIC_MANIFEST_OPTIONAL = DEBUG
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
@@ -146,4 +234,39 @@ EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER')
 EMAIL_USE_TLS = True
 DEFAULT_FROM_EMAIL = os.environ.get('EMAIL_HOST_USER')
 EMAIL_PORT = 587
-EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
\ No newline at end of file
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
+
+# Maximum number of rows returned by the keystroke search endpoints
+SEARCH_RESULT_LIMIT = int(os.environ.get('SEARCH_RESULT_LIMIT', 50))
+
+# Keystroke searches per user: a burst of SEARCH_BURST, refilled at SEARCH_RATE
+# per second (0 turns throttling off), and the most seconds a search waits
+# for the user's previous one; see expenseswebsite/throttle.py
+SEARCH_RATE = float(os.environ.get('SEARCH_RATE', 5))
+SEARCH_BURST = int(os.environ.get('SEARCH_BURST', 10))
+SEARCH_COALESCE_SECONDS = float(os.environ.get('SEARCH_COALESCE_SECONDS', 1))
+
+# Rows per page on the expense and income lists (overridable with ?page_size=)
+LIST_PAGE_SIZE = int(os.environ.get('LIST_PAGE_SIZE', 2))
+LIST_MAX_PAGE_SIZE = 100
+
+# Seconds between checks of the shared version stamp of cached reference data
+REFDATA_CHECK_INTERVAL = float(os.environ.get('REFDATA_CHECK_INTERVAL', 5))
+
+# Currency that amounts are converted to for totals, rollups and charts;
+# exchange rates are stored as units of a currency per one BASE_CURRENCY
+BASE_CURRENCY = os.environ.get('BASE_CURRENCY', 'USD')
+
+# With DEBUG on, log any query shape repeated this many times in one request
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 3))
+
+# Share of requests (0 to 1) timed into a Server-Timing header and log line
+SERVER_TIMING_SAMPLE_RATE = float(os.environ.get('SERVER_TIMING_SAMPLE_RATE', 1))
+
+# Worker processes write their metrics here for /metrics to add up; empty it
+# whenever the deployment starts, before the workers do
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'expenseswebsite-metrics'))
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+# Addresses that may scrape /metrics. They are checked against REMOTE_ADDR,
+# so scrape the web container directly; nginx refuses /metrics.
+METRICS_ALLOWED_IPS = os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
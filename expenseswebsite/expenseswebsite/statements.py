@@ -0,0 +1,217 @@
+import csv
+import hashlib
+import io
+import itertools
+import re
+from collections import defaultdict
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from expenseswebsite import timeseries
+from expenseswebsite.money import quantize
+from expenseswebsite.validation import validate_currency, validate_entry
+from userpreferences.rates import RateTable
+
+CHUNK_SIZE = 5000
+# Category or source of rows that name none, created by migrations.
+DEFAULT_KEY = 'Uncategorized'
+MAX_REPORTED_ERRORS = 20
+OFX_TAG_RE = re.compile(r'<(/?)([A-Z0-9.]+)>([^<\r\n]*)', re.IGNORECASE)
+
+
+def detect_format(filename):
+    return 'ofx' if filename.lower().endswith(('.ofx', '.qfx')) else 'csv'
+
+
+def text_stream(binary_file):
+    return io.TextIOWrapper(binary_file, encoding='utf-8-sig', errors='replace', newline='')
+
+
+def parse_csv(lines, key):
+    """Yield rows from a CSV with date, description, amount and optional
+    ``key`` (category/source) and currency columns. Header names are
+    case-insensitive."""
+    reader = csv.reader(lines)
+    header = [name.strip().lower() for name in next(reader, [])]
+    for line, values in enumerate(reader, start=2):
+        row = dict(zip(header, values))
+        amount = row.get('amount', '').strip()
+        yield {
+            'line': line,
+            'date': row.get('date', '').strip(),
+            'description': row.get('description', '').strip(),
+            'amount': amount.lstrip('-'),
+            'key': row.get(key, '').strip(),
+            # Unsigned amounts are taken as they are; a leading minus marks a debit.
+            'direction': 'debit' if amount.startswith('-') else None,
+            'reference': row.get('reference', '').strip(),
+            'currency': row.get('currency', '').strip(),
+        }
+
+
+def parse_ofx(lines):
+    """Yield the <STMTTRN> transactions of an OFX/QFX statement.
+
+    Works line by line on both the SGML (OFX 1.x) and XML (OFX 2.x)
+    flavours, so only one transaction is held in memory at a time.
+    """
+    current = None
+    currency = ''
+    line = 0
+    for text in lines:
+        line += 1
+        for closing, tag, value in OFX_TAG_RE.findall(text):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if closing and current is not None:
+                    yield ofx_row(current)
+                    current = None
+                elif not closing:
+                    current = {'line': line, 'CURDEF': currency}
+            elif tag == 'CURDEF' and current is None:
+                # The statement currency comes before its transactions.
+                currency = value.strip()
+            elif current is not None and not closing:
+                current[tag] = value.strip()
+
+
+def ofx_row(values):
+    amount = values.get('TRNAMT', '')
+    posted = values.get('DTPOSTED', '')[:8]
+    return {
+        'line': values['line'],
+        'date': f'{posted[:4]}-{posted[4:6]}-{posted[6:8]}' if len(posted) == 8 else '',
+        'description': values.get('NAME') or values.get('MEMO', ''),
+        'amount': amount.lstrip('-+'),
+        'key': '',
+        'direction': 'debit' if amount.startswith('-') else 'credit',
+        'reference': values.get('FITID', ''),
+        'currency': values['CURDEF'],
+    }
+
+
+def row_hash(owner_id, row, occurrence):
+    # The occurrence number tells apart identical transactions on the same
+    # day, and is stable when the same statement is imported again.
+    raw = '|'.join([str(owner_id), str(row['date']), str(quantize(row['amount'])), row['description'],
+                    row['reference'], str(occurrence)])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.duplicates = 0
+        self.skipped = 0
+        self.errors = []
+
+    def error(self, line, message):
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f'line {line}: {message}')
+        self.skipped += 1
+
+    def as_dict(self):
+        return {'created': self.created, 'duplicates': self.duplicates,
+                'skipped': self.skipped, 'errors': self.errors}
+
+
+def clean_rows(model, owner, rows, direction, default_key, default_currency, result):
+    """Validate and hash the statement rows, one at a time.
+
+    Numbering identical rows takes a count per distinct row for the whole
+    statement, as statements need not be sorted by date; that is the one
+    part that grows with the statement, by a 16 byte digest per distinct
+    row rather than the row itself.
+    """
+    amount_field = model._meta.get_field('amount')
+    date_field = model._meta.get_field('date')
+    occurrences = defaultdict(int)
+    for row in rows:
+        if row['direction'] and row['direction'] != direction:
+            continue
+        row['currency'] = (row['currency'] or default_currency).upper()
+        error = (validate_entry(row['amount'], row['description'], row['date'])
+                 or validate_currency(row['currency']))
+        if error:
+            result.error(row['line'], error)
+            continue
+        try:
+            row['amount'] = amount_field.to_python(row['amount'])
+            row['date'] = date_field.to_python(row['date'])
+        except ValidationError as invalid:
+            result.error(row['line'], ' '.join(invalid.messages))
+            continue
+        identity = hashlib.blake2b('|'.join([str(row['date']), str(row['amount']), row['description'],
+                                             row['reference']]).encode(), digest_size=16).digest()
+        occurrences[identity] += 1
+        row['hash'] = row_hash(owner.pk, row, occurrences[identity])
+        row['key'] = row['key'] or default_key
+        yield row
+
+
+def resolve_keys(key_model, names):
+    """Map ``names`` to primary keys of ``key_model`` (Category or Source).
+    Names that do not exist are left out: importing never adds to the
+    lists shared by every user."""
+    return dict(key_model.objects.filter(name__in=names).values_list('name', 'pk'))
+
+
+def import_rows(model, rollup_model, owner, rows, direction, default_key, default_currency,
+                chunk_size=CHUNK_SIZE):
+    """Insert parsed statement rows in chunks of ``chunk_size``.
+
+    Each chunk is one transaction: rows whose hash was already imported are
+    dropped, the rest are converted to the base currency with the rates
+    loaded once for the chunk, go in with a single bulk_create and the
+    monthly rollup is updated once per (month, key) touched by the chunk.
+    """
+    key_field = model._meta.get_field(rollup_model.key_field)
+    result = ImportResult()
+    cleaned = clean_rows(model, owner, rows, direction, default_key, default_currency, result)
+    while True:
+        chunk = list(itertools.islice(cleaned, chunk_size))
+        if not chunk:
+            break
+        with transaction.atomic():
+            hashes = [row['hash'] for row in chunk]
+            existing = set(model.objects.filter(owner=owner, import_hash__in=hashes)
+                           .values_list('import_hash', flat=True))
+            dates = [row['date'] for row in chunk]
+            rates = RateTable.load({row['currency'] for row in chunk}, min(dates), max(dates))
+            keys = resolve_keys(key_field.related_model, {row['key'] for row in chunk})
+            seen = set()
+            objects = []
+            deltas = defaultdict(lambda: [0, 0])
+            for row in chunk:
+                if row['key'] not in keys:
+                    result.error(row['line'], f'Unknown {key_field.verbose_name} "{row["key"]}"')
+                    continue
+                if row['hash'] in existing or row['hash'] in seen:
+                    result.duplicates += 1
+                    continue
+                seen.add(row['hash'])
+                base_amount = rates.to_base(row['amount'], row['currency'], row['date'])
+                objects.append(model(owner=owner, amount=row['amount'], date=row['date'],
+                                     currency=row['currency'], base_amount=base_amount,
+                                     description=row['description'], import_hash=row['hash'],
+                                     **{key_field.attname: keys[row['key']]}))
+                delta = deltas[(row['date'].replace(day=1), keys[row['key']])]
+                delta[0] += base_amount
+                delta[1] += 1
+            model.objects.bulk_create(objects, batch_size=1000)
+            for (month, value), (amount, count) in deltas.items():
+                rollup_model.objects.add(owner.pk, month, value, amount, count)
+            if objects:
+                timeseries.invalidate(owner.pk)
+        result.created += len(objects)
+    return result
+
+
+def import_statement(model, rollup_model, owner, binary_file, statement_format, direction,
+                     default_key, default_currency, chunk_size=CHUNK_SIZE):
+    lines = text_stream(binary_file)
+    if statement_format == 'ofx':
+        rows = parse_ofx(lines)
+    else:
+        rows = parse_csv(lines, rollup_model.key_field)
+    return import_rows(model, rollup_model, owner, rows, direction, default_key, default_currency,
+                       chunk_size)
@@ -6,38 +6,62 @@ tableOutput.style.display = "none";
 const tbody = document.querySelector(".table-body");
 const noResults = document.querySelector(".no-results");
 
+// Only the latest search counts: starting one aborts the previous request.
+let controller = null;
+let retry = null;
+
+const search = (searchValue) => {
+    if (controller) controller.abort();
+    clearTimeout(retry);
+    controller = new AbortController();
+    fetch('/search-expenses', {
+        body: JSON.stringify({ searchText: searchValue }),
+        method: "POST",
+        signal: controller.signal,
+    })
+    .then((res) => {
+        if (res.status === 429){
+            // Throttled: the body holds the latest results; search again when allowed.
+            const seconds = Number(res.headers.get("Retry-After")) || 1;
+            retry = setTimeout(() => search(searchValue), seconds * 1000);
+        }
+        return res.json();
+    })
+    .then((data) => {
+        tbody.innerHTML = "";
+        appTable.style.display = "none";
+        tableOutput.style.display = "block";
+        if(data.length === 0){
+            noResults.style.display = "block";
+            tableOutput.style.display = "none";
+        }else{
+            noResults.style.display = "none";
+            data.forEach((item) => {
+                tbody.innerHTML += `
+                    <tr>
+                    <td>${item.amount}</td>
+                    <td>${item.category}</td>
+                    <td>${item.description}</td>
+                    <td>${item.date}</td>
+                    </tr>`;
+            });
+        }
+    })
+    .catch((error) => {
+        if (error.name !== "AbortError") throw error;
+    });
+};
+
 searchField.addEventListener('keyup', (e)=>{
     const searchValue = e.target.value;
     if (searchValue.trim().length > 0){
         paginationContainer.style.display = "none";
-        tbody.innerHTML = "";
-        fetch('/search-expenses', {
-            body: JSON.stringify({ searchText: searchValue }),
-            method: "POST",
-        })
-        .then((res) => res.json())
-        .then((data) => {
-            appTable.style.display = "none";
-            tableOutput.style.display = "block";
-            if(data.length === 0){
-                noResults.style.display = "block";
-                tableOutput.style.display = "none";
-            }else{
-                noResults.style.display = "none";
-                data.forEach((item) => {
-                    tbody.innerHTML += `
-                        <tr>
-                        <td>${item.amount}</td>
-                        <td>${item.category}</td>
-                        <td>${item.description}</td>
-                        <td>${item.date}</td>
-                        </tr>`;
-                });
-            }   
-        });
+        search(searchValue);
     }else{
+        if (controller) controller.abort();
+        clearTimeout(retry);
         tableOutput.style.display = "none";
         appTable.style.display = "block";
         paginationContainer.style.display = "block";
     }
-});    
\ No newline at end of file
+});
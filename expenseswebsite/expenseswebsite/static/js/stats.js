@@ -37,20 +37,93 @@ const renderChart = (data, labels) => {
     });
 };
 
+let cashflowChart = null;
+
+const renderCashflowChart = (results) => {
+    var ctx = document.getElementById("cashflowChart").getContext("2d");
+    if (cashflowChart) {
+        cashflowChart.destroy();
+    }
+    cashflowChart = new Chart(ctx, {
+        type: "bar",
+        data: {
+            labels: results.months,
+            datasets: [
+                { label: "Income", data: results.income },
+                { label: "Expenses", data: results.expenses },
+                { label: "Net", data: results.net, type: "line" },
+            ],
+        },
+        options: {
+            title: {
+                display: true,
+                text: "Monthly cashflow (" + results.currency + ")",
+            },
+        },
+    });
+};
+
 const getChartData = () => {
-    console.log("fetching");
-    fetch("/expense_category_summary")
+    fetch("/dashboard")
+        .then((res) => res.json())
+        .then((results) => {
+            renderChart(results.categories.totals, results.categories.labels);
+            renderCashflowChart(results);
+        });
+};
+
+let historyChart = null;
+
+const renderHistoryChart = (results) => {
+    var ctx = document.getElementById("historyChart").getContext("2d");
+    const datasets = Object.entries(results.series).map(([label, data]) => ({
+        label: label,
+        data: data,
+    }));
+    if (historyChart) {
+        historyChart.destroy();
+    }
+    historyChart = new Chart(ctx, {
+        type: "bar",
+        data: {
+            labels: results.periods,
+            datasets: datasets,
+        },
+        options: {
+            title: {
+                display: true,
+                text: "Expenses per " + results.granularity,
+            },
+            scales: {
+                xAxes: [{ stacked: true }],
+                yAxes: [{ stacked: true }],
+            },
+        },
+    });
+};
+
+const getHistoryData = (params) => {
+    fetch("/expense_timeseries?" + new URLSearchParams(params))
         .then((res) => res.json())
         .then((results) => {
-            console.log("results", results);
-            const category_data = results.expense_category_data;
-            const [labels, data] = [
-                Object.keys(category_data),
-                Object.values(category_data),
-            ];
-
-            renderChart(data, labels);
+            if (results.error) {
+                console.log("error", results.error);
+                return;
+            }
+            renderHistoryChart(results);
         });
 };
 
-document.onload = getChartData();
\ No newline at end of file
+document.querySelector("#historyForm").addEventListener("submit", (e) => {
+    e.preventDefault();
+    const params = {};
+    new FormData(e.target).forEach((value, key) => {
+        if (value) {
+            params[key] = value;
+        }
+    });
+    getHistoryData(params);
+});
+
+document.onload = getChartData();
+getHistoryData({});
\ No newline at end of file
@@ -0,0 +1,50 @@
+"""Static files storage for production.
+
+collectstatic copies every asset under a content-hashed name recorded in
+the manifest, so templates can link to URLs that never change, and writes
+gzip and brotli copies of the text assets next to them. The web server
+(see nginx/nginx.conf) then serves the hashed names with far-future cache
+headers and picks the precompressed copy the browser accepts; Django is not
+involved in serving them.
+"""
+import gzip
+import brotli
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ico')
+COMPRESSORS = (
+    ('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0)),
+    ('.br', lambda data: brotli.compress(data, quality=11)),
+)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        # Only the final names: CSS can go through several hashing passes.
+        for name in set(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE):
+                self.compress(name)
+
+    def compress(self, name):
+        with self.open(name) as original:
+            data = original.read()
+        for suffix, compressor in COMPRESSORS:
+            compressed = compressor(data)
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            # Tiny files can come out larger; the server then sends the original.
+            if len(compressed) < len(data):
+                self._save(name + suffix, ContentFile(compressed))
+
+    def stored_name(self, name):
+        # Without a manifest collectstatic has not run, as in development
+        # and tests, and the finders serve the files under their own names.
+        # Anywhere else that is a broken deployment, so it raises as usual.
+        if not self.hashed_files and settings.STATIC_MANIFEST_OPTIONAL:
+            return name
+        return super().stored_name(name)
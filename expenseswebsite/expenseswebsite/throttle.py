@@ -0,0 +1,78 @@
+"""Throttling and coalescing of the keystroke search endpoints.
+
+The search boxes post on every keyup. Each request takes a ticket from a
+per-user counter in the cache, and only one search per user runs at a
+time: a request arriving while another runs waits for it, and gives up as
+soon as a newer ticket shows up, so a burst of keystrokes runs the first
+search and the last. Searches that do run take a token from a per-user
+bucket holding SEARCH_BURST tokens, refilled at SEARCH_RATE per second.
+
+Superseded and throttled requests are answered with the user's latest
+results, the latter with status 429 and a Retry-After header so the page
+can search again once a token is available.
+"""
+import asyncio
+import math
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+from expenseswebsite import metrics
+
+POLL_SECONDS = 0.02
+# Longest a search may hold the running mark, should its process die.
+RUNNING_TIMEOUT = 30
+LATEST_TIMEOUT = 5 * 60
+
+
+def keys(scope, user_id):
+    return {part: f'search-{part}:{scope}:{user_id}' for part in ('ticket', 'running', 'bucket', 'latest')}
+
+
+async def take_token(key, now):
+    """Take a token from the bucket at ``key``, returning 0, or the seconds
+    until one is available. Concurrent requests may both take the last
+    token; the rate is a bound for a user's traffic, not an exact quota."""
+    if settings.SEARCH_RATE <= 0:
+        return 0
+    tokens, updated = await cache.aget(key, (settings.SEARCH_BURST, now))
+    tokens = min(settings.SEARCH_BURST, tokens + (now - updated) * settings.SEARCH_RATE)
+    wait = 0 if tokens >= 1 else (1 - tokens) / settings.SEARCH_RATE
+    if not wait:
+        tokens -= 1
+    await cache.aset(key, (tokens, now), math.ceil(settings.SEARCH_BURST / settings.SEARCH_RATE) + 1)
+    return wait
+
+
+async def latest(key, scope, outcome, status=200):
+    metrics.inc('search_requests_total', {'scope': scope, 'outcome': outcome})
+    return JsonResponse(await cache.aget(key, []), status=status, safe=False)
+
+
+async def search_response(scope, user, search):
+    """JsonResponse with the results of ``await search()`` for ``user``,
+    unless a newer search of theirs supersedes it or they are throttled."""
+    key = keys(scope, user.pk)
+    await cache.aadd(key['ticket'], 0, LATEST_TIMEOUT)
+    ticket = await sync_to_async(cache.incr)(key['ticket'])
+    deadline = time.monotonic() + settings.SEARCH_COALESCE_SECONDS
+    running = await cache.aadd(key['running'], ticket, RUNNING_TIMEOUT)
+    while not running and time.monotonic() < deadline:
+        await asyncio.sleep(POLL_SECONDS)
+        if await cache.aget(key['ticket']) != ticket:
+            return await latest(key['latest'], scope, 'superseded')
+        running = await cache.aadd(key['running'], ticket, RUNNING_TIMEOUT)
+    try:
+        wait = await take_token(key['bucket'], time.time())
+        if wait:
+            response = await latest(key['latest'], scope, 'throttled', status=429)
+            response['Retry-After'] = str(math.ceil(wait))
+            return response
+        data = await search()
+        await cache.aset(key['latest'], data, LATEST_TIMEOUT)
+        metrics.inc('search_requests_total', {'scope': scope, 'outcome': 'searched'})
+        return JsonResponse(data, safe=False)
+    finally:
+        if running:
+            await cache.adelete(key['running'])
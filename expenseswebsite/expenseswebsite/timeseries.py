@@ -0,0 +1,128 @@
+import datetime
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import Trunc
+from expenseswebsite import metrics
+
+GRANULARITIES = ('day', 'week', 'month', 'year')
+MAX_PERIODS = 5000
+CACHE_TIMEOUT = 60 * 60
+
+
+def period_start(date, granularity):
+    if granularity == 'week':
+        return date - datetime.timedelta(days=date.weekday())
+    if granularity == 'month':
+        return date.replace(day=1)
+    if granularity == 'year':
+        return date.replace(month=1, day=1)
+    return date
+
+
+def next_period(date, granularity):
+    if granularity == 'day':
+        return date + datetime.timedelta(days=1)
+    if granularity == 'week':
+        return date + datetime.timedelta(days=7)
+    if granularity == 'month':
+        return (date.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    return date.replace(year=date.year + 1)
+
+
+def periods(start, end, granularity):
+    current = period_start(start, granularity)
+    result = []
+    while current <= end:
+        result.append(current)
+        try:
+            current = next_period(current, granularity)
+        except (OverflowError, ValueError):
+            # The last period of datetime.date's range.
+            break
+    return result
+
+
+def period_count(start, end, granularity):
+    # Counted without building the periods, so a huge range is turned
+    # down before any work.
+    first = period_start(start, granularity)
+    if granularity == 'day':
+        return (end - first).days + 1
+    if granularity == 'week':
+        return (end - first).days // 7 + 1
+    if granularity == 'month':
+        return (end.year - first.year) * 12 + end.month - first.month + 1
+    return end.year - first.year + 1
+
+
+def parse_range(params, default_days=180):
+    """Read ``start``, ``end`` and ``granularity`` from a QueryDict.
+
+    Raises ValueError with a message suitable for the client.
+    """
+    today = datetime.date.today()
+    try:
+        end = datetime.date.fromisoformat(params['end']) if params.get('end') else today
+        start = datetime.date.fromisoformat(params['start']) if params.get('start') else None
+    except ValueError:
+        raise ValueError('start and end must be dates in YYYY-MM-DD format')
+    if start is None:
+        try:
+            start = end - datetime.timedelta(days=default_days)
+        except OverflowError:
+            raise ValueError(f'end is within {default_days} days of the earliest date, give a start')
+    granularity = params.get('granularity', 'month')
+    if granularity not in GRANULARITIES:
+        raise ValueError('granularity must be one of ' + ', '.join(GRANULARITIES))
+    if start > end:
+        raise ValueError('start must be before end')
+    if period_count(start, end, granularity) > MAX_PERIODS:
+        raise ValueError('range is too long for this granularity')
+    return start, end, granularity
+
+
+def version_key(owner_id):
+    return f'reports-version:{owner_id}'
+
+
+def invalidate(owner_id):
+    # Bump the owner's version once the write is visible to other readers.
+    def bump():
+        try:
+            cache.incr(version_key(owner_id))
+        except ValueError:
+            cache.set(version_key(owner_id), 1, None)
+    transaction.on_commit(bump)
+
+
+def timeseries(queryset, key, owner, start, end, granularity):
+    rows = (queryset.filter(owner=owner, date__gte=start, date__lte=end)
+            .annotate(period=Trunc('date', granularity))
+            .values('period', key)
+            .annotate(total=Sum('base_amount'))
+            .order_by())
+    labels = periods(start, end, granularity)
+    index = {period: i for i, period in enumerate(labels)}
+    series = {}
+    for row in rows:
+        values = series.setdefault(row[key], [0] * len(labels))
+        values[index[row['period']]] += row['total']
+    return {
+        'granularity': granularity,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'periods': [label.isoformat() for label in labels],
+        'series': series,
+    }
+
+
+def cached_timeseries(name, queryset, key, owner, start, end, granularity):
+    version = cache.get_or_set(version_key(owner.pk), 1, None)
+    cache_key = f'timeseries:{name}:{owner.pk}:{version}:{start}:{end}:{granularity}'
+    data = cache.get(cache_key)
+    metrics.cache_lookup('timeseries', data is not None)
+    if data is None:
+        data = timeseries(queryset, key, owner, start, end, granularity)
+        cache.set(cache_key, data, CACHE_TIMEOUT)
+    return data
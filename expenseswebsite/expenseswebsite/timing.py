@@ -0,0 +1,89 @@
+"""Per-request timing of SQL, template rendering and the rest of the view.
+
+ServerTimingMiddleware puts a Timing in ``current`` for the request; the
+database execute wrappers and the template backend below report into it.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.template.backends.django import DjangoTemplates
+
+current = ContextVar('request_timing', default=None)
+
+
+class Timing:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql = 0.0
+        self.queries = 0
+        self.template = 0.0
+        # SQL run by lazy querysets while a template renders, which is
+        # reported under db rather than tpl.
+        self.template_sql = 0.0
+        self.depth = 0
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.sql += elapsed
+            self.queries += 1
+            if self.depth:
+                self.template_sql += elapsed
+
+    @contextmanager
+    def rendering(self):
+        started = time.perf_counter()
+        self.depth += 1
+        try:
+            yield
+        finally:
+            self.depth -= 1
+            if not self.depth:
+                self.template += time.perf_counter() - started
+
+    def metrics(self):
+        """Milliseconds spent in the database, templates, the remaining
+        Python and overall, plus the number of queries."""
+        total = time.perf_counter() - self.started
+        template = max(self.template - self.template_sql, 0)
+        app = max(total - self.sql - template, 0)
+        return {
+            'db': self.sql * 1000,
+            'tpl': template * 1000,
+            'app': app * 1000,
+            'total': total * 1000,
+            'queries': self.queries,
+        }
+
+
+def server_timing_header(metrics):
+    return (f'db;dur={metrics["db"]:.1f};desc="{metrics["queries"]} queries", '
+            f'tpl;dur={metrics["tpl"]:.1f}, app;dur={metrics["app"]:.1f}, total;dur={metrics["total"]:.1f}')
+
+
+class TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        timing = current.get()
+        if timing is None:
+            return self.template.render(context, request)
+        with timing.rendering():
+            return self.template.render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing each top-level render."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
@@ -16,6 +16,8 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from expenseswebsite.dashboard import dashboard_view
+from expenseswebsite.metrics import metrics_view
 
 urlpatterns = [
     path('', include('expenses.urls')),
@@ -23,4 +25,12 @@ urlpatterns = [
     path('preferences/', include('userpreferences.urls')),
     path('income/', include('userincome.urls')),
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
+    path('dashboard', dashboard_view, name='dashboard'),
 ]
+
+QUERY_BUDGETS = {
+    'metrics': 0,
+    # The two monthly rollup reads, with refdata warm; nothing when cached.
+    'dashboard': 2,
+}
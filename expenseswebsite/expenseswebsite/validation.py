@@ -0,0 +1,32 @@
+import re
+from django.core.exceptions import ValidationError
+from expenseswebsite.money import MoneyField
+
+CURRENCY_RE = re.compile(r'^[A-Z]{3}$')
+
+
+def validate_entry(amount, description, date):
+    # Shared by the expense/income forms and the statement importer.
+    if not amount:
+        return 'Amount is required'
+    try:
+        MoneyField().to_python(amount)
+    except ValidationError as invalid:
+        return ' '.join(invalid.messages)
+    if not description:
+        return 'Description is required'
+    if not date:
+        return 'Date is required'
+    return None
+
+
+def validate_currency(currency):
+    if not CURRENCY_RE.match(currency or ''):
+        return 'Currency must be a three letter code'
+    return None
+
+
+def validate_choice(choice, label):
+    if choice is None:
+        return f'Choose a {label} from the list'
+    return None
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class UserincomeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'userincome'
+
+    def ready(self):
+        from expenseswebsite import refdata
+        from . import signals
+        refdata.register('sources', signals.load_sources)
+        refdata.warm_on_first_request(['sources'])
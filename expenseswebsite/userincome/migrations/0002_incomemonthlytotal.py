@@ -0,0 +1,43 @@
+# Generated by Django 5.1.3 on 2026-10-18 02:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def populate_monthly_totals(apps, schema_editor):
+    UserIncome = apps.get_model('userincome', 'UserIncome')
+    IncomeMonthlyTotal = apps.get_model('userincome', 'IncomeMonthlyTotal')
+    rows = (UserIncome.objects.annotate(month=TruncMonth('date'))
+            .values('owner_id', 'month', 'source')
+            .annotate(total=Sum('amount'), count=Count('id'))
+            .order_by())
+    IncomeMonthlyTotal.objects.bulk_create((IncomeMonthlyTotal(**row) for row in rows.iterator()), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userincome', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IncomeMonthlyTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('total', models.FloatField(default=0)),
+                ('count', models.IntegerField(default=0)),
+                ('source', models.CharField(max_length=266)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('owner', 'month', 'source'), name='unique_income_monthly_total')],
+            },
+        ),
+        migrations.RunPython(populate_monthly_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.3 on 2026-10-18 02:44
+
+import django.contrib.postgres.search
+from django.db import migrations
+from expenseswebsite.operations import RunPostgresSQL
+
+SEARCH_VECTOR = """
+    setweight(to_tsvector('pg_catalog.english', coalesce(%(row)sdescription, '')), 'A') ||
+    setweight(to_tsvector('pg_catalog.english', coalesce(%(row)ssource, '')), 'B')
+"""
+
+CREATE_TRIGGER = [
+"""
+CREATE FUNCTION userincome_userincome_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := %s;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+""" % (SEARCH_VECTOR % {'row': 'NEW.'}),
+"""
+CREATE TRIGGER userincome_userincome_search_vector_trigger
+BEFORE INSERT OR UPDATE OF description, source ON userincome_userincome
+FOR EACH ROW EXECUTE FUNCTION userincome_userincome_search_vector_update()
+""",
+"""
+UPDATE userincome_userincome SET search_vector = %s
+""" % (SEARCH_VECTOR % {'row': ''}),
+"""
+CREATE INDEX userincome_userincome_search_vector_gin ON userincome_userincome USING gin (search_vector)
+""",
+]
+
+DROP_TRIGGER = [
+"DROP INDEX IF EXISTS userincome_userincome_search_vector_gin",
+"DROP TRIGGER IF EXISTS userincome_userincome_search_vector_trigger ON userincome_userincome",
+"DROP FUNCTION IF EXISTS userincome_userincome_search_vector_update()",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userincome', '0002_incomemonthlytotal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userincome',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        RunPostgresSQL(CREATE_TRIGGER, DROP_TRIGGER),
+    ]
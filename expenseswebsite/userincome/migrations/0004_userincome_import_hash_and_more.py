@@ -0,0 +1,24 @@
+# Generated by Django 5.1.3 on 2026-10-18 02:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userincome', '0003_userincome_search_vector'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userincome',
+            name='import_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='userincome',
+            constraint=models.UniqueConstraint(fields=('owner', 'import_hash'), name='unique_income_import_hash'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.3 on 2026-10-18 03:00
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_amounts(apps, schema_editor):
+    # Existing rows were all entered in the base currency.
+    UserIncome = apps.get_model('userincome', 'UserIncome')
+    UserIncome.objects.update(base_amount=F('amount'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userincome', '0004_userincome_import_hash_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userincome',
+            name='base_amount',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userincome',
+            name='currency',
+            field=models.CharField(default='USD', max_length=3),
+        ),
+        migrations.RunPython(copy_amounts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.3 on 2026-10-18 04:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userincome', '0005_userincome_base_amount_userincome_currency'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userincome',
+            name='amount_cents',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='userincome',
+            name='base_amount_cents',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='incomemonthlytotal',
+            name='total_cents',
+            field=models.BigIntegerField(null=True),
+        ),
+    ]
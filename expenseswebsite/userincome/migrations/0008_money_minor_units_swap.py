@@ -0,0 +1,65 @@
+# Generated by Django 5.1.3 on 2026-10-18 04:10
+
+import expenseswebsite.money
+from django.db import migrations, models
+from expenseswebsite.money import backfill_minor_units
+
+
+def backfill_remaining(apps, schema_editor):
+    # Rows written since the batched backfill ran.
+    backfill_minor_units(apps.get_model('userincome', 'UserIncome'),
+                         {'amount': 'amount_cents', 'base_amount': 'base_amount_cents'})
+    backfill_minor_units(apps.get_model('userincome', 'IncomeMonthlyTotal'), {'total': 'total_cents'})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userincome', '0007_money_minor_units_backfill'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_remaining, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='userincome',
+            name='amount',
+        ),
+        migrations.RemoveField(
+            model_name='userincome',
+            name='base_amount',
+        ),
+        migrations.RemoveField(
+            model_name='incomemonthlytotal',
+            name='total',
+        ),
+        migrations.RenameField(
+            model_name='userincome',
+            old_name='amount_cents',
+            new_name='amount',
+        ),
+        migrations.RenameField(
+            model_name='userincome',
+            old_name='base_amount_cents',
+            new_name='base_amount',
+        ),
+        migrations.RenameField(
+            model_name='incomemonthlytotal',
+            old_name='total_cents',
+            new_name='total',
+        ),
+        migrations.AlterField(
+            model_name='userincome',
+            name='amount',
+            field=expenseswebsite.money.MoneyField(),
+        ),
+        migrations.AlterField(
+            model_name='userincome',
+            name='base_amount',
+            field=expenseswebsite.money.MoneyField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='incomemonthlytotal',
+            name='total',
+            field=expenseswebsite.money.MoneyField(default=0),
+        ),
+    ]
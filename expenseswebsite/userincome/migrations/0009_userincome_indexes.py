@@ -0,0 +1,37 @@
+# Generated by Django 5.1.3 on 2026-10-18 03:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from expenseswebsite.operations import RunPostgresSQL
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userincome', '0008_money_minor_units_swap'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userincome',
+            index=models.Index(fields=['owner', '-date', 'id'], name='income_owner_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userincome',
+            index=models.Index(fields=['owner', 'source', 'date'], name='income_owner_source_date_idx'),
+        ),
+        # The plain owner index is a prefix of the composite one above.
+        migrations.AlterField(
+            model_name='userincome',
+            name='owner',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        # Rows arrive roughly in date order, so a BRIN index on date stays
+        # a few pages in size while still narrowing date range scans.
+        RunPostgresSQL(
+            'CREATE INDEX userincome_userincome_date_brin ON userincome_userincome USING brin (date)',
+            'DROP INDEX IF EXISTS userincome_userincome_date_brin',
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+from expenseswebsite.operations import deduplicate_names
+
+
+def deduplicate_sources(apps, schema_editor):
+    deduplicate_names(apps.get_model('userincome', 'Source'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userincome', '0009_userincome_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate_sources, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='source',
+            name='name',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+        migrations.AddField(
+            model_name='userincome',
+            name='source_key',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='userincome.source'),
+        ),
+        migrations.AddField(
+            model_name='incomemonthlytotal',
+            name='source_key',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='userincome.source'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:20
+
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from expenseswebsite.operations import backfill_foreign_key
+
+
+def backfill(apps, schema_editor):
+    updates = {}
+    if schema_editor.connection.vendor == 'postgresql':
+        # Search matches sources through the key from now on, so the
+        # vector only needs the description. Rewriting it here saves a
+        # second pass over the table.
+        updates['search_vector'] = SearchVector('description', config='english', weight='A')
+    backfill_foreign_key(apps.get_model('userincome', 'UserIncome'), 'source', 'source_key', **updates)
+    backfill_foreign_key(apps.get_model('userincome', 'IncomeMonthlyTotal'), 'source', 'source_key')
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own; running the migration again after an
+    # interruption carries on with the rows that are still NULL.
+    atomic = False
+
+    dependencies = [
+        ('userincome', '0010_source_foreign_key_columns'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
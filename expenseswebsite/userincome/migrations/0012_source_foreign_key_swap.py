@@ -0,0 +1,95 @@
+# Generated by Django 5.1.3 on 2026-10-18 06:20
+
+import django.db.models.deletion
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+from expenseswebsite.operations import RunPostgresSQL, backfill_foreign_key
+
+
+def backfill_remaining(apps, schema_editor):
+    # Rows written since the batched backfill ran.
+    updates = {}
+    if schema_editor.connection.vendor == 'postgresql':
+        updates['search_vector'] = SearchVector('description', config='english', weight='A')
+    backfill_foreign_key(apps.get_model('userincome', 'UserIncome'), 'source', 'source_key', **updates)
+    backfill_foreign_key(apps.get_model('userincome', 'IncomeMonthlyTotal'), 'source', 'source_key')
+
+
+SEARCH_VECTOR = """
+    setweight(to_tsvector('pg_catalog.english', coalesce(NEW.description, '')), 'A')
+"""
+
+OLD_SEARCH_VECTOR = """
+    setweight(to_tsvector('pg_catalog.english', coalesce(NEW.description, '')), 'A') ||
+    setweight(to_tsvector('pg_catalog.english', coalesce(NEW.source, '')), 'B')
+"""
+
+REPLACE_TRIGGER = """
+DROP TRIGGER IF EXISTS userincome_userincome_search_vector_trigger ON userincome_userincome;
+CREATE OR REPLACE FUNCTION userincome_userincome_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := %s;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+CREATE TRIGGER userincome_userincome_search_vector_trigger
+BEFORE INSERT OR UPDATE OF description%s ON userincome_userincome
+FOR EACH ROW EXECUTE FUNCTION userincome_userincome_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userincome', '0011_source_foreign_key_backfill'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_remaining, migrations.RunPython.noop),
+        RunPostgresSQL(REPLACE_TRIGGER % (SEARCH_VECTOR, ''),
+                       REPLACE_TRIGGER % (OLD_SEARCH_VECTOR, ', source')),
+        migrations.RemoveIndex(
+            model_name='userincome',
+            name='income_owner_source_date_idx',
+        ),
+        migrations.RemoveConstraint(
+            model_name='incomemonthlytotal',
+            name='unique_income_monthly_total',
+        ),
+        migrations.RemoveField(
+            model_name='userincome',
+            name='source',
+        ),
+        migrations.RemoveField(
+            model_name='incomemonthlytotal',
+            name='source',
+        ),
+        migrations.RenameField(
+            model_name='userincome',
+            old_name='source_key',
+            new_name='source',
+        ),
+        migrations.RenameField(
+            model_name='incomemonthlytotal',
+            old_name='source_key',
+            new_name='source',
+        ),
+        migrations.AlterField(
+            model_name='userincome',
+            name='source',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='userincome.source'),
+        ),
+        migrations.AlterField(
+            model_name='incomemonthlytotal',
+            name='source',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='userincome.source'),
+        ),
+        migrations.AddIndex(
+            model_name='userincome',
+            index=models.Index(fields=['owner', 'source', 'date'], name='income_owner_source_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='incomemonthlytotal',
+            constraint=models.UniqueConstraint(fields=('owner', 'month', 'source'), name='unique_income_monthly_total'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.3 on 2026-10-18 05:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userincome', '0014_delete_empty_monthly_totals'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='incomemonthlytotal',
+            name='source',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='userincome.source'),
+        ),
+    ]
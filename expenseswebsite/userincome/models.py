@@ -1,23 +1,84 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils.timezone import now
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
+from expenseswebsite.rollups import MonthlyTotal, RollupSourceQuerySet
+from expenseswebsite.money import MoneyField
+from django.conf import settings
+from expenseswebsite import timeseries
+from userpreferences import rates
 
 # Create your models here.
 class UserIncome(models.Model):
-    amount = models.FloatField()
+    amount = MoneyField()
     date = models.DateField(default=now)
     description = models.TextField()
-    owner = models.ForeignKey(to=User, on_delete=models.CASCADE)
-    source = models.CharField(max_length=266)
+    # Indexed by the composite (owner, date, id) index below.
+    owner = models.ForeignKey(to=User, on_delete=models.CASCADE, db_index=False)
+    # Indexed by the composite (owner, source, date) index below; deleting a
+    # source, which is rare, has to scan for rows still using it.
+    source = models.ForeignKey(to='Source', on_delete=models.PROTECT, db_index=False)
+    currency = models.CharField(max_length=3, default=settings.BASE_CURRENCY)
+    # The amount in settings.BASE_CURRENCY at the rate of `date`; totals add this up.
+    base_amount = MoneyField(default=0, editable=False)
+    # Maintained by a database trigger on PostgreSQL, see migrations.
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Set by the statement importer so re-imported rows can be skipped.
+    import_hash = models.CharField(max_length=64, null=True, blank=True, editable=False)
+    
+    # Deletes, queryset deletes included, leave the rollup through the
+    # pre_delete receiver in signals.py.
+    objects = RollupSourceQuerySet.as_manager()
+    rollup_model = 'userincome.IncomeMonthlyTotal'
     
     def __str__(self):
-        return self.source
+        return self.source.name
+    
+    def save(self, *args, **kwargs):
+        # Keep the monthly rollup in step with the row, in the same transaction.
+        self.amount = self._meta.get_field('amount').to_python(self.amount)
+        self.date = self._meta.get_field('date').to_python(self.date)
+        self.base_amount = rates.to_base(self.amount, self.currency, self.date)
+        with transaction.atomic():
+            previous = None
+            if self.pk is not None:
+                previous = (UserIncome.objects.select_for_update()
+                            .filter(pk=self.pk).values('owner_id', 'date', 'source_id', 'base_amount').first())
+            super().save(*args, **kwargs)
+            if previous:
+                IncomeMonthlyTotal.objects.remove(previous['owner_id'], previous['date'],
+                                                  previous['source_id'], previous['base_amount'])
+            IncomeMonthlyTotal.objects.add(self.owner_id, self.date, self.source_id, self.base_amount)
+            timeseries.invalidate(self.owner_id)
     
     class Meta:
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['owner', '-date', 'id'], name='income_owner_date_id_idx'),
+            models.Index(fields=['owner', 'source', 'date'], name='income_owner_source_date_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'import_hash'], name='unique_income_import_hash'),
+        ]
     
 class Source(models.Model):
-    name = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, unique=True)
+    
+    def __str__(self):
+        return self.name
+
+class IncomeMonthlyTotal(MonthlyTotal):
+    key_field = 'source'
+    
+    owner = models.ForeignKey(to=User, on_delete=models.CASCADE)
+    # Lookups go through the unique constraint below. Totals are derived
+    # from income, whose own key keeps a source in use from deletion.
+    source = models.ForeignKey(to=Source, on_delete=models.CASCADE, db_index=False)
     
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return f'{self.owner} {self.month:%Y-%m} {self.source.name}'
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'month', 'source'], name='unique_income_monthly_total'),
+        ]
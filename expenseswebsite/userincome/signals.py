@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from expenseswebsite import refdata, timeseries
+from expenseswebsite.rollups import deleting_owner
+from .models import Source, UserIncome, IncomeMonthlyTotal
+
+
+def load_sources():
+    return tuple(Source.objects.order_by('name'))
+
+
+@receiver(post_save, sender=Source)
+@receiver(post_delete, sender=Source)
+def invalidate_sources(sender, **kwargs):
+    refdata.bump('sources')
+    transaction.on_commit(lambda: refdata.bump('sources'))
+
+
+@receiver(pre_delete, sender=UserIncome)
+def remove_from_monthly_total(sender, instance, origin=None, **kwargs):
+    # Sent for queryset and admin deletes too, within their transaction.
+    if deleting_owner(origin):
+        return
+    IncomeMonthlyTotal.objects.remove(instance.owner_id, instance.date, instance.source_id, instance.base_amount)
+    timeseries.invalidate(instance.owner_id)
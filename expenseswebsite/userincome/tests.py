@@ -1,12 +1,23 @@
 from django.test import TestCase, Client
 from django.contrib.auth.models import User
-from userincome.models import UserIncome, Source
+from userincome.models import UserIncome, Source, IncomeMonthlyTotal
 from django.utils.timezone import now
 from django.urls import reverse
 import json
-from userpreferences.models import UserPreference
+from userpreferences.models import UserPreference, ExchangeRate
 from datetime import date
 import datetime
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+import unittest
+from expenseswebsite.querybudget import QueryBudgetMixin
+from userincome import urls as userincome_urls
+
+
+def source_named(name):
+    return Source.objects.get_or_create(name=name)[0]
+
 
 class UserIncomeModelTest(TestCase):
     def setUp(self):
@@ -17,14 +28,14 @@ class UserIncomeModelTest(TestCase):
             amount = 1000.50,
             date = now().date(),
             description = 'Monthly salary',
-            source = self.source.name
+            source = self.source
         )
         self.income2 = UserIncome.objects.create(
             owner = self.user,
             amount = 500.00,
             date = now().date(),
             description = 'Freelance job',
-            source = 'Freelancing'
+            source = source_named('Freelancing')
         )
         
     def test_userincome_creation(self):
@@ -53,14 +64,14 @@ class SearchIncomeViewTest(TestCase):
             amount = 1000.50,
             date = now().date(),
             description = 'Freelance payment',
-            source = 'Salary'
+            source = source_named('Salary')
         )
         self.income2 = UserIncome.objects.create(
             owner = self.user,
             amount = 500.00,
             date = now().date(),
             description = 'Salary deposit',
-            source = 'salary'
+            source = source_named('salary')
         )
         self.url = reverse('search-income')
         
@@ -89,7 +100,7 @@ class IndexViewTest(TestCase):
                 amount = 100 * (i + 1),
                 date = now().date(),
                 description = f'Income {i}',
-                source = 'Freelance'
+                source = source_named('Freelance')
             )
             
         self.url = reverse('income')
@@ -108,6 +119,15 @@ class IndexViewTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.context['page_obj']), 2)
         
+    def test_index_deep_page(self):
+        self.client.login(username='testuser', password='password123')
+        page = self.client.get(self.url).context['page_obj']
+        seen = [income.description for income in page]
+        while page.has_next:
+            page = self.client.get(self.url, {'after': page.next_cursor}).context['page_obj']
+            seen += [income.description for income in page]
+        self.assertEqual(sorted(seen), [f'Income {i}' for i in range(5)])
+        
     def test_index_redirect_if_not_logged_in(self):
         response = self.client.get(self.url)
         self.assertEqual(response.status_code, 302)
@@ -137,7 +157,7 @@ class AddIncomeViewTest(TestCase):
             'amount': 1000,
             'description': 'Salary for March',
             'income_date': '2024-03-30',
-            'source': self.source.name
+            'source': self.source.pk
         }
         response = self.client.post(self.url, data)
         self.assertRedirects(response, reverse('income'))
@@ -149,7 +169,7 @@ class AddIncomeViewTest(TestCase):
             'amount': '',
             'description': 'Salary for March',
             'income_date': '2024-03-30',
-            'source': self.source.name
+            'source': self.source.pk
         }
         response = self.client.post(self.url, data)
         self.assertEqual(response.status_code, 200)
@@ -162,7 +182,7 @@ class AddIncomeViewTest(TestCase):
             'amount': '500',
             'description': '',
             'income_date': '2024-03-30',
-            'source': self.source.name
+            'source': self.source.pk
         }
         response = self.client.post(self.url, data)
         self.assertEqual(response.status_code, 200)
@@ -175,7 +195,7 @@ class AddIncomeViewTest(TestCase):
             'amount': '500',
             'description': 'Bonus',
             'income_date': '',
-            'source': self.source.name
+            'source': self.source.pk
         }
         response = self.client.post(self.url, data)
         self.assertEqual(response.status_code, 200)
@@ -192,7 +212,7 @@ class IncomeEditViewTest(TestCase):
             owner = self.user,
             amount = 1000.00,
             date = date.today(),
-            source = self.source.name,
+            source = self.source,
             description = 'Test income'
         )
         self.url = reverse('income-edit', args=[self.income.id])
@@ -213,7 +233,7 @@ class IncomeEditViewTest(TestCase):
             'amount': '1500.00',
             'description': 'Updated income',
             'income_date': date.today().strftime('%Y-%m-%d'),
-            'source': self.source.name
+            'source': self.source.pk
         })
         self.income.refresh_from_db()
         self.assertEqual(self.income.amount, 1500.00)
@@ -226,7 +246,7 @@ class IncomeEditViewTest(TestCase):
             'amount': '',
             'description': 'Updated income',
             'income_date': date.today().strftime('%Y-%m-%d'),
-            'source': self.source.name
+            'source': self.source.pk
         })
         self.assertContains(response, 'Amount is required')
         
@@ -236,7 +256,7 @@ class IncomeEditViewTest(TestCase):
             'amount': '1500.00',
             'description': '',
             'income_date': date.today().strftime('%Y-%m-%d'),
-            'source': self.source.name
+            'source': self.source.pk
         })
         self.assertContains(response, 'Description is required')
         
@@ -246,7 +266,7 @@ class IncomeEditViewTest(TestCase):
             'amount': '1500.00',
             'description': 'Updated income',
             'income_date': '',
-            'source': self.source.name
+            'source': self.source.pk
         })
         self.assertContains(response, 'Date is required')
         
@@ -259,7 +279,7 @@ class DeleteIncomeViewTest(TestCase):
             owner = self.user,
             amount = 1000.00,
             date = date.today(),
-            source = 'Freelancing',
+            source = source_named('Freelancing'),
             description = 'Test income'
         )
         self.url = reverse('income-delete', args=[self.income.id])
@@ -286,7 +306,7 @@ class IncomeCategorySummaryViewTest(TestCase):
             amount = 100,
             date = datetime.date.today(),
             description = 'Ingreso 1',
-            source = 'Trabajo'
+            source = source_named('Trabajo')
         )
         
         UserIncome.objects.create(
@@ -294,7 +314,7 @@ class IncomeCategorySummaryViewTest(TestCase):
             amount = 200,
             date = datetime.date.today(),
             description = 'Ingreso 2',
-            source = 'Freelance'
+            source = source_named('Freelance')
         )
                 
         UserIncome.objects.create(
@@ -302,7 +322,7 @@ class IncomeCategorySummaryViewTest(TestCase):
             amount = 50,
             date = datetime.date.today(),
             description = 'Ingreso 3',
-            source = 'Trabajo'
+            source = source_named('Trabajo')
         )
         
     def test_income_category_summary_authenticated_user(self):
@@ -336,4 +356,194 @@ class StatsViewTest(TestCase):
         response = self.client.get(self.url)
         self.assertEqual(response.status_code, 302)
         self.assertRedirects(response, f'/authentication/login?next={self.url}')
-        
\ No newline at end of file
+        
+        
+class IncomeMonthlyTotalTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', email='test@prueba.com', password='password123')
+        self.client.login(username='testuser', password='password123')
+        self.income = UserIncome.objects.create(
+            owner = self.user,
+            amount = 1000.00,
+            date = datetime.date(2024, 3, 30),
+            description = 'Salary',
+            source = source_named('Salary')
+        )
+        
+    def test_edit_updates_monthly_total(self):
+        self.client.post(reverse('income-edit', args=[self.income.id]), {
+            'amount': '1200',
+            'description': 'Salary',
+            'income_date': '2024-03-30',
+            'source': 'Salary'
+        })
+        total = IncomeMonthlyTotal.objects.get(owner=self.user, month=datetime.date(2024, 3, 1), source__name='Salary')
+        self.assertEqual(total.total, 1200.00)
+        self.assertEqual(total.count, 1)
+        
+    def test_delete_updates_monthly_total(self):
+        self.client.post(reverse('income-delete', args=[self.income.id]))
+        self.assertFalse(IncomeMonthlyTotal.objects.filter(owner=self.user).exists())
+        
+    def test_queryset_delete_and_update_keep_monthly_totals(self):
+        UserIncome.objects.filter(pk=self.income.pk).update(date=datetime.date(2024, 4, 1))
+        total = IncomeMonthlyTotal.objects.get(owner=self.user)
+        self.assertEqual((total.month, total.total), (datetime.date(2024, 4, 1), 1000.00))
+        UserIncome.objects.filter(owner=self.user).delete()
+        self.assertFalse(IncomeMonthlyTotal.objects.filter(owner=self.user).exists())
+
+        
+class IncomeTimeseriesViewTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', email='test@prueba.com', password='password123')
+        UserIncome.objects.create(owner=self.user, amount=100, date='2023-01-31', description='Pay', source=source_named('Salary'))
+        UserIncome.objects.create(owner=self.user, amount=50, date='2023-03-02', description='Gig', source=source_named('Freelance'))
+        self.url = reverse('income_timeseries')
+        
+    def test_monthly_totals_per_source(self):
+        self.client.login(username='testuser', password='password123')
+        response = self.client.get(self.url, {'start': '2023-01-01', 'end': '2023-03-31'})
+        data = response.json()
+        self.assertEqual(data['periods'], ['2023-01-01', '2023-02-01', '2023-03-01'])
+        self.assertEqual(data['series'], {'Salary': [100, 0, 0], 'Freelance': [0, 0, 50]})
+        
+    def test_redirect_if_not_logged_in(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+
+        
+class ImportIncomeViewTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', email='test@prueba.com', password='password123')
+        self.client.login(username='testuser', password='password123')
+        source_named('Salary')
+        
+    def test_import_ofx_keeps_credits(self):
+        ofx = (b'<?xml version="1.0"?><OFX><BANKTRANLIST>\n'
+               b'<STMTTRN><DTPOSTED>20240105</DTPOSTED><TRNAMT>-42.10</TRNAMT><FITID>1</FITID><NAME>Supermarket</NAME></STMTTRN>\n'
+               b'<STMTTRN><DTPOSTED>20240131</DTPOSTED><TRNAMT>1000.00</TRNAMT><FITID>2</FITID><NAME>Payroll</NAME></STMTTRN>\n'
+               b'</BANKTRANLIST></OFX>\n')
+        response = self.client.post(reverse('import-income'), {
+            'statement': SimpleUploadedFile('statement.qfx', ofx),
+            'source': 'Salary'
+        })
+        self.assertEqual(response.json()['created'], 1)
+        income = UserIncome.objects.get(owner=self.user)
+        self.assertEqual((income.description, income.amount, income.source.name), ('Payroll', 1000.00, 'Salary'))
+
+        
+class ExportIncomeViewTest(TestCase):
+    def test_export_only_own_rows(self):
+        user = User.objects.create_user(username='testuser', email='test@prueba.com', password='password123')
+        other = User.objects.create_user(username='other', email='other@prueba.com', password='password123')
+        UserIncome.objects.create(owner=user, amount=100, date='2024-01-01', description='Pay', source=source_named('Salary'))
+        UserIncome.objects.create(owner=other, amount=200, date='2024-01-01', description='Other pay', source=source_named('Salary'))
+        self.client.login(username='testuser', password='password123')
+        response = self.client.get(reverse('export-income'))
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn('Pay', content)
+        self.assertNotIn('Other pay', content)
+        
+class IncomeCurrencyTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='password123')
+        self.client.login(username='testuser', password='password123')
+        ExchangeRate.objects.create(currency='ARS', date=date(2024, 1, 1), rate=1000)
+        
+    def test_income_is_stored_in_base_currency(self):
+        income = UserIncome.objects.create(amount=500000, currency='ARS', date='2024-03-01', description='Pay', owner=self.user, source=source_named('Salary'))
+        self.assertEqual(income.base_amount, 500)
+        total = IncomeMonthlyTotal.objects.get(owner=self.user, month=date(2024, 3, 1), source__name='Salary')
+        self.assertEqual(total.total, 500)
+        
+    def test_summary_in_preferred_currency(self):
+        UserPreference.objects.create(user=self.user, currency='ARS - Argentine Peso')
+        UserIncome.objects.create(amount=100, date=now().date(), description='Pay', owner=self.user, source=source_named('Salary'))
+        data = self.client.get(reverse('income_category_summary')).json()
+        self.assertEqual(data['currency'], 'ARS')
+        self.assertEqual(data['income_category_data']['Salary'], 100000)
+        
+@unittest.skipUnless(connection.vendor == 'postgresql', 'query plans are PostgreSQL specific')
+class IncomeQueryPlanTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='password123')
+        owners = [cls.user] + User.objects.bulk_create([User(username=f'user{i}') for i in range(49)])
+        start = now().date() - datetime.timedelta(days=600)
+        sources = [source_named(f'Source {i}') for i in range(4)]
+        UserIncome.objects.bulk_create([
+            UserIncome(owner=owner, amount=day % 50 + 1, base_amount=day % 50 + 1,
+                       date=start + datetime.timedelta(days=day * 2), description=f'Pay {day}',
+                       source=sources[day % 4])
+            for day in range(300) for owner in owners
+        ], batch_size=2000)
+        IncomeMonthlyTotal.objects.rebuild(cls.user.pk, UserIncome.objects.all())
+        
+    def setUp(self):
+        self.client = Client()
+        self.client.login(username='testuser', password='password123')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE userincome_userincome')
+            
+    def assertNoSeqScan(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params or {})
+            if response.streaming:
+                b''.join(response.streaming_content)
+        sqls = [query['sql'] for query in queries if '"userincome_userincome"' in query['sql']]
+        self.assertTrue(sqls)
+        for sql in sqls:
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN ' + sql)
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+            self.assertNotRegex(plan, r'Seq Scan on userincome_userincome\b', f'{sql}\n{plan}')
+            
+    def test_hot_views_use_indexes(self):
+        self.assertNoSeqScan(reverse('income'))
+        self.assertNoSeqScan(reverse('income_category_summary'))
+        self.assertNoSeqScan(reverse('income_timeseries'), {'granularity': 'week'})
+        self.assertNoSeqScan(reverse('export-income'), {'source': 'Source 1'})
+        
+class IncomeQueryBudgetTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='password123')
+        self.client.login(username='testuser', password='password123')
+        for i in range(12):
+            UserIncome.objects.create(amount=i + 1, date=now().date() - datetime.timedelta(days=i * 20),
+                                      description=f'Pay {i}', owner=self.user, source=source_named(f'Source {i % 3}'))
+        for name in ('Salary', 'Freelance'):
+            Source.objects.create(name=name)
+        self.income = UserIncome.objects.filter(owner=self.user).first()
+        
+    def test_every_url_has_a_budget(self):
+        self.assertBudgetsDeclared(userincome_urls)
+        
+    def test_pages(self):
+        self.assertWithinBudget('income', data={'page_size': 10})
+        self.assertWithinBudget('add-income')
+        self.assertWithinBudget('income-edit', args=[self.income.id])
+        self.assertWithinBudget('stats_income')
+        
+    def test_writes(self):
+        self.assertWithinBudget('add-income', method='post', data={
+            'amount': '10', 'description': 'Pay', 'income_date': '2024-01-10', 'source': 'Salary'})
+        self.assertWithinBudget('income-edit', args=[self.income.id], method='post', data={
+            'amount': '12', 'description': 'Pay', 'income_date': '2024-01-11', 'source': 'Salary'})
+        self.assertWithinBudget('income-delete', args=[self.income.id])
+        
+    def test_json_endpoints(self):
+        self.assertWithinBudget('search-income', method='post', data=json.dumps({'searchText': 'Pay'}),
+                                content_type='application/json')
+        self.assertWithinBudget('income_category_summary')
+        self.assertWithinBudget('income_timeseries', data={'granularity': 'week'})
+        
+    def test_import_and_export(self):
+        csv = b'date,description,amount\n' + b''.join(f'2024-02-{day:02d},Pay,{day}\n'.encode() for day in range(1, 21))
+        self.assertWithinBudget('import-income', method='post',
+                                data={'statement': SimpleUploadedFile('statement.csv', csv)})
+        self.assertWithinBudget('export-income')
@@ -9,5 +9,22 @@ urlpatterns = [
     path('income-delete/<int:id>', views.delete_income, name="income-delete"),
     path('search-income',csrf_exempt(views.search_income), name="search-income"),
     path('income_category_summary', views.income_category_summary, name="income_category_summary"),
+    path('income_timeseries', views.income_timeseries, name="income_timeseries"),
+    path('import-income', views.import_income, name="import-income"),
+    path('export-income', views.export_income, name="export-income"),
     path('stats', views.stats_view, name="stats_income")
 ]
+
+# Most SQL queries one request to each view may issue; see expenseswebsite.querybudget.
+QUERY_BUDGETS = {
+    'income': 3,
+    'add-income': 9,
+    'income-edit': 8,
+    'income-delete': 5,
+    'search-income': 2,
+    'income_category_summary': 4,
+    'income_timeseries': 2,
+    'import-income': 15,
+    'export-income': 1,
+    'stats_income': 0,
+}
@@ -1,50 +1,47 @@
 from django.shortcuts import render, redirect
-from .models import Source, UserIncome
-from django.core.paginator import Paginator
+from .models import UserIncome, IncomeMonthlyTotal
 from django.contrib.auth.decorators import login_required
-from userpreferences.models import UserPreference
 from django.contrib import messages
 import json, datetime
 from django.http import JsonResponse
+from expenseswebsite.rollups import atotals_by_key
+from expenseswebsite import timeseries
+from expenseswebsite.search import asearch
+from expenseswebsite.pagination import keyset_page
+from expenseswebsite.validation import validate_choice, validate_currency, validate_entry
+from expenseswebsite import statements, exports, refdata, throttle
+from expenseswebsite.routers import replica_reads
+from userpreferences import rates
 
 # Create your views here.
 
 @login_required(login_url='/authentication/login')
-def search_income(request):
+@replica_reads
+async def search_income(request):
     if request.method == 'POST':
         search_str = json.loads(request.body).get('searchText')
-        income = UserIncome.objects.filter(
-            amount__istartswith = search_str, owner = request.user
-        ) | UserIncome.objects.filter(
-            date__istartswith = search_str, owner = request.user
-        ) | UserIncome.objects.filter(
-            description__icontains = search_str, owner = request.user
-        ) | UserIncome.objects.filter(
-            source__icontains = search_str, owner = request.user
-        )
-        data = income.values()
-        return JsonResponse(list(data), safe=False)
+        user = await request.auser()
+        return await throttle.search_response('income', user, lambda: asearch(
+            UserIncome.objects.filter(owner=user), 'source', search_str,
+            ('id', 'amount', 'date', 'description', 'owner_id', 'source')))
 
 @login_required(login_url='/authentication/login')
 def index(request):
-    categories = Source.objects.all()
-    income = UserIncome.objects.filter(owner=request.user)
-    paginator = Paginator(income, 2)
-    page_number = request.GET.get('page')
-    page_obj = Paginator.get_page(paginator, page_number)
-    currency = UserPreference.objects.get(user=request.user).currency
+    page_obj = keyset_page(UserIncome.objects.filter(owner=request.user).select_related('source'), request.GET)
     context = {
-        'income': income,
+        'income': page_obj,
         'page_obj': page_obj,
-        'currency': currency
+        'total_count': IncomeMonthlyTotal.objects.count_for(request.user)
     }
     return render(request, 'income/index.html', context)
 
 @login_required(login_url='/authentication/login')
 def add_income(request):
-    sources = Source.objects.all()
+    sources = refdata.get('sources')
     context = {
         'sources': sources,
+        'currencies': refdata.get('currencies'),
+        'selected_currency': request.POST.get('currency') or rates.preferred_currency(request.user_preference or None),
         'values': request.POST
     }
     
@@ -55,33 +52,31 @@ def add_income(request):
         amount = request.POST['amount']
         description = request.POST['description']
         date = request.POST['income_date']
-        source = request.POST['source']
-        
-        if not amount:
-            messages.error(request, 'Amount is required')
-            return render(request, 'income/add_income.html', context)
+        source = refdata.find('sources', request.POST['source'])
         
-        if not description:
-            messages.error(request, 'Description is required')
-            return render(request, 'income/add_income.html', context)
+        currency = context['selected_currency']
         
-        if not date:
-            messages.error(request, 'Date is required')
+        error = (validate_entry(amount, description, date) or validate_currency(currency)
+                 or validate_choice(source, 'source'))
+        if error:
+            messages.error(request, error)
             return render(request, 'income/add_income.html', context)
         
-        UserIncome.objects.create(owner=request.user, amount=amount, date=date, source=source, description=description)
+        UserIncome.objects.create(owner=request.user, amount=amount, currency=currency, date=date, source=source, description=description)
         messages.success(request, 'Record saved successfully')
         
         return redirect('income')
     
 @login_required(login_url='/authentication/login')
 def income_edit(request, id):
-    income = UserIncome.objects.get(pk=id)
-    sources = Source.objects.all()
+    income = UserIncome.objects.select_related('source').get(pk=id)
+    sources = refdata.get('sources')
     context = {
         'income': income,
         'values': income,
-        'sources': sources
+        'sources': sources,
+        'currencies': refdata.get('currencies'),
+        'selected_currency': request.POST.get('currency') or income.currency
     }
     if request.method == 'GET':
         return render(request, 'income/edit_income.html', context)
@@ -89,21 +84,18 @@ def income_edit(request, id):
         amount = request.POST['amount']
         description = request.POST['description']
         date = request.POST['income_date']
-        source = request.POST['source']
+        source = refdata.find('sources', request.POST['source'])
 
-        if not amount:
-            messages.error(request, 'Amount is required')
-            return render(request, 'income/edit_income.html', context)
-        
-        if not description:
-            messages.error(request, 'Description is required')
-            return render(request, 'income/edit_income.html', context)
-        
-        if not date:
-            messages.error(request, 'Date is required')
+        currency = context['selected_currency']
+
+        error = (validate_entry(amount, description, date) or validate_currency(currency)
+                 or validate_choice(source, 'source'))
+        if error:
+            messages.error(request, error)
             return render(request, 'income/edit_income.html', context)
         
         income.amount = amount
+        income.currency = currency
         income.date = date
         income.source = source
         income.description = description
@@ -120,30 +112,52 @@ def delete_income(request, id):
     return redirect('income')
 
 @login_required(login_url='/authentication/login')
-def income_category_summary(request):
+@replica_reads
+async def income_category_summary(request):
     todays_date = datetime.date.today()
     six_months_ago = todays_date-datetime.timedelta(days=30*6)
-    incomes = UserIncome.objects.filter(owner=request.user,
-                                      date__gte=six_months_ago, date__lte=todays_date)
-    finalrep = {}
-
-    def get_source(income):
-        return income.source
-    source_list = list(set(map(get_source, incomes)))
+    finalrep = await atotals_by_key(UserIncome.objects.all(), IncomeMonthlyTotal, await request.auser(),
+                                    six_months_ago, todays_date)
+    code, factor = await rates.adisplay_currency(await request.auser_preference())
+    return JsonResponse({'income_category_data': rates.convert_totals(await refdata.alabel('sources', finalrep), factor), 'currency': code}, safe=False)
 
-    def get_income_source_amount(source):
-        amount = 0
-        filtered_by_source = incomes.filter(source=source)
-
-        for item in filtered_by_source:
-            amount += item.amount
-        return amount
+@login_required(login_url='/authentication/login')
+@replica_reads
+def income_timeseries(request):
+    try:
+        start, end, granularity = timeseries.parse_range(request.GET)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    data = timeseries.cached_timeseries('income', UserIncome.objects.all(), 'source', request.user,
+                                        start, end, granularity)
+    data = {**data, 'series': refdata.label('sources', data['series'])}
+    code, factor = rates.display_currency(request.user_preference or None)
+    return JsonResponse({**rates.convert_series(data, factor), 'currency': code})
 
-    for x in incomes:
-        for y in source_list:
-            finalrep[y] = get_income_source_amount(y)
+@login_required(login_url='/authentication/login')
+def import_income(request):
+    if request.method != 'POST' or 'statement' not in request.FILES:
+        return JsonResponse({'error': 'POST a CSV or OFX file as "statement"'}, status=400)
+    upload = request.FILES['statement']
+    statement_format = request.POST.get('format') or statements.detect_format(upload.name)
+    default_key = refdata.find('sources', request.POST.get('source') or statements.DEFAULT_KEY)
+    error = validate_choice(default_key, 'source')
+    if error:
+        return JsonResponse({'error': error}, status=400)
+    result = statements.import_statement(UserIncome, IncomeMonthlyTotal, request.user, upload.file,
+                                         statement_format, 'credit',
+                                         default_key.name,
+                                         request.POST.get('currency') or rates.preferred_currency(request.user_preference or None))
+    return JsonResponse(result.as_dict())
 
-    return JsonResponse({'income_category_data': finalrep}, safe=False)
+@login_required(login_url='/authentication/login')
+@replica_reads
+def export_income(request):
+    try:
+        return exports.export_response(UserIncome.objects.filter(owner=request.user), 'source',
+                                       request.GET, 'income')
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
 
 @login_required(login_url='/authentication/login')
 def stats_view(request):
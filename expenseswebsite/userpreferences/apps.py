@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class UserpreferencesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'userpreferences'
+
+    def ready(self):
+        from expenseswebsite import refdata
+        from . import signals  # noqa: F401
+        from .currencies import load_currencies, currencies_version
+        refdata.register('currencies', load_currencies, version=currencies_version)
+        refdata.warm(['currencies'])
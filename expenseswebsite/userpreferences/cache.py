@@ -0,0 +1,41 @@
+from django.core.cache import cache
+from expenseswebsite import metrics
+from .models import UserPreference
+
+CACHE_TIMEOUT = 60 * 60 * 24
+NO_PREFERENCE = 'none'
+
+
+def cache_key(user_id):
+    return f'user-preference:{user_id}'
+
+
+def get_preference(user):
+    if not user.is_authenticated:
+        return None
+    cached = cache.get(cache_key(user.pk))
+    metrics.cache_lookup('user-preference', cached is not None)
+    if cached is None:
+        cached = UserPreference.objects.filter(user=user).first() or NO_PREFERENCE
+        cache.set(cache_key(user.pk), cached, CACHE_TIMEOUT)
+    return None if cached == NO_PREFERENCE else cached
+
+
+async def aget_preference(user):
+    if not user.is_authenticated:
+        return None
+    cached = await cache.aget(cache_key(user.pk))
+    metrics.cache_lookup('user-preference', cached is not None)
+    if cached is None:
+        cached = await UserPreference.objects.filter(user=user).afirst() or NO_PREFERENCE
+        await cache.aset(cache_key(user.pk), cached, CACHE_TIMEOUT)
+    return None if cached == NO_PREFERENCE else cached
+
+
+def get_currency(user):
+    preference = get_preference(user)
+    return preference.currency if preference else None
+
+
+def invalidate(user_id):
+    cache.delete(cache_key(user_id))
@@ -0,0 +1,11 @@
+from django.utils.functional import SimpleLazyObject
+from .cache import get_currency
+
+
+def currency(request):
+    def load():
+        preference = getattr(request, 'user_preference', None)
+        if preference is not None:
+            return preference.currency if preference else None
+        return get_currency(request.user)
+    return {'currency': SimpleLazyObject(load)}
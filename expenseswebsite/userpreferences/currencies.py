@@ -0,0 +1,23 @@
+import json
+import os
+from django.conf import settings
+
+
+def currencies_path():
+    return os.path.join(settings.BASE_DIR, 'currencies.json')
+
+
+def currencies_version():
+    try:
+        return os.stat(currencies_path()).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def load_currencies():
+    try:
+        with open(currencies_path(), 'r') as json_file:
+            data = json.load(json_file)
+    except FileNotFoundError:
+        return ()
+    return tuple({'name': k, 'value': v} for k, v in data.items())
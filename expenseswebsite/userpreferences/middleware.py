@@ -0,0 +1,28 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.functional import SimpleLazyObject
+from .cache import aget_preference, get_preference
+
+
+async def auser_preference(request):
+    if not hasattr(request, '_acached_user_preference'):
+        request._acached_user_preference = await aget_preference(await request.auser())
+    return request._acached_user_preference
+
+
+class UserPreferenceMiddleware:
+    """Attach ``request.user_preference``, loaded from the cache on first use,
+    and its async counterpart ``await request.auser_preference()``."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.user_preference = SimpleLazyObject(lambda: get_preference(request.user))
+        request.auser_preference = lambda: auser_preference(request)
+        # A coroutine when the chain is async, which the caller awaits.
+        return self.get_response(request)
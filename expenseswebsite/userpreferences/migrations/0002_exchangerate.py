@@ -0,0 +1,25 @@
+# Generated by Django 5.1.3 on 2026-10-18 03:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userpreferences', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3)),
+                ('date', models.DateField()),
+                ('rate', models.FloatField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('currency', 'date'), name='unique_exchange_rate')],
+            },
+        ),
+    ]
@@ -8,4 +8,17 @@ class UserPreference(models.Model):
     
     def __str__(self):
         return str(self.user)+ 's' + 'preferences'
-    
\ No newline at end of file
+    
+class ExchangeRate(models.Model):
+    # Units of `currency` bought by one settings.BASE_CURRENCY on `date`.
+    currency = models.CharField(max_length=3)
+    date = models.DateField()
+    rate = models.FloatField()
+    
+    def __str__(self):
+        return f'{self.currency} {self.date} {self.rate}'
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['currency', 'date'], name='unique_exchange_rate'),
+        ]
@@ -0,0 +1,113 @@
+"""Daily exchange rates and conversion through settings.BASE_CURRENCY.
+
+Every expense/income row stores ``base_amount``, its amount converted at the
+rate of its own date, so totals are plain SUMs in the base currency. Results
+are converted to the user's preferred currency afterwards with one factor.
+
+The rate used for a date is the latest one on or before it, falling back to
+the earliest known rate, and to 1 when the currency has no rates at all.
+"""
+import bisect
+import datetime
+from decimal import Decimal
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Round
+from expenseswebsite.money import as_number, quantize
+from .models import ExchangeRate
+
+
+def currency_code(value):
+    # Preferences are saved as "USD - United States Dollar".
+    if not value:
+        return settings.BASE_CURRENCY
+    return value.split(' - ')[0].strip().upper()
+
+
+class RateTable:
+    """Rates for a set of currencies over a date range, loaded up front so a
+    whole batch of rows can be converted without further queries."""
+
+    def __init__(self, rates):
+        # {currency: ([dates], [rates])}, sorted by date
+        self.rates = rates
+
+    @classmethod
+    def load(cls, currencies, start, end):
+        rates = {}
+        for currency in set(currencies) - {settings.BASE_CURRENCY}:
+            rows = ExchangeRate.objects.filter(currency=currency)
+            before = list(rows.filter(date__lte=start).order_by('-date').values_list('date', 'rate')[:1])
+            within = list(rows.filter(date__gt=start, date__lte=end).order_by('date').values_list('date', 'rate'))
+            if not before and not within:
+                within = list(rows.filter(date__gt=end).order_by('date').values_list('date', 'rate')[:1])
+            known = before + within
+            rates[currency] = ([row[0] for row in known], [row[1] for row in known])
+        return cls(rates)
+
+    def rate(self, currency, date):
+        if currency == settings.BASE_CURRENCY:
+            return 1.0
+        dates, values = self.rates.get(currency, ((), ()))
+        if not dates:
+            return 1.0
+        return values[max(bisect.bisect_right(dates, date) - 1, 0)]
+
+    def to_base(self, amount, currency, date):
+        return quantize(Decimal(amount) / Decimal(str(self.rate(currency, date))))
+
+
+def to_base(amount, currency, date):
+    if currency == settings.BASE_CURRENCY:
+        return amount
+    return RateTable.load([currency], date, date).to_base(amount, currency, date)
+
+
+def preferred_currency(preference):
+    return currency_code(preference.currency if preference else None)
+
+
+def display_currency(preference, date=None):
+    """Return (code, factor) turning base-currency totals into the currency
+    of ``preference`` at the rate of ``date`` (today by default)."""
+    code = preferred_currency(preference)
+    date = date or datetime.date.today()
+    return code, RateTable.load([code], date, date).rate(code, date)
+
+
+async def adisplay_currency(preference, date=None):
+    code = preferred_currency(preference)
+    date = date or datetime.date.today()
+    if code == settings.BASE_CURRENCY:
+        return code, 1.0
+    table = await sync_to_async(RateTable.load)([code], date, date)
+    return code, table.rate(code, date)
+
+
+def convert(value, factor):
+    return as_number(quantize(value * Decimal(str(factor))))
+
+
+def convert_totals(totals, factor):
+    return {key: convert(value, factor) for key, value in totals.items()}
+
+
+def convert_series(data, factor):
+    series = {key: [convert(value, factor) for value in values] for key, values in data['series'].items()}
+    return {**data, 'series': series}
+
+
+def base_amount_expression():
+    rates = ExchangeRate.objects.filter(currency=OuterRef('currency'))
+    on_or_before = rates.filter(date__lte=OuterRef('date')).order_by('-date').values('rate')[:1]
+    earliest = rates.order_by('date').values('rate')[:1]
+    # Both amounts are in minor units, so the quotient only needs rounding.
+    return Round(F('amount') / Coalesce(Subquery(on_or_before), Subquery(earliest), Value(1.0)))
+
+
+def reprice(queryset):
+    """Recompute ``base_amount`` for ``queryset`` in one UPDATE, after new
+    rates have been loaded. Returns the number of rows updated."""
+    return (queryset.exclude(currency=settings.BASE_CURRENCY)
+            .update(base_amount=base_amount_expression()))
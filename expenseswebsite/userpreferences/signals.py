@@ -0,0 +1,13 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import UserPreference
+from .cache import invalidate
+
+
+@receiver(post_save, sender=UserPreference)
+@receiver(post_delete, sender=UserPreference)
+def invalidate_user_preference(sender, instance, **kwargs):
+    # Again on commit, in case a concurrent request re-cached the old row.
+    invalidate(instance.user_id)
+    transaction.on_commit(lambda: invalidate(instance.user_id))
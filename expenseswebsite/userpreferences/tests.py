@@ -5,6 +5,12 @@ from django.contrib.auth.models import User
 from django.conf import settings
 from django.urls import reverse
 from .models import UserPreference
+from expenses.models import Category, Expense
+from .cache import get_preference, invalidate
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from expenseswebsite.querybudget import QueryBudgetMixin
+from userpreferences import urls as userpreferences_urls
 
 # Create your tests here.
 
@@ -29,9 +35,63 @@ class PreferencesIndexViewTest(TestCase):
         self.assertTrue(UserPreference.objects.filter(user=self.user).exists())
         self.assertEqual(UserPreference.objects.get(user=self.user).currency, 'USD')
         
+    def test_get_lists_currencies_from_file(self):
+        self.client.login(username='testuser', password='password123')
+        response = self.client.get(self.url)
+        self.assertEqual(list(response.context['currencies']), [{'name': 'USD', 'value': '$'}, {'name': 'ARS', 'value': '$'}])
+        
     def test_post_index_update_user_preference(self):
         UserPreference.objects.create(user=self.user, currency='ARS')
         self.client.login(username='testuser', password='password123')
         response = self.client.post(self.url, {'currency': 'USD'})
         self.assertEqual(UserPreference.objects.get(user=self.user).currency, 'USD')
-        
\ No newline at end of file
+        
+class UserPreferenceCacheTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='password123')
+        self.preference = UserPreference.objects.create(user=self.user, currency='USD')
+        Expense.objects.create(owner=self.user, amount=10, description='Lunch',
+                               category=Category.objects.create(name='Food'))
+        invalidate(self.user.pk)
+        self.client.login(username='testuser', password='password123')
+        
+    def preference_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, [q['sql'] for q in queries if 'userpreferences_userpreference' in q['sql']]
+        
+    def test_preference_is_loaded_once_then_cached(self):
+        response, queries = self.preference_queries(reverse('expenses'))
+        self.assertEqual(len(queries), 1)
+        self.assertContains(response, 'USD')
+        response, queries = self.preference_queries(reverse('income'))
+        self.assertEqual(queries, [])
+        self.assertEqual(response.context['currency'], 'USD')
+        
+    def test_saving_preference_invalidates_cache(self):
+        self.assertEqual(get_preference(self.user).currency, 'USD')
+        self.preference.currency = 'ARS'
+        self.preference.save()
+        self.assertEqual(get_preference(self.user).currency, 'ARS')
+        
+    def test_missing_preference_is_cached(self):
+        self.preference.delete()
+        self.assertIsNone(get_preference(self.user))
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_preference(self.user))
+
+        
+class PreferencesQueryBudgetTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='password123')
+        self.client.login(username='testuser', password='password123')
+        
+    def test_every_url_has_a_budget(self):
+        self.assertBudgetsDeclared(userpreferences_urls)
+        
+    def test_index(self):
+        self.assertWithinBudget('preferences')
+        self.assertWithinBudget('preferences', method='post', data={'currency': 'EUR - Euro'})
+        self.assertWithinBudget('preferences', method='post', data={'currency': 'USD - United States Dollar'})
@@ -4,3 +4,8 @@ from . import views
 urlpatterns = [
     path('', views.index, name='preferences')
 ]
+
+# Most SQL queries one request to each view may issue; see expenseswebsite.querybudget.
+QUERY_BUDGETS = {
+    'preferences': 3,
+}
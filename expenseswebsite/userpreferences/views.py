@@ -1,30 +1,20 @@
 from django.shortcuts import render
-import os
-import json
-from django.conf import settings
 from .models import UserPreference
 from django.contrib import messages
+from expenseswebsite import refdata
 
 # Create your views here.
 def index(request):
-        currency_data = []
-        file_path = os.path.join(settings.BASE_DIR, 'currencies.json')
-        with open(file_path, 'r') as json_file:
-            data = json.load(json_file)
-            for k, v in data.items():
-                currency_data.append({'name': k, 'value': v})
-        exists = UserPreference.objects.filter(user = request.user).exists()
-        user_preferences = None
-        if exists:
-            user_preferences = UserPreference.objects.get(user=request.user)
+        currency_data = refdata.get('currencies')
+        user_preferences = request.user_preference or None
         if request.method == 'GET':
             return render(request, 'preferences/index.html', {'currencies': currency_data, 'user_preferences': user_preferences})
         else:
             currency = request.POST['currency']
-            if exists:
+            if user_preferences:
                 user_preferences.currency = currency
                 user_preferences.save()
             else:
-                UserPreference.objects.create(user=request.user, currency = currency)
+                user_preferences = UserPreference.objects.create(user=request.user, currency = currency)
             messages.success(request, 'Changes saved')
-            return render(request, 'preferences/index.html', {'currencies': currency_data, 'user_preferences': user_preferences})
\ No newline at end of file
+            return render(request, 'preferences/index.html', {'currencies': currency_data, 'user_preferences': user_preferences})